@@ -0,0 +1,72 @@
+"""
+Benchmark filtering bookmarks by several tags.
+
+Run from the repository's root with `python -m benchmarks.tag_filter`. Prints
+the time of fetching the first page of bookmarks tagged with 1 to 4 tags, in
+both modes, for growing numbers of bookmarks, with and without the composite
+indexes of tags_bookmarks.
+"""
+
+import random
+import time
+
+from sqlalchemy import create_engine, select, desc
+
+from bookmarks.logic import _tagged
+from bookmarks.models import Bookmark, Tag, tags_bookmarks
+
+TAGS = 500
+TAGS_PER_BOOKMARK = 4
+REPEAT = 20
+
+
+def _populate(engine, bookmarks):
+    """Fill the tables with bookmarks tagged following a skewed distribution."""
+    tables = [Tag.__table__, Bookmark.__table__, tags_bookmarks]
+    Bookmark.metadata.drop_all(engine, tables=tables)
+    Bookmark.metadata.create_all(engine, tables=tables)
+    rng = random.Random(0)
+    weights = [1 / rank for rank in range(1, TAGS + 1)]  # few popular tags
+    with engine.begin() as conn:
+        conn.execute(Tag.__table__.insert(),
+                     [{'id': i, 'name': f'tag{i}'} for i in range(1, TAGS + 1)])
+        conn.execute(Bookmark.__table__.insert(), [
+            {'id': i, 'url': f'https://example.com/{i}', 'rating': 0}
+            for i in range(1, bookmarks + 1)])
+        conn.execute(tags_bookmarks.insert(), [
+            {'bookmark_id': i, 'tag_id': tag_id}
+            for i in range(1, bookmarks + 1)
+            for tag_id in set(rng.choices(range(1, TAGS + 1), weights,
+                                          k=TAGS_PER_BOOKMARK))])
+
+
+def _time(engine, names, match_all):
+    """Return the milliseconds fetching the first page of tagged bookmarks takes."""
+    query = select([Bookmark.__table__.c.id]).where(
+        Bookmark.id.in_(_tagged(names, match_all))).order_by(
+        desc(Bookmark.created_on), desc(Bookmark.id)).limit(50)
+    with engine.connect() as conn:
+        started = time.perf_counter()
+        for _ in range(REPEAT):
+            conn.execute(query).fetchall()
+    return (time.perf_counter() - started) / REPEAT * 1000
+
+
+def main():
+    engine = create_engine('sqlite://')
+    print(f'{"bookmarks":>9} {"indexes":>7} {"tags":>4} {"all ms":>8} {"any ms":>8}')
+    for bookmarks in (1000, 10000, 100000):
+        _populate(engine, bookmarks)
+        for indexed in (True, False):
+            if not indexed:
+                for index in tags_bookmarks.indexes:
+                    index.drop(engine)
+            for count in range(1, 5):
+                names = [f'tag{i}' for i in range(1, count + 1)]
+                print(f'{bookmarks:>9} {str(indexed):>7} {count:>4} '
+                      f'{_time(engine, names, True):>8.2f} '
+                      f'{_time(engine, names, False):>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
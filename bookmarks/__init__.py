@@ -6,7 +6,6 @@ import base64
 import binascii
 
 from flask import Flask, g
-from flask_bcrypt import Bcrypt
 from flask_login import current_user, LoginManager
 from flask_wtf.csrf import CSRFProtect
 from flask_sqlalchemy import SQLAlchemy
@@ -18,13 +17,26 @@ from celery import Celery
 import sentry_sdk
 from sentry_sdk.integrations.flask import FlaskIntegration
 
+from .cache import ResponseCache
+from .http_client import HTTPClient
+from .ratings import RatingBuffer
+from .search import SearchIndex
+from .users.passwords import PasswordChecker
+from .users.tokens import TokenCache, TokenRevocations
+
 
 db = SQLAlchemy()
 ma = Marshmallow()
-bcrypt = Bcrypt()
 csrf = CSRFProtect()
 migrate = Migrate()
 smorest_api = Api()
+response_cache = ResponseCache()
+token_cache = TokenCache()
+token_revocations = TokenRevocations()
+password_checker = PasswordChecker()
+http_client = HTTPClient()
+search_index = SearchIndex()
+rating_buffer = RatingBuffer()
 
 if os.environ.get('FLASK_ENV') == 'development':
     import config
@@ -45,7 +57,6 @@ def create_app():
     app.logger.handlers.extend(gunicorn_error_logger.handlers)
     app.logger.setLevel(logging.INFO)
 
-    bcrypt.init_app(app)
     login_manager = LoginManager(app)
 
     app.config.from_object(f'config.{app.env.title()}')
@@ -64,6 +75,7 @@ def create_app():
     # Database, CSRF should be attached after config is decided
     db.init_app(app)
     migrate.init_app(app, db)
+    search_index.init_app(app, db.metadata)
 
     with app.app_context():
         try:
@@ -72,6 +84,12 @@ def create_app():
             pass  # database/tables already exist
     ma.init_app(app)
     csrf.init_app(app)
+    response_cache.init_app(app)
+    token_cache.init_app(app)
+    token_revocations.init_app(app)
+    password_checker.init_app(app)
+    http_client.init_app(app)
+    rating_buffer.init_app(app, db)
 
     # Regular views
     from bookmarks.views import index
@@ -104,9 +122,34 @@ def create_app():
     from bookmarks.api.tags import tags_api
     smorest_api.register_blueprint(tags_api)
 
+    @app.cli.command('rebuild-tag-counts')
+    def rebuild_tag_counts():
+        """Recount the bookmarks of every tag."""
+        from bookmarks.logic import _rebuild_tag_counts
+        _rebuild_tag_counts()
+
+    @app.cli.command('rebuild-subscription-counts')
+    def rebuild_subscription_counts():
+        """Recount the subscribers and subscriptions of every user."""
+        from bookmarks.logic import _rebuild_subscription_counts
+        _rebuild_subscription_counts()
+
+    @app.cli.command('rescore-bookmarks')
+    def rescore_bookmarks():
+        """Recompute the hot and trending scores of every bookmark."""
+        from bookmarks.logic import _rescore_bookmarks
+        _rescore_bookmarks()
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """Index the title, url and tags of every bookmark for searching."""
+        from bookmarks.logic import _rebuild_search_index
+        _rebuild_search_index()
+
     @app.before_request
     def before_request():
         """Make logged in user available to Flask global variable g."""
+        g.password_login = False  # set by load_user_from_request
         g.user = current_user  # this calls load_user_from_request
 
     @login_manager.request_loader
@@ -116,10 +159,21 @@ def create_app():
         token = request.headers.get('Authorization', '')
         if token.startswith('Bearer '):
             token = token.replace('Bearer ', '', 1)
+            # stateless access tokens are trusted without reading the user
+            data = User.verify_stateless_token(token)
+            if data:
+                if token_revocations.is_revoked(data['id'], data['ver']):
+                    abort(401, message="Token is invalid")
+                return db.session.merge(User.reference(data['id']), load=False)
+
+            user = token_cache.get(token)
+            if user is not None:
+                return db.session.merge(user, load=False)
             data = User.verify_auth_token(token)
             user = User.query.get(data['id']) if data else None
             if not user or user.auth_token != token:
                 abort(401, message="Token is invalid")
+            token_cache.set(token, user, User.auth_token_expiry(token))
             return user
 
         # next, try to login using Basic Auth
@@ -131,7 +185,10 @@ def create_app():
                 return None
 
             user = User.query.filter_by(email=email).scalar()
-            if user and user.is_password_correct(password):
+            if user and password_checker.verify(user, password):
+                if db.session.is_modified(user):  # password was rehashed
+                    db.session.commit()
+                g.password_login = True
                 return user
 
         # finally, return None if both methods did not login the user
@@ -1,14 +1,21 @@
 """Auth API endpoints."""
 
 
-from flask import g, url_for, request
+from flask import current_app, g, url_for, request
 from flask_smorest import abort, Blueprint
 from flask_login import login_required, logout_user
 
-from bookmarks import csrf, db, utils
+from bookmarks import csrf, db, utils, response_cache
 from bookmarks.users.models import User
 
-from .schemas import UserPOSTSchema, TokenSchema, RequestPasswordResetSchema, ResetPasswordSchema
+from .schemas import (
+    UserPOSTSchema,
+    TokenSchema,
+    AccessTokenSchema,
+    RefreshTokenSchema,
+    RequestPasswordResetSchema,
+    ResetPasswordSchema
+)
 from .utils import is_recaptcha_valid
 
 
@@ -20,9 +27,22 @@ auth_api = Blueprint('auth_api', 'Auth', url_prefix='/api/v1/auth/',
 @csrf.exempt
 @login_required
 def request_token():
-    """Return new token for the user."""
+    """
+    Return new token for the user.
+
+    With stateless tokens enabled an access token is returned along with a
+    refresh token to get new access tokens with once it expires. They are
+    only issued to users logging in with their password, so a leaked access
+    token cannot be traded for a refresh token.
+    """
     if not g.user.active:
         abort(403, message='Email address is not verified yet.')
+    if current_app.config.get('STATELESS_TOKENS'):
+        if not g.password_login:
+            abort(401, message='Log in with your password to request tokens.')
+        return {'token': g.user.generate_access_token(),
+                'refresh_token': g.user.generate_refresh_token(),
+                'expires_in': current_app.config.get('ACCESS_TOKEN_TTL', 900)}
     token = g.user.generate_auth_token()
     g.user.auth_token = token
     db.session.add(g.user)
@@ -30,6 +50,20 @@ def request_token():
     return {'token': token}
 
 
+@auth_api.route('/refresh-token', methods=['POST'])
+@auth_api.arguments(RefreshTokenSchema)
+@auth_api.response(AccessTokenSchema())
+@csrf.exempt
+def refresh_token(args):
+    """Return a new access token for a refresh token."""
+    data = User.verify_stateless_token(args['refresh_token'], kind='refresh')
+    user = User.query.get(data['id']) if data else None
+    if user is None or not user.active or data['ver'] != user.token_version:
+        abort(401, message='Refresh token is invalid')
+    return {'token': user.generate_access_token(),
+            'expires_in': current_app.config.get('ACCESS_TOKEN_TTL', 900)}
+
+
 @auth_api.route('/confirm')
 @auth_api.arguments(TokenSchema, location='query')
 @csrf.exempt
@@ -57,6 +91,7 @@ def confirm(args):
     user.active = True
     db.session.add(user)
     db.session.commit()
+    response_cache.invalidate()
     return {'message': 'Your account has been activated. You can now login.'}, 200
 
 
@@ -64,8 +99,9 @@ def confirm(args):
 @csrf.exempt
 @login_required
 def logout():
-    """Logout a user."""
+    """Logout a user, revoking their tokens."""
     g.user.auth_token = ''
+    g.user.revoke_tokens()
     g.user.authenticated = False
     logout_user()
     db.session.commit()
@@ -142,6 +178,7 @@ def reset_password_post(args):
         abort(409, message='Your password reset link is invalid or has expired.')
 
     user.password = args['password']
+    user.revoke_tokens()
     db.session.add(user)
     db.session.commit()
 
@@ -1,18 +1,28 @@
 """API endpoints for bookmarks."""
 
-from flask import url_for, g
+from flask import current_app, url_for, g, request, Response, stream_with_context
 from flask.views import MethodView
 from flask_login import login_required
 from flask_smorest import Blueprint, abort
+from marshmallow import ValidationError
+
+from bookmarks import csrf, response_cache
+from bookmarks.exporter import WRITERS
+from bookmarks.importer import parse_netscape, parse_json_lines
+from bookmarks.models import Bookmark, timelines
+from bookmarks.logic import (
+    _get, _post, _put, _delete, _export, _import, _feed, _feed_bookmarks, SORTS,
+    FEED_ORDER
+)
 
-from bookmarks import csrf
-from bookmarks.models import Bookmark
-from bookmarks.logic import _get, _post, _put, _delete
-
-from .pagination import CursorPage
+from .pagination import KeysetPage
 from .schemas import (
     BookmarkSchema,
     BookmarkPOSTSchema,
+    BookmarkImportSchema,
+    BookmarksExportArgsSchema,
+    FeedArgsSchema,
+    ImportResultSchema,
     BookmarkPUTSchema,
     BookmarksQueryArgsSchema
 )
@@ -25,15 +35,34 @@ bookmarks_api = Blueprint('bookmarks_api', 'Bookmarks', url_prefix='/api/v1/book
 @bookmarks_api.route('/')
 class BookmarksAPI(MethodView):
 
-    decorators = [csrf.exempt]
+    decorators = [csrf.exempt, response_cache.cached(BookmarksQueryArgsSchema())]
 
     @bookmarks_api.arguments(BookmarksQueryArgsSchema, location='query')
     @bookmarks_api.response(BookmarkSchema(many=True))
-    @bookmarks_api.paginate(CursorPage)
-    def get(self, args):
-        """Return all bookmarks of the authenticated user."""
-        query = _get(args)
-        return query
+    @bookmarks_api.paginate()
+    def get(self, args, pagination_parameters):
+        """
+        Return all bookmarks of the authenticated user.
+
+        Bookmarks tagged with all of the `tag` arguments are returned, or
+        with any of them when `tag_mode=any`.
+
+        Pass the `X-Next-Cursor` header of a response as the `cursor`
+        argument to fetch the next page, and `count=false` to skip counting
+        the total number of bookmarks. Bookmarks sorted by relevance to the
+        `q` search query are paged by page number only.
+        """
+        page = KeysetPage(_get(args), pagination_parameters, args['sort'],
+                          SORTS.get(args['sort']), Bookmark.id,
+                          cursor=args.get('cursor'), with_count=args['count'])
+        try:
+            items = page.items
+        except ValueError as exc:
+            abort(422, message=str(exc))
+        headers = {}
+        if page.next_cursor is not None:
+            headers['X-Next-Cursor'] = page.next_cursor
+        return items, headers
 
 
 @bookmarks_api.route('/')
@@ -57,10 +86,111 @@ class BookmarksAuthAPI(MethodView):
         return {}, 201, {'location': bookmark_url}
 
 
+@bookmarks_api.route('/feed')
+class BookmarksFeedAPI(MethodView):
+
+    decorators = [csrf.exempt, login_required]
+
+    @bookmarks_api.arguments(FeedArgsSchema, location='query')
+    @bookmarks_api.response(BookmarkSchema(many=True))
+    @bookmarks_api.paginate()
+    def get(self, args, pagination_parameters):
+        """
+        Return the bookmarks of the users the authenticated user subscribed to.
+
+        The latest bookmarks are returned, newest first. Pass the
+        `X-Next-Cursor` header of a response as the `cursor` argument to fetch
+        the next page, and `count=false` to skip counting the total number of
+        bookmarks.
+        """
+        page = KeysetPage(_feed(g.user.id, pull=args.get('cursor') is None),
+                          pagination_parameters, 'date', FEED_ORDER,
+                          timelines.c.id, cursor=args.get('cursor'),
+                          with_count=args['count'])
+        try:
+            entries = page.items
+        except ValueError as exc:
+            abort(422, message=str(exc))
+        headers = {}
+        if page.next_cursor is not None:
+            headers['X-Next-Cursor'] = page.next_cursor
+        return _feed_bookmarks(entries), headers
+
+
+@bookmarks_api.route('/import')
+class BookmarksImportAPI(MethodView):
+
+    decorators = [csrf.exempt, login_required]
+
+    # errors reported back, the rest are only counted
+    max_errors = 100
+
+    @bookmarks_api.response(ImportResultSchema())
+    def post(self):
+        """
+        Import bookmarks from a file.
+
+        The body is either a bookmarks file exported by a browser, sent as
+        `text/html`, or JSON objects with a `url`, `title` and `tags`, one per
+        line, sent as `application/x-ndjson`. The body is read as a stream so
+        files of any size can be imported. Bookmarks whose url already exists
+        are skipped, titles too long are truncated and counted, and bookmarks
+        of batches that kept conflicting with other requests are counted as
+        failed.
+        """
+        if request.mimetype == 'text/html':
+            records = parse_netscape(iter(lambda: request.stream.read(64 * 1024), b''))
+        elif request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            records = parse_json_lines(request.stream)
+        else:
+            abort(415, message='Expected text/html or application/x-ndjson')
+
+        result = {'invalid': 0, 'errors': []}
+        schema = BookmarkImportSchema()
+
+        def valid(records):
+            for record in records:
+                try:
+                    if '_error' in record:
+                        raise ValidationError(record['_error'])
+                    yield schema.load(record)
+                except ValidationError as exc:
+                    result['invalid'] += 1
+                    if len(result['errors']) < self.max_errors:
+                        errors = exc.messages
+                        if not isinstance(errors, dict):
+                            errors = {'_schema': errors}
+                        result['errors'].append({'line': record['_line'],
+                                                 'errors': errors})
+
+        result.update(_import(valid(records),
+                              current_app.config.get('IMPORT_BATCH_SIZE', 500)))
+        return result
+
+
+@bookmarks_api.route('/export')
+class BookmarksExportAPI(MethodView):
+
+    decorators = [csrf.exempt, login_required]
+
+    @bookmarks_api.arguments(BookmarksExportArgsSchema, location='query')
+    def get(self, args):
+        """
+        Export bookmarks as JSON lines, CSV or a bookmarks file browsers import.
+
+        Takes the same filters and sorts as listing bookmarks. The bookmarks
+        are streamed as they are read from the database, in any number.
+        """
+        write, mimetype, extension = WRITERS[args['format']]
+        return Response(
+            stream_with_context(write(_export(args))), mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename=bookmarks.{extension}'})
+
+
 @bookmarks_api.route('/<int:id>')
 class BookmarkAPI(MethodView):
 
-    decorators = [csrf.exempt]
+    decorators = [csrf.exempt, response_cache.cached()]
 
     @bookmarks_api.response(BookmarkSchema())
     def get(self, id):
@@ -5,9 +5,10 @@ from flask_smorest import Blueprint, abort
 
 from bookmarks import csrf
 from bookmarks.models import Bookmark, Favourite
-from bookmarks.logic import _save, _unsave
+from bookmarks.logic import _favourites, _save, _unsave, FAVOURITES_ORDER
 
-from .schemas import FavouriteSchema, FavouritePOSTSchema
+from .pagination import KeysetPage
+from .schemas import FavouriteBookmarkSchema, FavouritePOSTSchema, FavouritesQueryArgsSchema
 
 
 favourites_api = Blueprint('favourites_api', 'Favourites', url_prefix='/api/v1/favourites/',
@@ -19,10 +20,28 @@ class FavouritesAPI(MethodView):
 
     decorators = [login_required, csrf.exempt]
 
-    @favourites_api.response(FavouriteSchema(many=True))
-    def get(self):
-        """Return all user's bookmark favourites."""
-        return g.user.favourites.all()
+    @favourites_api.arguments(FavouritesQueryArgsSchema, location='query')
+    @favourites_api.response(FavouriteBookmarkSchema(many=True))
+    @favourites_api.paginate()
+    def get(self, args, pagination_parameters):
+        """
+        Return user's bookmark favourites with their bookmarks, newest first.
+
+        Pass the `X-Next-Cursor` header of a response as the `cursor` argument
+        to fetch the next page, and `count=false` to skip counting the total
+        number of favourites.
+        """
+        page = KeysetPage(_favourites(g.user.id), pagination_parameters, 'saved_on',
+                          FAVOURITES_ORDER, Favourite.id, cursor=args.get('cursor'),
+                          with_count=args['count'])
+        try:
+            items = page.items
+        except ValueError as exc:
+            abort(422, message=str(exc))
+        headers = {}
+        if page.next_cursor is not None:
+            headers['X-Next-Cursor'] = page.next_cursor
+        return items, headers
 
     @favourites_api.arguments(FavouritePOSTSchema)
     def post(self, args):
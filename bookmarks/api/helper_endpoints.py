@@ -1,14 +1,16 @@
-import re
 from urllib.parse import urlparse
 
 from flask_smorest import Blueprint
 from flask_login import login_required
-from bs4 import BeautifulSoup
-import requests
 
-from bookmarks import csrf
+from bookmarks import csrf, response_cache, scraper, http_client
 
-from .schemas import SuggestTitleArgsSchema, SuggestTitleResponseSchema
+from .schemas import (
+    SuggestTitleArgsSchema,
+    SuggestTitleResponseSchema,
+    CacheStatsSchema,
+    HostStatsSchema
+)
 
 
 helper_api = Blueprint('helper_api', 'Helpers', url_prefix='/api/v1/',
@@ -23,15 +25,27 @@ helper_api = Blueprint('helper_api', 'Helpers', url_prefix='/api/v1/',
 def suggest_title(args):
     """Fetch and return the title of a page."""
     try:
-        response = requests.get(args['url'])
+        metadata = scraper.get_metadata(args['url'])
     except OSError:
         return urlparse(args['url']).path.split('/')[-2].replace('-', ' ')
-    if not response.ok:
+    if not metadata or not metadata['title']:
         return ''
-    soup = BeautifulSoup(response.content, 'html.parser')
-    if not soup.title:
-        return ''
-    title = soup.title.text
-    # get rid of extraneous whitespace in the title
-    title = re.sub(r'\s+', ' ', title, flags=re.UNICODE)
-    return {'title': title}
+    return {'title': metadata['title']}
+
+
+@helper_api.route('/cache-stats')
+@helper_api.response(CacheStatsSchema())
+@csrf.exempt
+@login_required
+def cache_stats():
+    """Return the counters of the worker's response cache."""
+    return response_cache.stats
+
+
+@helper_api.route('/http-stats')
+@helper_api.response(HostStatsSchema(many=True))
+@csrf.exempt
+@login_required
+def http_stats():
+    """Return the counters of the worker's outbound requests per host."""
+    return [dict(metrics, host=host) for host, metrics in http_client.stats.items()]
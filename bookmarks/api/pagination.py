@@ -1,7 +1,111 @@
-from flask_smorest import Page
+"""Keyset pagination for sorted queries."""
 
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_, literal
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.sql import operators
+
+
+def encode_cursor(*values):
+    """Return an opaque cursor for the given values."""
+    payload = json.dumps(values, default=lambda value: value.isoformat())
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return the values of an opaque cursor or raise ValueError."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+class KeysetPage:
+    """
+    Pager that seeks past the last item of the previous page.
+
+    The query must already be ordered by `order` followed by `key`, where
+    `key` is a unique column (usually the primary key) breaking ties of the
+    sort column. The cursor holds the sort name, the sort value and the key of
+    the last item, so fetching the next page is an index range scan no matter
+    how deep the page is. Without a cursor the page is located with OFFSET,
+    so page-number links keep working.
+
+    When `with_count` is False the total is not counted; the total reported
+    is then the number of items seen so far plus one if there are more items,
+    which is enough to tell whether a next page exists. Without an `order`
+    the items can only be paged by page number.
+    """
+
+    def __init__(self, query, page_params, sort, order, key, cursor=None,
+                 with_count=True):
+        self.query = query
+        self.page_params = page_params
+        self.sort = sort
+        self.order = order
+        self.key = key
+        self.cursor = cursor
+        self.with_count = with_count
+        self.next_cursor = None
+        self._items = None
+
+    def _seek(self, query):
+        """Filter out the items up to and including the cursor's item."""
+        if self.order is None:
+            raise ValueError('Cursor cannot be used with this sort order')
+        sort, value, key = self.cursor
+        if sort != self.sort:
+            raise ValueError('Cursor does not match the sort order')
+        column = self.order.element
+        type_ = column.type
+        if value is not None and issubclass(type_.python_type, datetime):
+            value = datetime.fromisoformat(value)
+            if not value.microsecond:
+                # SQLite stores the timestamps of server defaults without
+                # microseconds, compare in the same representation
+                type_ = type_.with_variant(sqlite.DATETIME(truncate_microseconds=True),
+                                           'sqlite')
+        # the value the cursor was encoded with, a constant the index can
+        # seek to, so the page does not move when the item's value changes
+        anchor = literal(value, type_)
+        # the redundant bound of the column alone is what the index seeks to
+        if self.order.modifier is operators.desc_op:
+            after = and_(column <= anchor, or_(
+                column < anchor, and_(column == anchor, self.key < key)))
+        else:
+            after = and_(column >= anchor, or_(
+                column > anchor, and_(column == anchor, self.key > key)))
+        return query.filter(after)
 
-class CursorPage(Page):
     @property
-    def item_count(self):
-        return self.collection.count()
+    def items(self):
+        if self._items is not None:
+            return self._items
+
+        page_size = self.page_params.page_size
+        if self.cursor is not None:
+            query = self._seek(self.query)
+        else:
+            query = self.query.offset(self.page_params.first_item)
+        rows = query.limit(page_size + 1).all()
+        has_more = len(rows) > page_size
+        self._items = rows[:page_size]
+
+        if has_more and self.order is not None:
+            last = self._items[-1]
+            self.next_cursor = encode_cursor(
+                self.sort, getattr(last, self.order.element.key),
+                getattr(last, self.key.key))
+        if self.with_count:
+            self.page_params.item_count = self.query.order_by(None).count()
+        else:
+            self.page_params.item_count = (
+                self.page_params.first_item + len(self._items) + has_more)
+        return self._items
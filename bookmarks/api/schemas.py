@@ -6,12 +6,36 @@ from bookmarks import ma
 from bookmarks.models import Bookmark, Favourite, Vote, Tag
 from bookmarks.users.models import User
 
+from .pagination import decode_cursor
+
+
+class Cursor(ma.Field):
+    """Opaque pagination cursor deserialized to its values."""
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            return decode_cursor(value)
+        except ValueError as exc:
+            raise ValidationError(str(exc))
+
 
 class TokenSchema(ma.Schema):
 
     token = ma.Str(required=True)
 
 
+class RefreshTokenSchema(ma.Schema):
+
+    refresh_token = ma.Str(required=True)
+
+
+class AccessTokenSchema(ma.Schema):
+
+    token = ma.Str()
+    refresh_token = ma.Str()
+    expires_in = ma.Int()
+
+
 class SuggestTitleArgsSchema(ma.Schema):
 
     url = ma.Url(required=True)
@@ -22,13 +46,30 @@ class SuggestTitleResponseSchema(ma.Schema):
     title = ma.Str()
 
 
+class CacheStatsSchema(ma.Schema):
+
+    hits = ma.Int()
+    misses = ma.Int()
+    evictions = ma.Int()
+    size = ma.Int()
+
+
+class HostStatsSchema(ma.Schema):
+
+    host = ma.Str()
+    requests = ma.Int()
+    failures = ma.Int()
+    latency_total = ma.Float()
+    latency_max = ma.Float()
+
+
 class UserSchema(ma.ModelSchema):
 
     class Meta:
         model = User
         # use fields instead of exlude in case new sensitive field gets added
         fields = ('id', 'username', 'email', 'created_on', 'bookmarks', 'favourites', 'votes',
-                  'subscribers', 'subscribed')
+                  'subscribers', 'subscribed', 'subscribers_count', 'subscribed_count')
 
     favourites = ma.Nested('FavouriteSchema', many=True)
     votes = ma.Nested('VoteSchema', many=True, exclude=('user_id', ))
@@ -36,6 +77,38 @@ class UserSchema(ma.ModelSchema):
     subscribers = ma.Nested('UserSchema', only=('id', 'username'), many=True)
 
 
+class UserSummarySchema(ma.Schema):
+    """User of the listing, with the counts of their collections."""
+
+    id = ma.Int()
+    username = ma.Str()
+    created_on = ma.DateTime()
+    bookmarks_count = ma.Int()
+    favourites_count = ma.Int()
+    votes_count = ma.Int()
+    subscribers_count = ma.Int()
+    subscribed_count = ma.Int()
+    # only the collections asked to be expanded are present
+    bookmarks = ma.List(ma.Int())
+    favourites = ma.Nested('FavouriteSchema', many=True)
+    votes = ma.Nested('VoteSchema', many=True, exclude=('user_id', ))
+    subscribers = ma.Nested('UserSchema', only=('id', 'username'), many=True)
+    subscribed = ma.Nested('UserSchema', only=('id', 'username'), many=True)
+
+
+class UsersQueryArgsSchema(ma.Schema):
+    """Query string parameters for getting users."""
+
+    class Meta:
+        unknown = EXCLUDE
+
+    expand = ma.List(ma.String(validate=validate.OneOf(
+        ['bookmarks', 'favourites', 'votes', 'subscribers', 'subscribed'])),
+        missing=[])
+    cursor = Cursor()
+    count = ma.Boolean(missing=True)
+
+
 class UserPOSTSchema(ma.Schema):
 
     username = ma.Str(required=True, validate=validate.Length(min=3, max=25))
@@ -62,7 +135,17 @@ class UserPUTSchema(ma.Schema):
 class TagsSchema(ma.Schema):
 
     name = ma.Str()
-    count = ma.Int()
+    count = ma.Int(attribute='bookmarks_count')
+
+
+class TagsQueryArgsSchema(ma.Schema):
+    """Query string parameters for getting tags."""
+
+    class Meta:
+        unknown = EXCLUDE
+
+    prefix = ma.Str()
+    limit = ma.Int(validate=validate.Range(min=1))
 
 
 class TagSchema(ma.SQLAlchemyAutoSchema):
@@ -77,11 +160,14 @@ class BookmarkSchema(ma.SQLAlchemyAutoSchema):
 
     class Meta:
         model = Bookmark
-        exclude = ('updated_on', )
+        exclude = ('updated_on', 'hot_score', 'trending_score', 'image_status',
+                   'image_queued_on')
 
+    rating = ma.Int(attribute='current_rating', dump_only=True)
     user = ma.Nested(UserSchema, only=('id', 'username'))
     tags = ma.Nested(TagSchema, many=True)
-    votes = ma.Nested('VoteSchema', only=('id', 'direction', 'user_id'), many=True)
+    votes = ma.Nested('VoteSchema', only=('id', 'direction', 'user_id'), many=True,
+                      attribute='votes_list')
 
 
 class BookmarksQueryArgsSchema(ma.Schema):
@@ -93,10 +179,42 @@ class BookmarksQueryArgsSchema(ma.Schema):
     id = ma.List(ma.Int())
     user_id = ma.List(ma.Int())
     tag = ma.List(ma.String(), missing=[], allow_none=True)
+    tag_mode = ma.String(validate=validate.OneOf(['all', 'any']), missing='all')
     sort = ma.String(
-        validate=validate.OneOf(['date', '-date', 'rating', '-rating']),
+        validate=validate.OneOf(['date', '-date', 'rating', '-rating', 'hot',
+                                 'trending', 'relevance']),
         missing='date'
     )
+    q = ma.String(validate=validate.Length(min=1, max=200))
+    cursor = Cursor()
+    count = ma.Boolean(missing=True)
+
+    @validates_schema
+    def validate_relevance(self, data, **kwargs):
+        if data.get('sort') == 'relevance' and not data.get('q'):
+            raise ValidationError('Sorting by relevance requires a search query',
+                                  'sort')
+
+
+class FeedArgsSchema(ma.Schema):
+    """Query string parameters for getting the feed."""
+
+    class Meta:
+        unknown = EXCLUDE
+
+    cursor = Cursor()
+    count = ma.Boolean(missing=True)
+
+
+class BookmarksExportArgsSchema(BookmarksQueryArgsSchema):
+    """Query string parameters for exporting bookmarks."""
+
+    class Meta:
+        unknown = EXCLUDE
+        exclude = ('cursor', 'count')
+
+    format = ma.String(validate=validate.OneOf(['ndjson', 'csv', 'html']),
+                       missing='ndjson')
 
 
 class BookmarkPOSTSchema(ma.SQLAlchemySchema):
@@ -107,6 +225,34 @@ class BookmarkPOSTSchema(ma.SQLAlchemySchema):
     tags = ma.List(ma.String(validate=validate.Length(min=3)), missing=['uncategorized'])
 
 
+class BookmarkImportSchema(ma.Schema):
+    """A bookmark of an import, titles are optional."""
+
+    class Meta:
+        unknown = EXCLUDE
+
+    title = ma.String(missing=None, allow_none=True)
+    url = ma.URL(required=True, schemes=('http', 'https'))
+    tags = ma.List(ma.String(validate=validate.Length(min=3, max=30)),
+                   missing=['uncategorized'])
+
+
+class ImportErrorSchema(ma.Schema):
+
+    line = ma.Int()
+    errors = ma.Dict()
+
+
+class ImportResultSchema(ma.Schema):
+
+    added = ma.Int()
+    duplicates = ma.Int()
+    invalid = ma.Int()
+    failed = ma.Int()
+    truncated = ma.Int()
+    errors = ma.Nested(ImportErrorSchema, many=True)
+
+
 class BookmarkPUTSchema(ma.SQLAlchemySchema):
     """Request arguments for creating a new bookmark."""
 
@@ -122,6 +268,27 @@ class FavouriteSchema(ma.SQLAlchemyAutoSchema):
         fields = ('bookmark_id', )
 
 
+class FavouriteBookmarkSchema(ma.SQLAlchemyAutoSchema):
+    """Favourite with its bookmark."""
+
+    class Meta:
+        model = Favourite
+        fields = ('id', 'bookmark_id', 'saved_on', 'bookmark')
+        include_fk = True
+
+    bookmark = ma.Nested(BookmarkSchema)
+
+
+class FavouritesQueryArgsSchema(ma.Schema):
+    """Query string parameters for getting favourites."""
+
+    class Meta:
+        unknown = EXCLUDE
+
+    cursor = Cursor()
+    count = ma.Boolean(missing=True)
+
+
 class FavouritePOSTSchema(ma.SQLAlchemySchema):
     """Request arguments for adding a new bookmark to favourites."""
 
@@ -3,7 +3,8 @@ from flask.views import MethodView
 from flask_login import login_required
 from flask_smorest import Blueprint, abort
 
-from bookmarks import db, csrf
+from bookmarks import csrf
+from bookmarks.logic import _subscribe, _unsubscribe
 from bookmarks.users.models import User
 from .schemas import SubscriptionsSchema, SubscriptionsGETSchema, SubscriptionsPOSTSchema
 
@@ -34,11 +35,8 @@ class SubscriptionsAPI(MethodView):
         user = User.query.get(data['user_id'])
         if not user:
             abort(409, message='User not found')
-        subscription = g.user.subscribe(user)
-        if not subscription:
+        if not _subscribe(user):
             abort(409, message='Subscription already exists')
-        db.session.add(subscription)
-        db.session.commit()
 
 
 @subscriptions_api.route('/<int:id>')
@@ -52,8 +50,5 @@ class SubscriptionAPI(MethodView):
         if id == g.user.id:
             abort(409, message='Cannot unsubscribe from yourself')
         user = User.query.get(id)
-        if not user or not g.user.is_subscribed_to(user):
+        if not user or not _unsubscribe(user):
             abort(409, message='Subscription not found')
-        g.user.unsubscribe(user)
-        db.session.add(g.user)
-        db.session.commit()
@@ -1,11 +1,10 @@
 from flask.views import MethodView
 from flask_smorest import Blueprint
-from sqlalchemy import func
 
-from bookmarks import csrf, db
-from bookmarks.models import Tag, tags_bookmarks
+from bookmarks import csrf, response_cache
+from bookmarks.models import Tag
 
-from .schemas import TagsSchema
+from .schemas import TagsSchema, TagsQueryArgsSchema
 
 tags_api = Blueprint('tags_api', 'Tags', url_prefix='/api/v1/tags/',
                      description='Operations on Tags')
@@ -14,11 +13,17 @@ tags_api = Blueprint('tags_api', 'Tags', url_prefix='/api/v1/tags/',
 @tags_api.route('/')
 class TagsAPI(MethodView):
 
-    decorators = [csrf.exempt]
+    decorators = [csrf.exempt, response_cache.cached(TagsQueryArgsSchema())]
 
+    @tags_api.arguments(TagsQueryArgsSchema, location='query')
     @tags_api.response(TagsSchema(many=True))
-    def get(self):
-        """Return all tags."""
-        temp =  db.session.query(Tag.name, func.count(Tag.id).label('count')).join(
-            tags_bookmarks).group_by(Tag.id).all()
-        return temp
+    def get(self, args):
+        """Return all tags, most used first."""
+        query = Tag.query.filter(Tag.bookmarks_count > 0)
+        if args.get('prefix'):
+            query = query.filter(Tag.name.startswith(args['prefix'].lower(),
+                                                     autoescape=True))
+        query = query.order_by(Tag.bookmarks_count.desc(), Tag.name)
+        if args.get('limit'):
+            query = query.limit(args['limit'])
+        return query.all()
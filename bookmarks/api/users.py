@@ -5,11 +5,15 @@ from flask import g, url_for, request
 from flask.views import MethodView
 from flask_login import login_required
 from flask_smorest import abort, Blueprint
+from sqlalchemy import func
+from sqlalchemy.sql.expression import asc
 
-from bookmarks import db, csrf
+from bookmarks import db, csrf, response_cache
 from bookmarks import utils
-from bookmarks.users.models import User
-from .schemas import UserPUTSchema, UserSchema
+from bookmarks.models import Bookmark, Favourite, Vote
+from bookmarks.users.models import User, subscriptions
+from .pagination import KeysetPage
+from .schemas import UserPUTSchema, UserSchema, UserSummarySchema, UsersQueryArgsSchema
 
 
 users_api = Blueprint('users_api', 'Users', url_prefix='/api/v1/users/',
@@ -27,12 +31,76 @@ def me():
 @users_api.route('/')
 class UsersAPI(MethodView):
 
-    decorators = [csrf.exempt]
-
-    @users_api.response(UserSchema(many=True, exclude=("email", )))
-    def get(self):
-        """Return all users."""
-        return User.query.filter_by(active=True)
+    decorators = [csrf.exempt, response_cache.cached(UsersQueryArgsSchema())]
+
+    @users_api.arguments(UsersQueryArgsSchema, location='query')
+    @users_api.response(UserSummarySchema(many=True))
+    @users_api.paginate()
+    def get(self, args, pagination_parameters):
+        """
+        Return the active users with the number of their bookmarks, favourites,
+        votes, subscribers and subscriptions.
+
+        Pass any of `bookmarks`, `favourites`, `votes`, `subscribers` and
+        `subscribed` as `expand` arguments to include these collections too.
+        Pass the `X-Next-Cursor` header of a response as the `cursor` argument
+        to fetch the next page, and `count=false` to skip counting the users.
+        """
+        query = User.query.filter_by(active=True).order_by(User.id)
+        page = KeysetPage(query, pagination_parameters, 'id', asc(User.id), User.id,
+                          cursor=args.get('cursor'), with_count=args['count'])
+        try:
+            users = page.items
+        except ValueError as exc:
+            abort(422, message=str(exc))
+        headers = {}
+        if page.next_cursor is not None:
+            headers['X-Next-Cursor'] = page.next_cursor
+        return _summaries(users, args['expand']), headers
+
+
+def _summaries(users, expand):
+    """
+    Return the users with the counts of their collections, as dictionaries.
+
+    The counts and every collection expanded are read with one query each
+    for all the users, whatever their number.
+    """
+    ids = [user.id for user in users]
+    summaries = {user.id: {'id': user.id, 'username': user.username,
+                           'created_on': user.created_on,
+                           'subscribers_count': user.subscribers_count,
+                           'subscribed_count': user.subscribed_count}
+                 for user in users}
+    if not ids:
+        return []
+    for name, model in (('bookmarks', Bookmark), ('favourites', Favourite),
+                        ('votes', Vote)):
+        counts = dict(db.session.query(model.user_id, func.count()).filter(
+            model.user_id.in_(ids)).group_by(model.user_id))
+        for id_ in ids:
+            summaries[id_][name + '_count'] = counts.get(id_, 0)
+
+    collections = {
+        'bookmarks': db.session.query(Bookmark.user_id, Bookmark.id).filter(
+            Bookmark.user_id.in_(ids)).order_by(Bookmark.id),
+        'favourites': db.session.query(Favourite.user_id, Favourite).filter(
+            Favourite.user_id.in_(ids)).order_by(Favourite.id),
+        'votes': db.session.query(Vote.user_id, Vote).filter(
+            Vote.user_id.in_(ids)).order_by(Vote.id),
+        'subscribers': db.session.query(subscriptions.c.subscribed_id, User).join(
+            User, User.id == subscriptions.c.subscriber_id).filter(
+            subscriptions.c.subscribed_id.in_(ids)).order_by(User.id),
+        'subscribed': db.session.query(subscriptions.c.subscriber_id, User).join(
+            User, User.id == subscriptions.c.subscribed_id).filter(
+            subscriptions.c.subscriber_id.in_(ids)).order_by(User.id),
+    }
+    for name in set(expand):
+        for id_ in ids:
+            summaries[id_][name] = []
+        for id_, item in collections[name]:
+            summaries[id_][name].append(item)
+    return [summaries[id_] for id_ in ids]
 
 
 @users_api.route('/<int:id>')
@@ -77,6 +145,7 @@ class UserAPI(MethodView):
                 abort(409, message='Current password is wrong')
             g.user.auth_token = ''
             g.user.password = data['newPassword']
+            g.user.revoke_tokens()
             text = (
                 'The password for your PyBook account on <a href="{}">{}</a> '
                 'has successfully\nbeen changed.\n\nIf you did not initiate '
@@ -86,3 +155,4 @@ class UserAPI(MethodView):
 
         db.session.add(g.user)
         db.session.commit()
+        response_cache.invalidate()
@@ -1,12 +1,14 @@
 from flask import current_app
-import requests
+
+from bookmarks import http_client
+
 
 def is_recaptcha_valid(token):
     payload = {
         'secret': current_app.config.get('RECAPTCHA_PRIVATE_KEY', ''),
         'response': token
     }
-    response = requests.post(
+    response = http_client.post(
         'https://www.google.com/recaptcha/api/siteverify',
         payload
     )
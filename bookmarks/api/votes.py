@@ -4,9 +4,10 @@ from flask import url_for, g
 from flask.views import MethodView
 from flask_login import login_required
 from flask_smorest import Blueprint, abort
+from sqlalchemy.exc import IntegrityError
 
 from bookmarks import csrf
-from bookmarks.models import Bookmark, Vote
+from bookmarks.models import Vote
 from .schemas import VoteSchema, VotePOSTSchema, VotePUTSchema
 from ..logic import _post_vote, _put_vote, _delete_vote
 
@@ -28,13 +29,13 @@ class VotesAPI(MethodView):
     @votes_api.arguments(VotePOSTSchema)
     def post(self, data):
         """Add a new vote for a bookmark."""
-        if Vote.query.filter_by(user_id=g.user.id, bookmark_id=data['bookmark_id']).scalar():
+        try:
+            vote_id = _post_vote(data['bookmark_id'], data['direction'])
+        except IntegrityError:
             abort(409, message='Vote already exists')
-        bookmark = Bookmark.query.get(data['bookmark_id'])
-        if bookmark is None:
+        if vote_id is None:
             abort(404, message='Bookmark not found')
 
-        vote_id = _post_vote(bookmark, data['direction'])
         vote_url = url_for(
             'votes_api.VoteAPI',
             id=vote_id,
@@ -62,9 +63,10 @@ class VoteAPI(MethodView):
         vote = Vote.query.get(id)
         if vote is None:
             abort(404, message='Vote not found')
-        if vote.user != g.user:
+        if vote.user_id != g.user.id:
             abort(403, message='Vote belongs to different user')
-        _put_vote(vote, data['direction'])
+        if not _put_vote(vote, data['direction']):
+            abort(409, message='Vote is being changed, try again')
         vote_url = url_for(
             'votes_api.VoteAPI',
             id=vote.id,
@@ -79,6 +81,7 @@ class VoteAPI(MethodView):
         vote = Vote.query.get(id)
         if vote is None:
             abort(404, message='Vote not found')
-        if vote.user != g.user:
+        if vote.user_id != g.user.id:
             abort(403, message='Vote belongs to different user')
-        _delete_vote(vote)
+        if not _delete_vote(vote):
+            abort(409, message='Vote is being changed, try again')
@@ -0,0 +1,208 @@
+"""Response cache for the anonymous read endpoints."""
+
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+import json
+import time
+
+from flask import current_app, request
+from marshmallow import ValidationError, fields
+
+
+class LRUCache:
+    """Bounded in-process mapping evicting the least recently used entries."""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                return default
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LocalBackend:
+    """
+    In-memory stand-in for a shared backend.
+
+    Implements the subset of the redis client interface the response cache
+    uses, so a `redis.Redis` instance can be used in its place.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = Lock()
+
+    def get(self, name):
+        with self._lock:
+            value, expires_at = self._values.get(name, (None, None))
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._values[name]
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        expires_at = time.monotonic() + ex if ex else None
+        with self._lock:
+            self._values[name] = (value, expires_at)
+
+    def incr(self, name):
+        with self._lock:
+            value = int(self._values.get(name, (0, None))[0]) + 1
+            self._values[name] = (value, None)
+            return value
+
+
+class ResponseCache:
+    """
+    Two tier cache of serialized responses.
+
+    Responses are kept in a process-local LRU and, when configured, in a
+    shared backend (redis or anything with the same get/set/incr interface)
+    so all workers share them. Keys include a generation number which every
+    write bumps, so invalidating drops every cached response at once without
+    having to find them. Without a shared backend the generation is local to
+    the process, so the TTL bounds how stale the other workers can get.
+    """
+
+    GENERATION_KEY = 'response-cache:generation'
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 60
+        self._local = LRUCache()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        # guards the counters, shared by the threads of a worker
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._local = LRUCache(app.config.get('RESPONSE_CACHE_SIZE', 512))
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', 60)
+        url = app.config.get('RESPONSE_CACHE_REDIS_URL')
+        if url:
+            import redis  # optional dependency, only needed for a shared cache
+            self.backend = redis.Redis.from_url(url)
+        app.extensions['response_cache'] = self
+
+    @property
+    def stats(self):
+        """Return the hit, miss and eviction counters."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self._local.evictions, 'size': len(self._local)}
+
+    def _current_generation(self):
+        if self.backend is None:
+            return self._generation
+        return int(self.backend.get(self.GENERATION_KEY) or 0)
+
+    def invalidate(self):
+        """Drop every cached response."""
+        with self._lock:
+            self._generation += 1
+        self._local.clear()
+        if self.backend is not None:
+            self.backend.incr(self.GENERATION_KEY)
+
+    def clear(self):
+        """Drop every cached response and reset the counters."""
+        self.invalidate()
+        with self._lock:
+            self.hits = self.misses = self._local.evictions = 0
+
+    def _make_key(self, schema):
+        """Return the key of the current request."""
+        args = dict(request.args.lists())
+        if schema is not None:
+            # normalize the arguments by applying the schema's defaults
+            given = {name: args.pop(name) for name in list(args)
+                     if name in schema.fields}
+            args.update(schema.load({
+                name: values if isinstance(schema.fields[name], fields.List)
+                else values[0] for name, values in given.items()
+            }))
+        return json.dumps([self._current_generation(), request.endpoint,
+                           request.view_args, args], sort_keys=True, default=str)
+
+    def _lookup(self, key):
+        now = time.monotonic()
+        entry = self._local.get(key)
+        if entry is not None and entry['expires_at'] > now:
+            return entry
+        if self.backend is not None:
+            raw = self.backend.get(key)
+            if raw is not None:
+                entry = dict(json.loads(raw), expires_at=now + self.ttl)
+                self._local.set(key, entry)
+                return entry
+        return None
+
+    def _store(self, key, response):
+        entry = {'body': response.get_data(as_text=True),
+                 'status': response.status_code,
+                 'headers': [(name, value) for name, value in response.headers
+                             if name.lower() != 'content-length']}
+        if self.backend is not None:
+            self.backend.set(key, json.dumps(entry), ex=self.ttl)
+        self._local.set(key, dict(entry, expires_at=time.monotonic() + self.ttl))
+
+    def cached(self, schema=None):
+        """
+        Decorator caching the responses of a view for anonymous requests.
+
+        When the `schema` of the view's query arguments is given, the cache
+        key is built from the deserialized arguments, so requests that differ
+        only in the order or the defaults of their arguments share an entry.
+        """
+        def decorator(view):
+
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if 'Authorization' in request.headers:
+                    return view(*args, **kwargs)
+                try:
+                    key = self._make_key(schema)
+                except ValidationError:  # let the view report invalid arguments
+                    return view(*args, **kwargs)
+
+                entry = self._lookup(key)
+                if entry is not None:
+                    with self._lock:
+                        self.hits += 1
+                    return current_app.response_class(
+                        entry['body'], entry['status'], entry['headers'])
+
+                with self._lock:
+                    self.misses += 1
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code == 200:
+                    self._store(key, response)
+                return response
+
+            return wrapper
+        return decorator
@@ -0,0 +1,59 @@
+"""Write bookmarks in formats other services and browsers can import."""
+
+from html import escape
+import calendar
+import csv
+import io
+import json
+
+CSV_COLUMNS = ('id', 'url', 'title', 'tags', 'rating', 'created_on')
+
+
+def _timestamp(created_on):
+    return calendar.timegm(created_on.utctimetuple()) if created_on else ''
+
+
+def write_ndjson(chunks):
+    """Yield a JSON object per line for every bookmark of the chunks."""
+    for bookmarks in chunks:
+        yield ''.join(json.dumps(dict(
+            bookmark, created_on=bookmark['created_on'] and
+            bookmark['created_on'].isoformat())) + '\n' for bookmark in bookmarks)
+
+
+def write_csv(chunks):
+    """Yield the rows of a CSV file with a header, tags separated by commas."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, CSV_COLUMNS)
+    writer.writeheader()
+    for bookmarks in chunks:
+        writer.writerows(dict(bookmark, tags=','.join(bookmark['tags']),
+                              created_on=bookmark['created_on'] and
+                              bookmark['created_on'].isoformat())
+                         for bookmark in bookmarks)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_netscape(chunks):
+    """Yield a bookmarks file in the Netscape format browsers import."""
+    yield ('<!DOCTYPE NETSCAPE-Bookmark-file-1>\n'
+           '<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">\n'
+           '<TITLE>Bookmarks</TITLE>\n<H1>Bookmarks</H1>\n<DL><p>\n')
+    for bookmarks in chunks:
+        yield ''.join(
+            f'    <DT><A HREF="{escape(bookmark["url"])}" '
+            f'ADD_DATE="{_timestamp(bookmark["created_on"])}" '
+            f'TAGS="{escape(",".join(bookmark["tags"]))}">'
+            f'{escape(bookmark["title"] or bookmark["url"])}</A>\n'
+            for bookmark in bookmarks)
+    yield '</DL><p>\n'
+
+
+WRITERS = {
+    'ndjson': (write_ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (write_csv, 'text/csv', 'csv'),
+    'html': (write_netscape, 'text/html', 'html'),
+}
@@ -0,0 +1,118 @@
+"""Outbound HTTP client shared across the application."""
+
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+from urllib.parse import urlparse
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ResponseTooLarge(requests.RequestException):
+    """The body of the response exceeds the configured limit."""
+
+
+class HostBusy(requests.ConnectionError):
+    """Too many requests to the same host are already in progress."""
+
+
+class HTTPClient:
+    """
+    Pooled HTTP client with timeouts, a body limit and per-host caps.
+
+    Connections are kept alive in a pool per host, every request is bounded
+    by connect/read timeouts, bodies larger than `HTTP_MAX_BODY` are refused
+    and at most `HTTP_MAX_PER_HOST` requests run against a host at once.
+    Latency until the response headers and failures are counted per host.
+    """
+
+    def __init__(self, app=None):
+        self.session = None
+        self.timeout = (3.05, 10)
+        self.max_body = 2 * 1024 * 1024
+        self.max_per_host = 4
+        self._slots = {}
+        self._metrics = {}
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.timeout = (app.config.get('HTTP_CONNECT_TIMEOUT', 3.05),
+                        app.config.get('HTTP_READ_TIMEOUT', 10))
+        self.max_body = app.config.get('HTTP_MAX_BODY', self.max_body)
+        self.max_per_host = app.config.get('HTTP_MAX_PER_HOST', self.max_per_host)
+        adapter = HTTPAdapter(pool_connections=app.config.get('HTTP_POOL_HOSTS', 20),
+                              pool_maxsize=app.config.get('HTTP_POOL_SIZE', 10))
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        app.extensions['http_client'] = self
+
+    @property
+    def stats(self):
+        """Return the request, failure and latency counters per host."""
+        with self._lock:
+            return {host: dict(metrics) for host, metrics in self._metrics.items()}
+
+    def _record(self, host, started, failed):
+        latency = time.monotonic() - started
+        with self._lock:
+            metrics = self._metrics.setdefault(host, {
+                'requests': 0, 'failures': 0, 'latency_total': 0.0, 'latency_max': 0.0})
+            metrics['requests'] += 1
+            metrics['failures'] += failed
+            metrics['latency_total'] += latency
+            metrics['latency_max'] = max(metrics['latency_max'], latency)
+
+    @contextmanager
+    def _slot(self, host):
+        """Hold one of the concurrent request slots of the host."""
+        with self._lock:
+            slot = self._slots.setdefault(host, BoundedSemaphore(self.max_per_host))
+        if not slot.acquire(timeout=self.timeout[0]):
+            raise HostBusy(f'Too many concurrent requests to {host}')
+        try:
+            yield
+        finally:
+            slot.release()
+
+    def _send(self, method, url, **kwargs):
+        host = urlparse(url).netloc
+        kwargs.setdefault('timeout', self.timeout)
+        started = time.monotonic()
+        try:
+            response = self.session.request(method, url, stream=True, **kwargs)
+        except requests.RequestException:
+            self._record(host, started, failed=True)
+            raise
+        self._record(host, started, failed=not response.ok)
+        return response
+
+    @contextmanager
+    def stream(self, method, url, **kwargs):
+        """Send a request and yield the response with its body unread."""
+        with self._slot(urlparse(url).netloc):
+            response = self._send(method, url, **kwargs)
+            try:
+                yield response
+            finally:
+                response.close()
+
+    def request(self, method, url, **kwargs):
+        """Send a request and return the response with its body read."""
+        with self.stream(method, url, **kwargs) as response:
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                body.extend(chunk)
+                if len(body) > self.max_body:
+                    raise ResponseTooLarge(f'Response of {url} is too large')
+            response._content = bytes(body)
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request('POST', url, data=data, **kwargs)
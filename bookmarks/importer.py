@@ -0,0 +1,67 @@
+"""Parse bookmarks exported by browsers and other bookmarking services."""
+
+from html.parser import HTMLParser
+import codecs
+import json
+
+
+class NetscapeParser(HTMLParser):
+    """
+    Incremental parser of the Netscape bookmark file format.
+
+    Every link becomes a record of its url, title and the comma separated
+    tags of its TAGS attribute, along with the line it starts on.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.records = []
+        self._record = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a':
+            return
+        attrs = dict(attrs)
+        record = {'url': attrs.get('href'), 'title': '', '_line': self.getpos()[0]}
+        tags = [name.strip() for name in (attrs.get('tags') or '').split(',')]
+        if any(tags):
+            record['tags'] = [name for name in tags if name]
+        self._record = record
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self._record is not None:
+            self._record['title'] = ' '.join(self._record['title'].split()) or None
+            self.records.append(self._record)
+            self._record = None
+
+    def handle_data(self, data):
+        if self._record is not None:
+            self._record['title'] += data
+
+
+def parse_netscape(chunks):
+    """Yield the records of an iterable of byte chunks of a bookmarks file."""
+    parser = NetscapeParser()
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    for chunk in chunks:
+        parser.feed(decoder.decode(chunk))
+        yield from parser.records
+        parser.records.clear()
+    parser.feed(decoder.decode(b'', final=True))
+    parser.close()
+    yield from parser.records
+
+
+def parse_json_lines(lines):
+    """Yield the records of an iterable of lines of JSON objects."""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            record = {'_error': 'Not a JSON object'}
+        record['_line'] = number
+        yield record
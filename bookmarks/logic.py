@@ -1,15 +1,31 @@
 """The logic around bookmarks so both api and regular views share."""
 
 
-from flask import g
+from collections import Counter, defaultdict
+from itertools import islice
+
+from flask import current_app, g
+from sqlalchemy import and_, bindparam, func, literal, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager, selectinload
+from sqlalchemy.sql import operators
 from sqlalchemy.sql.expression import asc, desc
 
-from bookmarks import db
+from bookmarks import db, ranking, rating_buffer, response_cache, search_index
 from bookmarks.views import utils
-from .models import Bookmark, Tag, tags_bookmarks, Vote, Favourite
+from bookmarks.users.models import User, subscriptions
+from .models import (
+    Bookmark, Tag, tags_bookmarks, timelines, Vote, Favourite, insert_ignore
+)
 
 SORTS = {'date': desc(Bookmark.created_on), '-date': asc(Bookmark.created_on),
-         'rating': desc(Bookmark.rating), '-rating': asc(Bookmark.rating)}
+         'rating': desc(Bookmark.rating), '-rating': asc(Bookmark.rating),
+         'hot': desc(Bookmark.hot_score), 'trending': desc(Bookmark.trending_score)}
+FEED_ORDER = desc(timelines.c.created_on)
+FAVOURITES_ORDER = desc(Favourite.saved_on)
+VOTE_VALUES = {True: 1, False: -1, None: 0}
+# times a vote changed concurrently is read again before giving up
+VOTE_RETRIES = 5
 
 
 def _get(args):
@@ -19,80 +35,484 @@ def _get(args):
     This function returns the query comparing to other functions because the
     regular view paginates the query where the api view applies schema in order
     to return the result in json.
+
+    The user, tags and votes of the bookmarks are loaded in one query each
+    for the whole page, instead of one query per bookmark when serialized.
     """
-    query = Bookmark.query
+    query = Bookmark.query.options(
+        selectinload(Bookmark.user),
+        selectinload(Bookmark.tags),
+        selectinload(Bookmark.votes_list)
+    )
+    return _filter(query, args)
+
+
+def _filter(query, args):
+    """Filter and order a query of bookmarks by the arguments of the listing."""
     if args.get('user_id'):
         query = query.filter(Bookmark.user_id.in_(args['user_id']))
     if args.get('id'):
         query = query.filter(Bookmark.id.in_(args['id']))
-    for tag in args.get('tag', []):
-        query = query.filter(Tag.name == tag)
     if args.get('tag'):
-        query = query.join(tags_bookmarks).join(Tag)
-    query = query.order_by(SORTS[args['sort']])
+        query = query.filter(Bookmark.id.in_(
+            _tagged(args['tag'], match_all=args.get('tag_mode', 'all') == 'all')))
+    if args.get('q'):
+        query = search_index.filter(query, Bookmark, args['q'])
+    if args['sort'] == 'relevance':
+        return query.order_by(search_index.rank(Bookmark, args['q']), desc(Bookmark.id))
+    order = SORTS[args['sort']]
+    tiebreaker = desc(Bookmark.id) if order.modifier is operators.desc_op \
+        else asc(Bookmark.id)
+    query = query.order_by(order, tiebreaker)
 
     return query
 
 
+def _export(args, chunk_size=1000):
+    """
+    Yield the bookmarks matching the arguments, in lists of up to chunk_size.
+
+    The bookmarks are plain rows streamed from a server-side cursor along
+    with the names of their tags, fetched with one query per chunk, so memory
+    use does not grow with the number of bookmarks.
+    """
+    query = _filter(db.session.query(
+        Bookmark.id, Bookmark.url, Bookmark.title, Bookmark.rating,
+        Bookmark.created_on), args).yield_per(chunk_size)
+    for rows in _chunks(query, chunk_size):
+        tags = defaultdict(list)
+        names = db.session.query(tags_bookmarks.c.bookmark_id, Tag.name).join(
+            Tag, Tag.id == tags_bookmarks.c.tag_id).filter(
+            tags_bookmarks.c.bookmark_id.in_([row.id for row in rows])).order_by(Tag.name)
+        for bookmark_id, name in names:
+            tags[bookmark_id].append(name)
+        yield [dict(row._asdict(), tags=tags[row.id]) for row in rows]
+
+
+def _tagged(names, match_all=True):
+    """
+    Return the subquery of the ids of bookmarks tagged with the given names.
+
+    Bookmarks having all of the tags are returned when `match_all` is true,
+    bookmarks having any of them otherwise. The tag ids are looked up once and
+    the bookmark ids are read off the (tag_id, bookmark_id) index, so the
+    bookmarks table is only touched for the bookmarks matching.
+    """
+    names = {name.lower() for name in names}
+    tag_ids = select([Tag.id]).where(Tag.name.in_(names))
+    bookmark_ids = select([tags_bookmarks.c.bookmark_id]).where(
+        tags_bookmarks.c.tag_id.in_(tag_ids))
+    if match_all:
+        bookmark_ids = bookmark_ids.group_by(tags_bookmarks.c.bookmark_id).having(
+            func.count(tags_bookmarks.c.tag_id.distinct()) == len(names))
+    return bookmark_ids
+
+
 def _post(data):
     """Add a new bookmark according to the given data."""
+    tags = _tags({string.lower() for string in data['tags']})
     bookmark = Bookmark(title=data['title'], url=data['url'],
-                        user_id=g.user.id)
-    for string in data['tags']:
-        tag = Tag.query.filter_by(name=string.lower()).scalar()
-        if tag is None:
-            tag = Tag(name=string.lower())
-            db.session.add(tag)
-        bookmark.tags.append(tag)
-
+                        user_id=g.user.id, tags=tags)
     db.session.add(bookmark)
+    db.session.flush()
+    ranking.rescore(db.session, [bookmark.id])
+    search_index.index(db.session, bookmark)
+    _fan_out(bookmark.id, g.user.id)
     db.session.commit()
-    # TODO add method to bookmark's class
-    utils.get_url_thumbnail(data['url'], bookmark.id)
+    response_cache.invalidate()
+    utils.queue_thumbnail(bookmark)
     return bookmark.id
 
 
+def _insert_missing(table, rows):
+    """Insert rows, skipping the ones a concurrent request inserted meanwhile."""
+    db.session.execute(insert_ignore(table), rows)
+
+
+def _tags(names):
+    """
+    Return the tags with the given names to link to a bookmark, adding the
+    missing ones.
+
+    The tags are counted for the bookmark right away, which locks their rows
+    until the bookmark is committed, so `_release_tags` cannot delete them
+    meanwhile. A tag it deleted after being read is counted on no row, and
+    is added again.
+    """
+    tags, names = [], set(names)
+    while names:
+        found = Tag.query.filter(Tag.name.in_(names)).all()
+        missing = names - {tag.name for tag in found}
+        if missing:
+            _insert_missing(Tag.__table__, [{'name': name, 'bookmarks_count': 0}
+                                            for name in sorted(missing)])
+            found += Tag.query.filter(Tag.name.in_(missing)).all()
+        ids = [tag.id for tag in found]
+        if _count_tags(ids, 1) < len(ids):  # some were deleted meanwhile
+            found = Tag.query.filter(Tag.id.in_(ids)).all()
+        tags += found
+        names -= {tag.name for tag in found}
+    return tags
+
+
+def _count_tags(tag_ids, delta):
+    """Add delta to the bookmark counters of the tags, return the tags counted."""
+    if not tag_ids:
+        return 0
+    return Tag.query.filter(Tag.id.in_(tag_ids)).update(
+        {Tag.bookmarks_count: Tag.bookmarks_count + delta},
+        synchronize_session=False)
+
+
+def _release_tags(tag_ids):
+    """
+    Count down the tags unlinked from a bookmark and delete the orphaned ones.
+
+    Only tags counting no bookmark and linked to none are deleted, and the
+    count is checked against the latest row, so a tag `_tags` counted for a
+    bookmark not committed yet is kept.
+    """
+    if not tag_ids:
+        return
+    _count_tags(tag_ids, -1)
+    linked = select([tags_bookmarks.c.tag_id]).where(
+        tags_bookmarks.c.tag_id.in_(tag_ids))
+    Tag.query.filter(Tag.id.in_(tag_ids), Tag.bookmarks_count <= 0,
+                     ~Tag.id.in_(linked)).delete(synchronize_session=False)
+
+
+def _tag_ids(names):
+    """Return the ids of the tags with the given names, adding the missing ones."""
+    if not names:
+        return {}
+    ids = dict(db.session.query(Tag.name, Tag.id).filter(Tag.name.in_(names)))
+    missing = set(names) - ids.keys()
+    if missing:
+        _insert_missing(Tag.__table__, [{'name': name, 'bookmarks_count': 0}
+                                        for name in sorted(missing)])
+        ids.update(db.session.query(Tag.name, Tag.id).filter(Tag.name.in_(missing)))
+    return ids
+
+
+def _import_batch(records):
+    """
+    Add the bookmarks of a batch whose urls are new.
+
+    Return the ids added and the number of their titles cut to fit the column.
+    """
+    by_url = {}
+    for record in records:
+        by_url.setdefault(record['url'], record)
+    existing = db.session.query(Bookmark.url).filter(Bookmark.url.in_(by_url))
+    for url, in existing:
+        del by_url[url]
+    if not by_url:
+        return [], 0
+
+    tags = {url: sorted({name.lower() for name in record['tags']})
+            for url, record in by_url.items()}
+    tag_ids = _tag_ids({name for names in tags.values() for name in names})
+    title_length = Bookmark.__table__.c.title.type.length
+    db.session.execute(Bookmark.__table__.insert(), [
+        {'url': url, 'title': (record['title'] or '')[:title_length] or None,
+         'user_id': g.user.id}
+        for url, record in by_url.items()])
+    truncated = sum(len(record['title'] or '') > title_length
+                    for record in by_url.values())
+    ids = dict(db.session.query(Bookmark.url, Bookmark.id).filter(
+        Bookmark.url.in_(by_url)))
+    links = [{'bookmark_id': ids[url], 'tag_id': tag_ids[name]}
+             for url, names in tags.items() for name in names]
+    db.session.execute(tags_bookmarks.insert(), links)
+    counts = Counter(link['tag_id'] for link in links)
+    db.session.execute(
+        Tag.__table__.update().where(Tag.id == bindparam('tag_id')).values(
+            bookmarks_count=Tag.bookmarks_count + bindparam('count')),
+        [{'tag_id': tag_id, 'count': count} for tag_id, count in counts.items()])
+    search_index.add_many(db.session, [
+        (ids[url], record['title'], url, tags[url]) for url, record in by_url.items()])
+    ranking.rescore(db.session, list(ids.values()))
+    db.session.commit()
+    return list(ids.values()), truncated
+
+
+def _import(records, batch_size=500):
+    """
+    Add the bookmarks of an import, skipping urls that already exist.
+
+    The records are consumed in batches, each inserted in a transaction of
+    its own with a fixed number of statements, whatever the number of its
+    bookmarks and tags. A batch conflicting with a concurrent request is
+    retried once, then counted as failed while the other batches go on.
+    Thumbnails are fetched in the background afterwards. Return the number of
+    bookmarks added, of duplicates skipped, of bookmarks in failed batches
+    and of titles truncated.
+    """
+    result = {'added': 0, 'duplicates': 0, 'failed': 0, 'truncated': 0}
+    for batch in _chunks(records, batch_size):
+        try:
+            ids, truncated = _import_batch(batch)
+        except IntegrityError:  # some url was added meanwhile
+            db.session.rollback()
+            try:
+                ids, truncated = _import_batch(batch)
+            except IntegrityError:  # e.g. a tag was deleted meanwhile
+                db.session.rollback()
+                result['failed'] += len(batch)
+                continue
+        result['added'] += len(ids)
+        result['duplicates'] += len(batch) - len(ids)
+        result['truncated'] += truncated
+        utils.queue_thumbnails(ids)
+    response_cache.invalidate()
+    return result
+
+
+def _chunks(iterable, size):
+    """Yield lists of up to size items of the iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 def _put(id, data):
     """Update bookmark with the given data."""
     bookmark = Bookmark.query.get(id)
-    if 'url' in data and data['url'] != bookmark.url:
-        # FIXME when url changes, should grab the new favicon/image
+    url_changed = 'url' in data and data['url'] != bookmark.url
+    if url_changed:
         bookmark.url = data['url']
+        bookmark.image = None
     if 'title' in data and data['title'] != bookmark.title:
         bookmark.title = data['title']
 
-    given_tags = {string.lower() for string in data.get('tags', [])}
-    linked_tags = {tag.name: tag for tag in bookmark.tags}
-    tags_to_del = set(linked_tags.keys()) - given_tags
-    tags_to_add = given_tags - set(linked_tags.keys())
-    if given_tags != set(linked_tags.keys()):
-        for name in tags_to_del:  # un-link not given tags
-            tag_to_del = linked_tags[name]
-            if db.session.query(tags_bookmarks).filter_by(
-                    tag_id=tag_to_del.id).count() == 1:
-                db.session.delete(tag_to_del)
-            bookmark.tags.remove(tag_to_del)
-
-        existing = Tag.query.filter(Tag.name.in_(tags_to_add)).all()
-        existing_tags = {tag.name: tag for tag in existing}
-        for new_string in tags_to_add:  # link the given tags
-            tag = existing_tags.get(new_string, Tag(name=new_string))
-            bookmark.tags.append(tag)
+    removed, added = [], []
+    if 'tags' in data:
+        given_tags = {string.lower() for string in data['tags']}
+        linked_tags = {tag.name: tag for tag in bookmark.tags}
+        removed = [linked_tags[name] for name in linked_tags.keys() - given_tags]
+        added = _tags(given_tags - linked_tags.keys())
+        for tag in removed:
+            bookmark.tags.remove(tag)
+        bookmark.tags.extend(added)
 
     db.session.add(bookmark)
+    db.session.flush()
+    _release_tags([tag.id for tag in removed])
+    search_index.index(db.session, bookmark)
     db.session.commit()
+    response_cache.invalidate()
+    if url_changed:
+        utils.queue_thumbnail(bookmark, url_changed=True)
 
 
 def _delete(id):
     """Delete a bookmark."""
     bookmark = Bookmark.query.get(id)
-    # Delete associated tags
-    for tag in bookmark.tags:
-        if db.session.query(tags_bookmarks).filter_by(
-                tag_id=tag.id).count() == 1:
-            db.session.delete(tag)
+    tag_ids = [tag.id for tag in bookmark.tags]
+    search_index.remove(db.session, bookmark.id)
+    db.session.execute(timelines.delete().where(timelines.c.bookmark_id == id))
     db.session.delete(bookmark)
+    db.session.flush()
+    _release_tags(tag_ids)
+    db.session.commit()
+    response_cache.invalidate()
+
+
+def _timeline_rows(user_id):
+    """Return the columns of the timeline entries of a user's bookmarks."""
+    return [literal(user_id, db.Integer), Bookmark.id, Bookmark.user_id,
+            Bookmark.created_on]
+
+
+def _insert_into_timeline(rows):
+    """Add the rows selected to timelines, skipping the bookmarks already in."""
+    db.session.execute(insert_ignore(timelines).from_select(
+        ['user_id', 'bookmark_id', 'author_id', 'created_on'], rows))
+
+
+def _fan_out(bookmark_id, author_id):
+    """
+    Add a new bookmark to the timelines of the subscribers of its author.
+
+    The bookmarks of users with more than `FEED_FANOUT_LIMIT` subscribers are
+    not copied to that many timelines, their subscribers pull them when
+    reading their feed instead.
+    """
+    limit = current_app.config.get('FEED_FANOUT_LIMIT', 5000)
+    if db.session.query(User.subscribers_count).filter_by(id=author_id).scalar() > limit:
+        return
+    _insert_into_timeline(select([
+        subscriptions.c.subscriber_id, Bookmark.id, Bookmark.user_id,
+        Bookmark.created_on]).where(and_(
+            Bookmark.id == bookmark_id,
+            subscriptions.c.subscribed_id == Bookmark.user_id)))
+
+
+def _pull_into_timeline(user_id):
+    """
+    Add the new bookmarks of the popular users subscribed to, see `_fan_out`.
+
+    Only the bookmarks of each user at least as new as their newest bookmark
+    in the timeline are read.
+    """
+    limit = current_app.config.get('FEED_FANOUT_LIMIT', 5000)
+    popular = [author_id for author_id, in db.session.query(
+        subscriptions.c.subscribed_id).join(
+        User, User.id == subscriptions.c.subscribed_id).filter(
+        subscriptions.c.subscriber_id == user_id, User.subscribers_count > limit)]
+    if not popular:
+        return
+    latest = select([func.max(timelines.c.created_on)]).where(and_(
+        timelines.c.user_id == user_id,
+        timelines.c.author_id == Bookmark.user_id)).as_scalar()
+    _insert_into_timeline(select(_timeline_rows(user_id)).where(and_(
+        Bookmark.user_id.in_(popular),
+        or_(latest.is_(None), Bookmark.created_on >= latest))).order_by(
+        desc(Bookmark.created_on), desc(Bookmark.id)).limit(
+        current_app.config.get('FEED_LENGTH', 1000)))
+    db.session.commit()
+
+
+def _subscribe(user):
+    """
+    Subscribe to a user and return whether the subscription is new.
+
+    The latest bookmarks of the user are added to the subscriber's timeline.
+    """
+    if not g.user.subscribe(user):
+        return False
+    _insert_into_timeline(select(_timeline_rows(g.user.id)).where(
+        Bookmark.user_id == user.id).order_by(
+        desc(Bookmark.created_on), desc(Bookmark.id)).limit(
+        current_app.config.get('FEED_LENGTH', 1000)))
     db.session.commit()
+    response_cache.invalidate()
+    return True
+
+
+def _unsubscribe(user):
+    """
+    Unsubscribe from a user and return whether there was a subscription.
+
+    The bookmarks of the user are removed from the subscriber's timeline.
+    """
+    if not g.user.unsubscribe(user):
+        return False
+    db.session.execute(timelines.delete().where(and_(
+        timelines.c.user_id == g.user.id, timelines.c.author_id == user.id)))
+    db.session.commit()
+    response_cache.invalidate()
+    return True
+
+
+def _feed(user_id, pull=True):
+    """
+    Return the query of the timeline of a user, newest entries first.
+
+    The bookmarks of popular users subscribed to are pulled into the timeline
+    first, unless `pull` is false as when reading the next pages.
+    """
+    if pull:
+        _pull_into_timeline(user_id)
+    return db.session.query(
+        timelines.c.id, timelines.c.bookmark_id, timelines.c.created_on).filter(
+        timelines.c.user_id == user_id).order_by(FEED_ORDER, desc(timelines.c.id))
+
+
+def _feed_bookmarks(entries):
+    """Return the bookmarks of timeline entries, in the order of the entries."""
+    if not entries:
+        return []
+    bookmarks = {bookmark.id: bookmark for bookmark in _get(
+        {'id': [entry.bookmark_id for entry in entries], 'sort': 'date'})}
+    return [bookmarks[entry.bookmark_id] for entry in entries
+            if entry.bookmark_id in bookmarks]
+
+
+def _trim_timelines():
+    """Delete the entries of timelines older than their newest `FEED_LENGTH`."""
+    length = current_app.config.get('FEED_LENGTH', 1000)
+    overfull = db.session.query(timelines.c.user_id).group_by(
+        timelines.c.user_id).having(func.count() > length).all()
+    for user_id, in overfull:
+        last = db.session.query(timelines.c.created_on, timelines.c.id).filter(
+            timelines.c.user_id == user_id).order_by(
+            desc(timelines.c.created_on), desc(timelines.c.id)).offset(
+            length - 1).first()
+        db.session.execute(timelines.delete().where(and_(
+            timelines.c.user_id == user_id,
+            or_(timelines.c.created_on < last.created_on,
+                and_(timelines.c.created_on == last.created_on,
+                     timelines.c.id < last.id)))))
+        db.session.commit()
+
+
+def _rebuild_tag_counts():
+    """Recount the bookmarks of every tag to fix any drift of the counters."""
+    count = db.session.query(func.count(tags_bookmarks.c.bookmark_id)).filter(
+        tags_bookmarks.c.tag_id == Tag.id).as_scalar()
+    Tag.query.update({Tag.bookmarks_count: count}, synchronize_session=False)
+    db.session.commit()
+    response_cache.invalidate()
+
+
+def _rebuild_subscription_counts():
+    """Recount the subscribers and subscriptions of every user."""
+    subscribers = db.session.query(func.count()).filter(
+        subscriptions.c.subscribed_id == User.id).as_scalar()
+    subscribed = db.session.query(func.count()).filter(
+        subscriptions.c.subscriber_id == User.id).as_scalar()
+    User.query.update({User.subscribers_count: subscribers,
+                       User.subscribed_count: subscribed},
+                      synchronize_session=False)
+    db.session.commit()
+    response_cache.invalidate()
+
+
+def _rescore_bookmarks():
+    """Recompute the hot and trending scores of every bookmark."""
+    ranking.rescore_all(db.session)
+    response_cache.invalidate()
+
+
+def _rescore_trending():
+    """Recompute the trending scores, which fall as bookmarks age."""
+    ranking.rescore_trending(
+        db.session, current_app.config.get('TRENDING_WINDOW', 7 * 24 * 3600))
+    response_cache.invalidate()
+
+
+def _rebuild_search_index(batch_size=1000):
+    """Index every bookmark for searching, in batches to bound memory."""
+    last_id = 0
+    while True:
+        bookmarks = Bookmark.query.options(selectinload(Bookmark.tags)).filter(
+            Bookmark.id > last_id).order_by(Bookmark.id).limit(batch_size).all()
+        if not bookmarks:
+            break
+        for bookmark in bookmarks:
+            search_index.index(db.session, bookmark)
+        db.session.commit()
+        last_id = bookmarks[-1].id
+    response_cache.invalidate()
+
+
+def _favourites(user_id):
+    """
+    Return the query of the favourites of a user with their bookmarks.
+
+    The bookmarks are joined to the favourites, their user, tags and votes
+    are loaded in one query each for the whole page.
+    """
+    return Favourite.query.join(Favourite.bookmark).options(
+        contains_eager(Favourite.bookmark).selectinload(Bookmark.user),
+        contains_eager(Favourite.bookmark).selectinload(Bookmark.tags),
+        contains_eager(Favourite.bookmark).selectinload(Bookmark.votes_list)
+    ).filter(Favourite.user_id == user_id).order_by(
+        FAVOURITES_ORDER, desc(Favourite.id))
 
 
 def _save(bookmark_id):
@@ -100,6 +520,7 @@ def _save(bookmark_id):
     favourite = Favourite(bookmark_id=bookmark_id, user_id=g.user.id)
     db.session.add(favourite)
     db.session.commit()
+    response_cache.invalidate()
     return favourite.id
 
 
@@ -107,40 +528,128 @@ def _unsave(favourite):
     """Remove saved bookmark from user's listings."""
     db.session.delete(favourite)
     db.session.commit()
+    response_cache.invalidate()
 
 
-def _post_vote(bookmark, direction):
-    """Create a new vote entry."""
-    bookmark.rating += direction
-    vote = Vote(user_id=g.user.id, bookmark_id=bookmark.id,
-                direction=True if direction == 1 else False)
-    db.session.add(bookmark)
-    db.session.add(vote)
+def _rate(bookmark_id, delta):
+    """
+    Add delta to the rating of a bookmark and return whether it exists.
+
+    The addition happens in the database so concurrent votes are all counted,
+    the scores of the bookmark are then recomputed from the new rating.
+    """
+    exists = Bookmark.query.filter_by(id=bookmark_id).update(
+        {Bookmark.rating: func.coalesce(Bookmark.rating, 0) + delta},
+        synchronize_session=False) == 1
+    if exists:
+        ranking.rescore(db.session, [bookmark_id])
+    return exists
+
+
+def _commit_vote(bookmark_id, delta):
+    """
+    Commit a change of a vote along with the rating of its bookmark.
+
+    With the rating buffer enabled the rating is not written with the vote
+    but buffered once the vote is committed.
+    """
     db.session.commit()
-    return vote.id
+    if rating_buffer.enabled and rating_buffer.add(bookmark_id, delta):
+        rating_buffer.flush(db.session)
+    response_cache.invalidate()
+
+
+def _has_direction(vote_id, direction):
+    """Return the condition of a vote still having the given direction."""
+    if direction is None:
+        return and_(Vote.id == vote_id, Vote.direction.is_(None))
+    return and_(Vote.id == vote_id, Vote.direction == direction)
+
+
+def _current_direction(vote_id):
+    """
+    Return the direction of a vote as committed by another request.
+
+    The transaction is rolled back first, so a snapshot it read from does not
+    hide the latest change.
+    """
+    db.session.rollback()
+    return db.session.query(Vote.direction).filter_by(id=vote_id).first()
+
+
+def _post_vote(bookmark_id, direction):
+    """
+    Add a vote of the user for a bookmark and return its id.
+
+    Return None if the bookmark does not exist, raise IntegrityError if the
+    user has already voted for it.
+    """
+    if rating_buffer.enabled:
+        exists = db.session.query(Bookmark.id).filter_by(id=bookmark_id).scalar()
+    else:
+        exists = _rate(bookmark_id, direction)
+    if not exists:
+        db.session.rollback()
+        return None
+    try:
+        result = db.session.execute(Vote.__table__.insert().values(
+            user_id=g.user.id, bookmark_id=bookmark_id, direction=direction == 1))
+    except IntegrityError:
+        db.session.rollback()
+        raise
+    _commit_vote(bookmark_id, direction)
+    return result.inserted_primary_key[0]
 
 
 def _put_vote(vote_, direction):
-    """Update an existing vote."""
-    bookmark = Bookmark.query.get(vote_.bookmark_id)
-    if vote_.direction is None:
-        vote_.direction = {-1: False, 1: True}[direction]
-        bookmark.rating += direction
-    elif vote_.direction is True:
-        vote_.direction = {-1: False, 1: None}[direction]
-        bookmark.rating += -1 if direction == 1 else -2
+    """
+    Update an existing vote and return False if it kept changing meanwhile.
+
+    Voting the same direction again takes the vote back, voting the opposite
+    direction reverses it. The vote is only updated if it still has the
+    direction read, otherwise the direction another request left is read
+    again, up to `VOTE_RETRIES` times, so concurrent updates never lose a
+    change of the rating.
+    """
+    vote_id, bookmark_id, old = vote_.id, vote_.bookmark_id, vote_.direction
+    for _ in range(VOTE_RETRIES):
+        new = None if old is (direction == 1) else direction == 1
+        if Vote.query.filter(_has_direction(vote_id, old)).update(
+                {Vote.direction: new}, synchronize_session=False):
+            break
+        row = _current_direction(vote_id)
+        if row is None:  # deleted meanwhile
+            return True
+        old = row.direction
     else:
-        vote_.direction = {-1: None, 1: True}[direction]
-        bookmark.rating += 1 if direction == -1 else 2
-    db.session.add(vote_)
-    db.session.add(bookmark)
-    db.session.commit()
+        db.session.rollback()
+        return False
+    delta = VOTE_VALUES[new] - VOTE_VALUES[old]
+    if not rating_buffer.enabled:
+        _rate(bookmark_id, delta)
+    _commit_vote(bookmark_id, delta)
+    return True
 
 
 def _delete_vote(vote):
-    """Delete an existing vote."""
-    if vote.direction is not None:
-        vote.bookmark.rating += -1 if vote.direction is True else 1
-        db.session.add(vote.bookmark)
-    db.session.delete(vote)
-    db.session.commit()
+    """
+    Delete an existing vote, taking back its direction from the rating.
+
+    Return False if the vote kept changing meanwhile, see `_put_vote`.
+    """
+    vote_id, bookmark_id, old = vote.id, vote.bookmark_id, vote.direction
+    for _ in range(VOTE_RETRIES):
+        if Vote.query.filter(_has_direction(vote_id, old)).delete(
+                synchronize_session=False):
+            break
+        row = _current_direction(vote_id)
+        if row is None:  # deleted meanwhile
+            return True
+        old = row.direction
+    else:
+        db.session.rollback()
+        return False
+    if not rating_buffer.enabled:
+        _rate(bookmark_id, -VOTE_VALUES[old])
+    _commit_vote(bookmark_id, -VOTE_VALUES[old])
+    return True
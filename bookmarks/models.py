@@ -2,14 +2,48 @@
 
 
 import arrow
+from sqlalchemy.dialects import postgresql
 
-from bookmarks import db
+from bookmarks import db, rating_buffer
 
 
 tags_bookmarks = db.Table(
     'tags_bookmarks',
     db.Column('bookmark_id', db.Integer, db.ForeignKey('bookmarks.id')),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'))
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id')),
+    # covering indexes for looking up the bookmarks of tags and vice versa
+    db.Index('ix_tags_bookmarks_tag_id_bookmark_id', 'tag_id', 'bookmark_id'),
+    db.Index('ix_tags_bookmarks_bookmark_id_tag_id', 'bookmark_id', 'tag_id')
+)
+
+
+def insert_ignore(table):
+    """Return an insert into the table skipping the rows that already exist."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    return table.insert().prefix_with('OR IGNORE')
+
+
+# bookmarks of the users each user subscribed to, newest first, written when
+# the bookmarks are added so reading a feed does not sort the bookmarks of
+# every user subscribed to
+timelines = db.Table(
+    'timelines',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('user_id', db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'),
+              nullable=False),
+    db.Column('bookmark_id', db.Integer,
+              db.ForeignKey('bookmarks.id', ondelete='CASCADE'), nullable=False,
+              index=True),
+    db.Column('author_id', db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'),
+              nullable=False),
+    # copied from the bookmark so the feed is read off one index
+    db.Column('created_on', db.DateTime, nullable=False),
+    db.Index('ix_timelines_user_id_bookmark_id', 'user_id', 'bookmark_id',
+             unique=True),
+    db.Index('ix_timelines_user_id_created_on_id', 'user_id', 'created_on', 'id'),
+    db.Index('ix_timelines_user_id_author_id_created_on', 'user_id', 'author_id',
+             'created_on')
 )
 
 
@@ -20,6 +54,9 @@ class Tag(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(30), unique=True, default='uncategorized')
+    # kept up to date by the logic module, recount with `flask rebuild-tag-counts`
+    bookmarks_count = db.Column(db.Integer, nullable=False, default=0,
+                                server_default='0', index=True)
 
     def __repr__(self):
         """Representation of a Tag instance."""
@@ -30,25 +67,48 @@ class Bookmark(db.Model):
     """"Define columns for bookmarks table."""
 
     __tablename__ = 'bookmarks'
+    # one index per sort of the listing, scanned in either direction
+    __table_args__ = (
+        db.Index('ix_bookmarks_created_on_id', 'created_on', 'id'),
+        db.Index('ix_bookmarks_rating_id', 'rating', 'id'),
+        db.Index('ix_bookmarks_hot_score_id', 'hot_score', 'id'),
+        db.Index('ix_bookmarks_trending_score_id', 'trending_score', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
     title = db.Column(db.String(50))
     url = db.Column(db.String, unique=True)
     rating = db.Column(db.Integer, default=0)
+    # kept up to date by the logic module, see bookmarks.ranking
+    hot_score = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    trending_score = db.Column(db.Float, nullable=False, default=0,
+                               server_default='0')
     created_on = db.Column(db.DateTime, server_default=db.func.now())
     updated_on = db.Column(db.DateTime, server_default=db.func.now(),
                            onupdate=db.func.now())
     image = db.Column(db.String(50), nullable=True)
+    # pending, ready, missing or failed while/after fetching the image
+    image_status = db.Column(db.String(10), nullable=True)
+    # when the image was last queued to be fetched
+    image_queued_on = db.Column(db.DateTime, nullable=True)
 
     tags = db.relationship('Tag', secondary=tags_bookmarks,
                            backref=db.backref('bookmarks', lazy='dynamic'))
     votes = db.relationship('Vote', backref='bookmark', lazy='dynamic',
                             cascade='all, delete-orphan',
                             primaryjoin='Bookmark.id==Vote.bookmark_id')
+    # non-dynamic view of votes, so they can be eager loaded for serializing
+    votes_list = db.relationship('Vote', viewonly=True,
+                                 primaryjoin='Bookmark.id==Vote.bookmark_id')
     favourited = db.relationship('Favourite', backref='bookmark',
                                  lazy='dynamic', cascade='all, delete-orphan')
 
+    @property
+    def current_rating(self):
+        """Return the rating including the changes still buffered."""
+        return (self.rating or 0) + rating_buffer.pending(self.id)
+
     def get_human_time(self):
         """Humanize and return the created_on time."""
         return arrow.get(self.created_on).humanize()
@@ -62,10 +122,15 @@ class Vote(db.Model):
     """Define what each user voted for each bookmark."""
 
     __tablename__ = 'votes'
+    __table_args__ = (
+        db.Index('ix_votes_user_id_bookmark_id', 'user_id', 'bookmark_id',
+                 unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    bookmark_id = db.Column(db.Integer, db.ForeignKey('bookmarks.id'), nullable=False)
+    bookmark_id = db.Column(db.Integer, db.ForeignKey('bookmarks.id'), nullable=False,
+                            index=True)
 
     direction = db.Column(db.Boolean, nullable=True)
 
@@ -78,13 +143,49 @@ class Favourite(db.Model):
     """Define what bookmarks each user saved."""
 
     __tablename__ = 'favourites'
+    __table_args__ = (
+        db.Index('ix_favourites_user_id_bookmark_id', 'user_id', 'bookmark_id',
+                 unique=True),
+        # the listing of a user's favourites, newest first
+        db.Index('ix_favourites_user_id_saved_on_id', 'user_id', 'saved_on', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    bookmark_id = db.Column(db.Integer, db.ForeignKey('bookmarks.id'), nullable=False)
+    bookmark_id = db.Column(db.Integer, db.ForeignKey('bookmarks.id'), nullable=False,
+                            index=True)
 
     saved_on = db.Column(db.DateTime, server_default=db.func.now())
 
     def __repr__(self):
         """Represent a Favourite instance."""
         return '<Favourite {}>'.format(self.saved_on)
+
+
+class Page(db.Model):
+    """Define the scraped metadata of a page, cached by its canonical url."""
+
+    __tablename__ = 'pages'
+
+    url = db.Column(db.String, primary_key=True)
+    status_code = db.Column(db.Integer)
+    title = db.Column(db.String, nullable=True)
+    og_image = db.Column(db.String, nullable=True)
+    logo = db.Column(db.String, nullable=True)
+    favicon = db.Column(db.String, nullable=True)
+    etag = db.Column(db.String, nullable=True)
+    last_modified = db.Column(db.String, nullable=True)
+    fetched_on = db.Column(db.DateTime)
+    used_on = db.Column(db.DateTime, index=True)
+
+    @property
+    def scraped(self):
+        """Return the scraped metadata or None if the page was not fetched."""
+        if not 200 <= self.status_code < 300:
+            return None
+        return {'title': self.title, 'og_image': self.og_image,
+                'logo': self.logo, 'favicon': self.favicon}
+
+    def __repr__(self):
+        """Represent a Page instance."""
+        return '<Page {}>'.format(self.url)
@@ -0,0 +1,98 @@
+"""Time-decayed scores ranking bookmarks by their rating and age."""
+
+from datetime import datetime, timedelta
+import math
+
+from sqlalchemy import DateTime, Float, Integer, and_, bindparam, select
+from sqlalchemy.sql import column, table
+
+# start of the hot scores, any date before the first bookmark does
+EPOCH = datetime(2005, 12, 8)
+# seconds of age that weigh as much as ten times the rating
+HOT_DECAY = 45000
+# how fast the trending score of a bookmark falls as it ages
+GRAVITY = 1.8
+
+bookmarks = table('bookmarks', column('id', Integer), column('rating', Integer),
+                  column('created_on', DateTime), column('hot_score', Float),
+                  column('trending_score', Float))
+
+
+def hot_score(rating, created_on):
+    """
+    Return the hot score of a bookmark, as ranked by reddit.
+
+    Newer bookmarks start with a higher score instead of older ones losing
+    points, so the score only changes when the rating does.
+    """
+    rating = rating or 0
+    sign = (rating > 0) - (rating < 0)
+    order = math.log10(max(abs(rating), 1))
+    age = (created_on - EPOCH).total_seconds()
+    return round(sign * order + age / HOT_DECAY, 7)
+
+
+def trending_score(rating, created_on, now):
+    """
+    Return the trending score of a bookmark, as ranked by Hacker News.
+
+    The rating is divided by a power of the hours since the bookmark was
+    added, so the score has to be recomputed as time passes.
+    """
+    hours = max((now - created_on).total_seconds() / 3600, 0)
+    return (rating or 0) / (hours + 2) ** GRAVITY
+
+
+def rescore(session, bookmark_ids, now=None):
+    """Recompute the scores of the bookmarks from their stored rating."""
+    if not bookmark_ids:
+        return
+    now = now or datetime.utcnow()
+    rows = session.execute(
+        select([bookmarks.c.id, bookmarks.c.rating, bookmarks.c.created_on]).where(
+            bookmarks.c.id.in_(bookmark_ids)))
+    scores = [{'bookmark_id': id_, 'hot': hot_score(rating, created_on or now),
+               'trending': trending_score(rating, created_on or now, now)}
+              for id_, rating, created_on in rows]
+    if scores:
+        session.execute(
+            bookmarks.update().where(bookmarks.c.id == bindparam('bookmark_id')).values(
+                hot_score=bindparam('hot'), trending_score=bindparam('trending')),
+            scores)
+
+
+def rescore_all(session, since=None, batch_size=1000, now=None):
+    """
+    Recompute the scores of the bookmarks added since the given date, or all.
+
+    The bookmarks are rescored in batches, each committed on its own.
+    """
+    now = now or datetime.utcnow()
+    last_id = 0
+    while True:
+        query = select([bookmarks.c.id]).where(bookmarks.c.id > last_id)
+        if since is not None:
+            query = query.where(bookmarks.c.created_on >= since)
+        ids = [id_ for id_, in session.execute(
+            query.order_by(bookmarks.c.id).limit(batch_size))]
+        if not ids:
+            break
+        rescore(session, ids, now)
+        session.commit()
+        last_id = ids[-1]
+
+
+def rescore_trending(session, window, now=None):
+    """
+    Recompute the trending scores of the bookmarks added within the window.
+
+    Older bookmarks have their trending score zeroed, they are too old to
+    trend whatever their rating.
+    """
+    now = now or datetime.utcnow()
+    since = now - timedelta(seconds=window)
+    session.execute(bookmarks.update().where(and_(
+        bookmarks.c.created_on < since, bookmarks.c.trending_score != 0)).values(
+        trending_score=0))
+    session.commit()
+    rescore_all(session, since=since, now=now)
@@ -0,0 +1,128 @@
+"""Write-behind buffer of the ratings of bookmarks."""
+
+from threading import Lock, Timer
+import atexit
+
+from sqlalchemy import bindparam, func
+from sqlalchemy.sql import column, table
+
+from .ranking import rescore
+
+
+class RatingBuffer:
+    """
+    Buffer of the changes of the ratings of bookmarks, written in batches.
+
+    With `RATING_BUFFER` enabled votes are still recorded at once but the
+    change they make to the rating of their bookmark is kept in memory, so
+    votes on a popular bookmark do not all wait on the lock of its row. The
+    changes are written in one transaction once `RATING_FLUSH_SIZE` votes are
+    pending or `RATING_FLUSH_INTERVAL` seconds after the first of them, and
+    when the process exits. The buffer is per process: a process reads the
+    ratings stored plus its own pending changes, and sorting by rating only
+    sees the ratings stored. Changes being written are still pending until
+    their transaction commits, and cached responses are invalidated once
+    changes written in the background are committed.
+    """
+
+    bookmarks = table('bookmarks', column('id'), column('rating'))
+
+    def __init__(self):
+        self.enabled = False
+        self.interval = 5
+        self.size = 100
+        self._app = None
+        self._db = None
+        self._deltas = {}
+        # changes drained from the buffer whose write is not committed yet
+        self._writing = {}
+        self._count = 0
+        self._timer = None
+        self._lock = Lock()
+
+    def init_app(self, app, db):
+        self.enabled = app.config.get('RATING_BUFFER', False)
+        self.interval = app.config.get('RATING_FLUSH_INTERVAL', self.interval)
+        self.size = app.config.get('RATING_FLUSH_SIZE', self.size)
+        self._app = app
+        self._db = db
+        if self.enabled:
+            atexit.register(self._flush_in_background)
+        app.extensions['rating_buffer'] = self
+
+    def pending(self, bookmark_id):
+        """Return the change of the bookmark's rating not written yet."""
+        with self._lock:
+            return self._deltas.get(bookmark_id, 0) + self._writing.get(bookmark_id, 0)
+
+    def add(self, bookmark_id, delta):
+        """Buffer a change of the bookmark's rating, return whether to flush."""
+        with self._lock:
+            self._deltas[bookmark_id] = self._deltas.get(bookmark_id, 0) + delta
+            self._count += 1
+            if self._timer is None and self.interval:
+                self._timer = Timer(self.interval, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+            return self._count >= self.size
+
+    def _drain(self):
+        """Take the pending changes out of the buffer to be written."""
+        with self._lock:
+            deltas = {bookmark_id: delta for bookmark_id, delta in self._deltas.items()
+                      if delta}
+            self._deltas, self._count = {}, 0
+            for bookmark_id, delta in deltas.items():
+                self._writing[bookmark_id] = self._writing.get(bookmark_id, 0) + delta
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return deltas
+
+    def _written(self, deltas, committed=True):
+        """Stop counting changes as being written, putting them back if not committed."""
+        with self._lock:
+            for bookmark_id, delta in deltas.items():
+                writing = self._writing.pop(bookmark_id) - delta
+                if writing:
+                    self._writing[bookmark_id] = writing
+                if not committed:
+                    self._deltas[bookmark_id] = self._deltas.get(bookmark_id, 0) + delta
+                    self._count += 1
+
+    def flush(self, session):
+        """Write the pending changes, keeping them if that fails."""
+        deltas = self._drain()
+        if not deltas:
+            return True
+        statement = self.bookmarks.update().where(
+            self.bookmarks.c.id == bindparam('bookmark_id')).values(
+            rating=func.coalesce(self.bookmarks.c.rating, 0) + bindparam('delta'))
+        try:
+            session.execute(statement, [
+                {'bookmark_id': bookmark_id, 'delta': delta}
+                for bookmark_id, delta in sorted(deltas.items())])
+            rescore(session, list(deltas))
+            session.commit()
+        except Exception:
+            session.rollback()
+            self._written(deltas, committed=False)
+            self._app.logger.exception('Writing buffered ratings failed')
+            return False
+        self._written(deltas)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._deltas, self._writing, self._count = {}, {}, 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _flush_in_background(self):
+        with self._app.app_context():
+            try:
+                if self.flush(self._db.session) and 'response_cache' in self._app.extensions:
+                    self._app.extensions['response_cache'].invalidate()
+            finally:
+                self._db.session.remove()
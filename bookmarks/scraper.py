@@ -0,0 +1,199 @@
+"""Scrape metadata of web pages from the head of their html."""
+
+from datetime import datetime, timedelta
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+import codecs
+import re
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from bookmarks import db, http_client
+from bookmarks.models import Page
+
+
+CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+TRACKING_PARAM_RE = re.compile(r'^(utm_\w+|fbclid|gclid)$')
+
+
+class HeadParser(HTMLParser):
+    """
+    Incremental parser collecting the metadata of a page's head.
+
+    Parsing is done once the head ends, so the caller can stop feeding the
+    rest of the document.
+    """
+
+    def __init__(self, url):
+        super().__init__(convert_charrefs=True)
+        self.url = url
+        self.done = False
+        self.title = None
+        self.og_image = None
+        self.logo = None
+        self.favicon = None
+        self._in_head = False
+        self._title_parts = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'head':
+            self._in_head = True
+        elif tag == 'body':
+            self.done = True
+        elif tag == 'title' and self.title is None:
+            self._title_parts = []
+        elif tag == 'meta' and attrs.get('property') == 'og:image':
+            if self.og_image is None:
+                self.og_image = attrs.get('content')
+        elif tag == 'img' and self._in_head and 'logo' in (attrs.get('src') or ''):
+            if self.logo is None:
+                self.logo = urljoin(self.url, attrs['src'])
+        elif tag == 'link' and self._in_head and 'favicon' in (attrs.get('href') or ''):
+            if self.favicon is None:
+                self.favicon = urljoin(self.url, attrs['href'])
+
+    def handle_endtag(self, tag):
+        if tag == 'title' and self._title_parts is not None:
+            self.title = ''.join(self._title_parts)
+            self._title_parts = None
+        elif tag == 'head':
+            self._in_head = False
+            self.done = True
+
+    def handle_data(self, data):
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+
+    @property
+    def metadata(self):
+        title = self.title
+        if title is None and self._title_parts:  # title cut by the byte cap
+            title = ''.join(self._title_parts)
+        if title is not None:
+            # get rid of extraneous whitespace in the title
+            title = re.sub(r'\s+', ' ', title, flags=re.UNICODE).strip()
+        return {'title': title, 'og_image': self.og_image, 'logo': self.logo,
+                'favicon': self.favicon}
+
+
+def parse_head(chunks, url, encoding=None, max_bytes=512 * 1024):
+    """
+    Return the metadata of a page from an iterable of its html byte chunks.
+
+    Stops consuming the chunks once the head has been parsed or `max_bytes`
+    have been read. Without an `encoding` the charset declared in the first
+    chunk's meta tags is used, falling back to utf-8.
+    """
+    parser = HeadParser(url)
+    decoder = None
+    read = 0
+    for chunk in chunks:
+        chunk = chunk[:max_bytes - read]
+        read += len(chunk)
+        if decoder is None:
+            match = CHARSET_RE.search(chunk)
+            encoding = encoding or (match and match.group(1).decode('ascii'))
+            try:
+                decoder = codecs.getincrementaldecoder(encoding or 'utf-8')('replace')
+            except LookupError:
+                decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        parser.feed(decoder.decode(chunk))
+        if parser.done or read >= max_bytes:
+            break
+    return parser.metadata
+
+
+def image_url(metadata):
+    """Return the best image of the page's metadata or None."""
+    return metadata['og_image'] or metadata['logo'] or metadata['favicon']
+
+
+def canonical_url(url):
+    """Return the url normalized so that urls of the same page are equal."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    try:
+        port = parts.port
+    except ValueError:  # out of range, the page cannot be fetched anyway
+        host = parts.netloc.lower()
+    else:
+        host = (parts.hostname or '').lower()
+        if port and (scheme, port) not in (('http', 80), ('https', 443)):
+            host += f':{port}'
+    query = urlencode(sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not TRACKING_PARAM_RE.match(name)
+    ))
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+
+def _fetch(page, url):
+    """
+    Fetch a page and update its cached metadata.
+
+    Only the head of the page is downloaded, the connection is closed as soon
+    as it has been parsed. A page fetched before is revalidated with its
+    ETag/Last-Modified, so an unchanged page is not downloaded again.
+    """
+    headers = {}
+    if page.etag:
+        headers['If-None-Match'] = page.etag
+    if page.last_modified:
+        headers['If-Modified-Since'] = page.last_modified
+    with http_client.stream('GET', url, headers=headers) as response:
+        if response.status_code == 304:
+            return
+        metadata = dict.fromkeys(('title', 'og_image', 'logo', 'favicon'))
+        if response.ok:
+            # only trust a charset given in the headers, requests defaults to
+            # ISO-8859-1 for any text/* content without one
+            encoding = response.encoding if 'charset' in response.headers.get(
+                'content-type', '') else None
+            metadata = parse_head(
+                response.iter_content(chunk_size=16 * 1024), url, encoding=encoding,
+                max_bytes=current_app.config.get('SCRAPER_MAX_BYTES', 512 * 1024))
+        for name, value in metadata.items():
+            setattr(page, name, value)
+        page.status_code = response.status_code
+        page.etag = response.headers.get('ETag')
+        page.last_modified = response.headers.get('Last-Modified')
+
+
+def _prune():
+    """Delete the least recently used pages beyond the size of the cache."""
+    size = current_app.config.get('PAGE_CACHE_SIZE', 10000)
+    oldest_kept = db.session.query(Page.used_on).order_by(
+        Page.used_on.desc()).offset(size - 1).limit(1).scalar()
+    if oldest_kept is not None:
+        Page.query.filter(Page.used_on < oldest_kept).delete(synchronize_session=False)
+
+
+def get_metadata(url):
+    """
+    Return the metadata of a page or None if the page was not fetched successfully.
+
+    Pages are cached by their canonical url and fetched at most once every
+    `PAGE_CACHE_TTL` seconds, so suggesting the title of a url and then
+    bookmarking it fetches the page once.
+    """
+    now = datetime.utcnow()
+    ttl = timedelta(seconds=current_app.config.get('PAGE_CACHE_TTL', 3600))
+    page = Page.query.get(canonical_url(url))
+    is_new = page is None
+    if is_new:
+        page = Page(url=canonical_url(url))
+    if is_new or page.fetched_on < now - ttl:
+        _fetch(page, url)
+        page.fetched_on = now
+    page.used_on = now
+    metadata = page.scraped
+    db.session.add(page)
+    if is_new:
+        _prune()
+    try:
+        db.session.commit()
+    except IntegrityError:  # another worker cached the page meanwhile
+        db.session.rollback()
+    return metadata
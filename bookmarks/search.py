@@ -0,0 +1,201 @@
+"""Full-text search index over the title, url and tags of bookmarks."""
+
+import re
+
+from sqlalchemy import DDL, and_, case, desc, event, false, func, literal_column, or_, text
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.sql import column, table
+
+
+def _terms(string):
+    """Return the words of a string."""
+    return re.findall(r'\w+', string.lower(), flags=re.UNICODE)
+
+
+def _url_terms(url):
+    """Return the words of a url without its scheme and www prefix."""
+    return _terms(re.sub(r'^\w+://(www\.)?', '', url or ''))
+
+
+def _document(bookmark_id, title, url, tags):
+    """Return the values of a bookmark's row in the index."""
+    return {'id': bookmark_id, 'title': title or '', 'url': ' '.join(_url_terms(url)),
+            'tags': ' '.join(tags)}
+
+
+class SQLiteBackend:
+    """Search backed by an FTS5 table whose rowid is the bookmark id."""
+
+    name = 'sqlite'
+    fts = table('bookmarks_search', column('rowid'))
+    create = DDL('CREATE VIRTUAL TABLE IF NOT EXISTS bookmarks_search '
+                 'USING fts5(title, url, tags, tokenize="unicode61")')
+    drop = DDL('DROP TABLE IF EXISTS bookmarks_search')
+    insert = text('INSERT INTO bookmarks_search (rowid, title, url, tags) '
+                  'VALUES (:id, :title, :url, :tags)')
+
+    def index(self, session, bookmark_id, title, url, tags):
+        self.remove(session, bookmark_id)
+        session.execute(self.insert, _document(bookmark_id, title, url, tags))
+
+    def add_many(self, session, documents):
+        session.execute(self.insert, documents)
+
+    def remove(self, session, bookmark_id):
+        session.execute(text('DELETE FROM bookmarks_search WHERE rowid = :id'),
+                        {'id': bookmark_id})
+
+    def filter(self, query, model, terms):
+        # every term must match, as a prefix so partially typed words match
+        match = ' '.join(f'"{term}"*' for term in terms)
+        return query.join(self.fts, self.fts.c.rowid == model.id).filter(
+            literal_column('bookmarks_search').op('MATCH')(match))
+
+    def rank(self, model, terms):
+        # bm25 is lower for better matches, titles and tags weigh more than urls
+        return func.bm25(literal_column('bookmarks_search'), 10.0, 2.0, 5.0).asc()
+
+
+class PostgresBackend:
+    """Search backed by a table of weighted tsvector documents."""
+
+    name = 'postgresql'
+    documents = table('bookmarks_search', column('bookmark_id'), column('document'))
+    create = DDL(
+        'CREATE TABLE IF NOT EXISTS bookmarks_search ('
+        'bookmark_id INTEGER PRIMARY KEY REFERENCES bookmarks (id) ON DELETE CASCADE, '
+        'document TSVECTOR NOT NULL); '
+        'CREATE INDEX IF NOT EXISTS ix_bookmarks_search_document '
+        'ON bookmarks_search USING GIN (document)'
+    )
+    drop = DDL('DROP TABLE IF EXISTS bookmarks_search')
+    upsert = text(
+        "INSERT INTO bookmarks_search (bookmark_id, document) VALUES (:id, "
+        "setweight(to_tsvector('simple', :title), 'A') || "
+        "setweight(to_tsvector('simple', :tags), 'A') || "
+        "setweight(to_tsvector('simple', :url), 'C')) "
+        "ON CONFLICT (bookmark_id) DO UPDATE SET document = EXCLUDED.document"
+    )
+
+    def index(self, session, bookmark_id, title, url, tags):
+        session.execute(self.upsert, _document(bookmark_id, title, url, tags))
+
+    def add_many(self, session, documents):
+        session.execute(self.upsert, documents)
+
+    def remove(self, session, bookmark_id):
+        session.execute(text('DELETE FROM bookmarks_search WHERE bookmark_id = :id'),
+                        {'id': bookmark_id})
+
+    def _tsquery(self, terms):
+        return func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+
+    def filter(self, query, model, terms):
+        return query.join(self.documents, self.documents.c.bookmark_id == model.id).filter(
+            self.documents.c.document.op('@@')(self._tsquery(terms)))
+
+    def rank(self, model, terms):
+        return func.ts_rank(self.documents.c.document, self._tsquery(terms)).desc()
+
+
+class LikeBackend:
+    """
+    Search with LIKE for databases without full-text search.
+
+    It has no table to keep up to date but scans the bookmarks, and ranks
+    them by the number of words their title matches.
+    """
+
+    name = 'like'
+    create = drop = None
+
+    def index(self, session, bookmark_id, title, url, tags):
+        pass
+
+    def add_many(self, session, documents):
+        pass
+
+    def remove(self, session, bookmark_id):
+        pass
+
+    @staticmethod
+    def _like(column, term):
+        """Return the condition of the column containing the term."""
+        return column.ilike('%' + term.replace('_', r'\_') + '%', escape='\\')
+
+    def filter(self, query, model, terms):
+        tag = model.tags.property.mapper.class_
+        return query.filter(and_(*(
+            or_(self._like(model.title, term), self._like(model.url, term),
+                model.tags.any(self._like(tag.name, term)))
+            for term in terms)))
+
+    def rank(self, model, terms):
+        return desc(sum(case([(self._like(model.title, term), 1)], else_=0)
+                        for term in terms))
+
+
+class SearchIndex:
+    """
+    Full-text index of bookmarks, kept up to date by the logic module.
+
+    The backend is picked from the database's dialect. Its table is created
+    and dropped along with the models' tables; fill it for existing bookmarks
+    with `flask rebuild-search-index`. Other databases are searched with
+    LIKE, which needs no index but scans the bookmarks.
+    """
+
+    backends = {backend.name: backend for backend in (SQLiteBackend, PostgresBackend)}
+
+    def __init__(self):
+        self.backend = None
+
+    def init_app(self, app, metadata):
+        dialect = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+        if dialect in self.backends:
+            self.backend = self.backends[dialect]()
+        else:
+            app.logger.warning('Full-text search is not supported on %s, searching '
+                               'bookmarks with LIKE', dialect)
+            self.backend = LikeBackend()
+        if not event.contains(metadata, 'after_create', self._create):
+            event.listen(metadata, 'after_create', self._create)
+            event.listen(metadata, 'before_drop', self._drop)
+
+    def _create(self, target, connection, **kwargs):
+        if self.backend.create is not None:
+            self.backend.create.execute(connection)
+
+    def _drop(self, target, connection, **kwargs):
+        if self.backend.drop is not None:
+            self.backend.drop.execute(connection)
+
+    def index(self, session, bookmark):
+        """Add or update a bookmark in the index."""
+        self.backend.index(session, bookmark.id, bookmark.title, bookmark.url,
+                           [tag.name for tag in bookmark.tags])
+
+    def add_many(self, session, bookmarks):
+        """
+        Add new bookmarks to the index in one statement.
+
+        `bookmarks` are (id, title, url, tag names) tuples of bookmarks not
+        indexed yet.
+        """
+        if bookmarks:
+            self.backend.add_many(session, [_document(*bookmark) for bookmark in bookmarks])
+
+    def remove(self, session, bookmark_id):
+        """Remove a bookmark from the index."""
+        self.backend.remove(session, bookmark_id)
+
+    def filter(self, query, model, string):
+        """Filter the query to the bookmarks matching all words of the string."""
+        terms = _terms(string)
+        if not terms:
+            return query.filter(false())
+        return self.backend.filter(query, model, terms)
+
+    def rank(self, model, string):
+        """Return the ordering of the bookmarks by relevance to the string."""
+        return self.backend.rank(model, _terms(string))
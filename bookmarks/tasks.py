@@ -1,7 +1,27 @@
+from contextlib import nullcontext
+import os
+
+from flask import has_app_context
+import requests
 import sendgrid
 from sendgrid.helpers.mail import Mail, From, To, Subject, PlainTextContent
+from cloudinary.api import Error as CloudinaryError
+
+from bookmarks import celery, db
+
 
-from bookmarks import celery
+_app = None
+
+
+def _app_context():
+    """Return an app context, creating the app when running in a worker."""
+    global _app
+    if has_app_context():
+        return nullcontext()
+    if _app is None:
+        from bookmarks import create_app
+        _app = create_app()
+    return _app.app_context()
 
 
 @celery.task
@@ -15,3 +35,65 @@ def send_email_task(api_key, payload):
         plain_text_content=PlainTextContent(payload['text'])
     )
     sg.send(mail)
+
+
+@celery.task(bind=True, queue='thumbnails', max_retries=3, acks_late=True)
+def fetch_thumbnail_task(self, bookmark_id):
+    """
+    Fetch and upload the thumbnail of a bookmark.
+
+    Runs on its own queue so the number of concurrent fetches is bounded by
+    the concurrency of the worker consuming it, e.g.
+    `celery worker -Q thumbnails --concurrency 4`. Failures of the requests
+    are retried with exponential backoff before the bookmark is marked as
+    failed, any other error marks it as failed right away.
+    """
+    from bookmarks.views import utils
+
+    with _app_context():
+        try:
+            utils.fetch_thumbnail(bookmark_id)
+        except (requests.RequestException, CloudinaryError) as exc:
+            if self.request.retries >= self.max_retries:
+                utils.mark_thumbnail_failed(bookmark_id)
+                return
+            raise self.retry(exc=exc, countdown=30 * 2 ** self.request.retries)
+        except Exception:
+            db.session.rollback()
+            utils.mark_thumbnail_failed(bookmark_id)
+            raise
+
+
+@celery.task
+def rescore_trending_task():
+    """Recompute the trending scores of bookmarks, which fall as they age."""
+    from bookmarks.logic import _rescore_trending
+
+    with _app_context():
+        _rescore_trending()
+
+
+@celery.task
+def trim_timelines_task():
+    """Delete the oldest entries of timelines longer than the feeds."""
+    from bookmarks.logic import _trim_timelines
+
+    with _app_context():
+        _trim_timelines()
+
+
+def _config():
+    """Return the configuration of the environment, as the app would load it."""
+    import config
+    return getattr(config, os.environ.get('FLASK_ENV', 'production').title())
+
+
+@celery.on_after_configure.connect
+def schedule_periodic_tasks(sender, **kwargs):
+    """Rescore trending bookmarks and trim timelines, run with `celery beat`."""
+    # beat schedules before any app is created, so read the config directly
+    config = _config()
+    sender.add_periodic_task(config.TRENDING_RESCORE_INTERVAL,
+                             rescore_trending_task.s(), name='rescore trending')
+    sender.add_periodic_task(config.TIMELINE_TRIM_INTERVAL,
+                             trim_timelines_task.s(), name='trim timelines')
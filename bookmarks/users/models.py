@@ -3,17 +3,21 @@
 
 from flask import current_app
 from flask_login import UserMixin
-from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
+from itsdangerous import BadData, TimedJSONWebSignatureSerializer as Serializer
+from sqlalchemy import and_, case, event, exists
+from sqlalchemy.orm import make_transient_to_detached
 from sqlalchemy.ext.hybrid import hybrid_property
 
-from bookmarks import db, bcrypt
-from bookmarks.models import Bookmark, Favourite, Vote
+from bookmarks import db, password_checker, token_cache, token_revocations
+from bookmarks.models import Bookmark, Favourite, Vote, insert_ignore
 
 
 subscriptions = db.Table(
     'subscriptions',
-    db.Column('subscriber_id', db.Integer, db.ForeignKey('users.id')),
-    db.Column('subscribed_id', db.Integer, db.ForeignKey('users.id'))
+    db.Column('subscriber_id', db.Integer, db.ForeignKey('users.id'),
+              primary_key=True),
+    db.Column('subscribed_id', db.Integer, db.ForeignKey('users.id'),
+              primary_key=True, index=True)
 )
 
 class User(db.Model, UserMixin):
@@ -27,17 +31,30 @@ class User(db.Model, UserMixin):
     """
 
     __tablename__ = 'users'
+    # the listing of active users, paged by id
+    __table_args__ = (db.Index('ix_users_active_id', 'active', 'id'), )
 
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(30))
-    email = db.Column(db.String(30))
+    username = db.Column(db.String(30), index=True, unique=True)
+    email = db.Column(db.String(30), index=True, unique=True)
     created_on = db.Column(db.DateTime, server_default=db.func.now())
     updated_on = db.Column(db.DateTime, server_default=db.func.now(),
                            onupdate=db.func.now())
-    _password = db.Column(db.String(64))
+    # bcrypt or argon2 hash, see bookmarks.users.passwords
+    _password = db.Column(db.String(128))
     active = db.Column(db.Boolean, default=False)
     auth_token = db.Column(db.String(100), default='')
+    # carried by stateless tokens, bumped to revoke all of them
+    token_version = db.Column(db.Integer, nullable=False, default=0,
+                              server_default='0')
     authenticated = db.Column(db.Boolean, default=False)
+    # kept up to date by subscribe and unsubscribe, recount with
+    # `flask rebuild-subscription-counts`. Updated in bulk, bypassing the
+    # token cache, so they are volatile and always read from the row
+    subscribers_count = db.Column(db.Integer, nullable=False, default=0,
+                                  server_default='0', info={'volatile': True})
+    subscribed_count = db.Column(db.Integer, nullable=False, default=0,
+                                 server_default='0', info={'volatile': True})
 
     bookmarks = db.relationship(Bookmark, backref='user',
                                 cascade='all, delete-orphan', lazy='dynamic')
@@ -59,11 +76,20 @@ class User(db.Model, UserMixin):
     @password.setter
     def password(self, plaintext):
         """Hash password before setting it."""
-        self._password = bcrypt.generate_password_hash(plaintext)
+        self._password = password_checker.hash(plaintext)
 
     def is_password_correct(self, plaintext):
-        """Check if user's password is correct."""
-        return bcrypt.check_password_hash(self._password, plaintext)
+        """
+        Check if user's password is correct.
+
+        A correct password hashed with another scheme or cost than configured
+        is rehashed, to be committed along with the request.
+        """
+        if not password_checker.check(self._password, plaintext):
+            return False
+        if password_checker.needs_rehash(self._password):
+            self.password = plaintext
+        return True
 
     def generate_auth_token(self, expires_in=3600, **kwargs):
         """Return a new token for the user."""
@@ -82,22 +108,108 @@ class User(db.Model, UserMixin):
             return {}
         return data
 
+    @staticmethod
+    def auth_token_expiry(token):
+        """Return the unix time a verified token expires at."""
+        serializer = Serializer(current_app.config['SECRET_KEY'])
+        return serializer.loads(token, return_header=True)[1]['exp']
+
+    @classmethod
+    def reference(cls, id):
+        """
+        Return a user of the given id whose columns are only read when used.
+
+        Merged into a session it is a user loaded without a query, the first
+        attribute other than the id used loads the user.
+        """
+        user = cls(id=id)
+        make_transient_to_detached(user)
+        return user
+
+    @staticmethod
+    def _token_serializer(kind, expires_in=None):
+        return Serializer(current_app.config['SECRET_KEY'], expires_in=expires_in,
+                          salt=f'{kind}-token')
+
+    def generate_access_token(self):
+        """Return a stateless token authenticating the user for a short time."""
+        serializer = self._token_serializer(
+            'access', current_app.config.get('ACCESS_TOKEN_TTL', 900))
+        return serializer.dumps({'id': self.id, 'ver': self.token_version or 0}).decode('utf-8')
+
+    def generate_refresh_token(self):
+        """Return a long lived token to get new access tokens with."""
+        serializer = self._token_serializer(
+            'refresh', current_app.config.get('REFRESH_TOKEN_TTL', 30 * 24 * 3600))
+        return serializer.dumps({'id': self.id, 'ver': self.token_version or 0}).decode('utf-8')
+
+    @staticmethod
+    def verify_stateless_token(token, kind='access'):
+        """Return the claims of a valid access or refresh token, or {}."""
+        try:
+            data = User._token_serializer(kind).loads(token)
+        except BadData:
+            return {}
+        if not isinstance(data, dict) or not {'id', 'ver'} <= data.keys():
+            return {}
+        return data
+
+    def revoke_tokens(self):
+        """Revoke the stateless access and refresh tokens issued so far."""
+        self.token_version = (self.token_version or 0) + 1
+        token_revocations.revoke(self.id, self.token_version)
+
     def subscribe(self, user):
-        if not self.is_subscribed_to(user):
-            self.subscribed.append(user)
-            return self
-        return None
+        """Subscribe to the user and return whether the subscription is new."""
+        result = db.session.execute(insert_ignore(subscriptions).values(
+            subscriber_id=self.id, subscribed_id=user.id))
+        if result.rowcount != 1:
+            return False
+        self._count_subscription(user, 1)
+        return True
 
     def unsubscribe(self, user):
-        if self.is_subscribed_to(user):
-            self.subscribed.remove(user)
-            return self
-        return None
+        """Unsubscribe from the user and return whether there was a subscription."""
+        result = db.session.execute(subscriptions.delete().where(
+            self._subscription_to(user)))
+        if result.rowcount != 1:
+            return False
+        self._count_subscription(user, -1)
+        return True
 
     def is_subscribed_to(self, user):
-        return self.subscribed.filter(
-            subscriptions.c.subscribed_id == user.id).count() > 0
+        return db.session.query(exists().where(self._subscription_to(user))).scalar()
+
+    def _subscription_to(self, user):
+        return and_(subscriptions.c.subscriber_id == self.id,
+                    subscriptions.c.subscribed_id == user.id)
+
+    def _count_subscription(self, user, delta):
+        """Add delta to the counters of both users in one statement."""
+        User.query.filter(User.id.in_([self.id, user.id])).update({
+            User.updated_on: User.updated_on,  # not a change of the user
+            User.subscribed_count: User.subscribed_count + case(
+                [(User.id == self.id, delta)], else_=0),
+            User.subscribers_count: User.subscribers_count + case(
+                [(User.id == user.id, delta)], else_=0),
+        }, synchronize_session=False)
+        for instance in (self, user):
+            if instance in db.session:
+                db.session.expire(instance, ['subscribed_count', 'subscribers_count'])
 
     def __repr__(self):
         """Representation of a User instance."""
         return '<User {}>'.format(self.username)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def forget_cached_tokens(mapper, connection, user):
+    """Stop trusting cached tokens of a user that changed."""
+    token_cache.invalidate(user.id)
+
+
+@event.listens_for(User, 'after_delete')
+def revoke_deleted_user_tokens(mapper, connection, user):
+    """Reject the stateless tokens of a deleted user, trusted without a query."""
+    token_revocations.revoke(user.id, (user.token_version or 0) + 1)
@@ -0,0 +1,237 @@
+"""Hashing and checking of passwords away from the request's thread."""
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from hashlib import sha256
+from threading import Lock
+import hmac
+import math
+import os
+import time
+
+import bcrypt
+
+
+def _bytes(value):
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+
+class BcryptHasher:
+    """bcrypt hashes, costing twice the time for every increase of the cost."""
+
+    name = 'bcrypt'
+
+    def __init__(self, cost=12):
+        self.cost = cost
+
+    @staticmethod
+    def identify(pw_hash):
+        return _bytes(pw_hash).startswith(b'$2')
+
+    def hash(self, password):
+        return bcrypt.hashpw(_bytes(password), bcrypt.gensalt(self.cost)).decode('ascii')
+
+    def check(self, pw_hash, password):
+        try:
+            return bcrypt.checkpw(_bytes(password), _bytes(pw_hash))
+        except ValueError:  # malformed hash or a password too long
+            return False
+
+    def needs_rehash(self, pw_hash):
+        return int(_bytes(pw_hash).split(b'$')[2]) < self.cost
+
+    def tune(self, seconds):
+        """Raise the cost to the highest one hashing within the given seconds."""
+        base = 8
+        elapsed = _timed(BcryptHasher(base).hash)
+        self.cost = max(self.cost, base + math.floor(math.log2(seconds / elapsed)))
+
+
+class Argon2Hasher:
+    """argon2id hashes, costing time linearly to the number of iterations."""
+
+    name = 'argon2'
+
+    def __init__(self, cost=2, memory_cost=65536, parallelism=1):
+        self.cost = cost
+        self.memory_cost = memory_cost
+        self.parallelism = parallelism
+
+    def _hasher(self):
+        import argon2  # optional dependency, only needed to hash with argon2
+        return argon2.PasswordHasher(time_cost=self.cost, memory_cost=self.memory_cost,
+                                     parallelism=self.parallelism)
+
+    @staticmethod
+    def identify(pw_hash):
+        return _bytes(pw_hash).startswith(b'$argon2')
+
+    def hash(self, password):
+        return self._hasher().hash(password)
+
+    def check(self, pw_hash, password):
+        from argon2.exceptions import VerificationError, InvalidHash
+        try:
+            return self._hasher().verify(_bytes(pw_hash), password)
+        except (VerificationError, InvalidHash):
+            return False
+
+    def needs_rehash(self, pw_hash):
+        # $argon2id$v=19$m=65536,t=2,p=1$salt$hash
+        parts = _bytes(pw_hash).decode('ascii').split('$')
+        if parts[1] != 'argon2id':
+            return True
+        params = dict(param.split('=') for param in parts[3].split(','))
+        return int(params['t']) < self.cost or int(params['m']) < self.memory_cost
+
+    def tune(self, seconds):
+        """Raise the number of iterations to the highest hashing within the given seconds."""
+        elapsed = _timed(Argon2Hasher(1, self.memory_cost, self.parallelism).hash)
+        self.cost = max(self.cost, math.floor(seconds / elapsed))
+
+
+HASHERS = {hasher.name: hasher for hasher in (BcryptHasher, Argon2Hasher)}
+
+
+def _timed(hash_, runs=3):
+    """Return the shortest time of hashing a password, in seconds."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        hash_('password to time')
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+class PasswordChecker:
+    """
+    Hasher and checker of passwords running in a bounded pool of processes.
+
+    New passwords are hashed with the `PASSWORD_SCHEME` hasher, bcrypt at
+    `BCRYPT_LEVEL` or argon2 at `ARGON2_TIME_COST`, and hashes of any of the
+    schemes are checked. With `PASSWORD_HASH_TIME` set the cost is raised
+    when the application starts, to the highest one hashing within that many
+    seconds on this machine. Every process tunes on its own, so the configured
+    cost stays the floor and only hashes of another scheme or of a lower cost
+    are reported by `needs_rehash`; a process tuning lower than another never
+    rehashes the passwords the other one hashed. Passwords are rehashed when
+    users log in.
+
+    Hashing takes hundreds of milliseconds of CPU, so it runs in up to
+    `PASSWORD_POOL_SIZE` processes instead of the worker serving the request,
+    which keeps serving its other requests. With a size of 0 passwords are
+    hashed in the request's thread.
+
+    Successful checks of Basic auth credentials are remembered for
+    `CREDENTIAL_CACHE_TTL` seconds, so clients sending them on every request
+    are not hashed each time. The cache is keyed by an HMAC of the email, the
+    password and the stored hash, so it holds no passwords and a changed
+    password misses it.
+    """
+
+    def __init__(self, pool_size=2, maxsize=1024, ttl=60):
+        self.pool_size = pool_size
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hasher = BcryptHasher()
+        self._secret = b''
+        self._pool = None
+        self._pool_pid = None
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.pool_size = app.config.get('PASSWORD_POOL_SIZE', self.pool_size)
+        self.maxsize = app.config.get('CREDENTIAL_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get('CREDENTIAL_CACHE_TTL', self.ttl)
+        self._secret = str(app.config.get('SECRET_KEY', '')).encode('utf-8')
+
+        scheme = app.config.get('PASSWORD_SCHEME', 'bcrypt')
+        if scheme not in HASHERS:
+            raise RuntimeError(f'Unknown password scheme {scheme}')
+        if scheme == 'argon2':
+            self.hasher = Argon2Hasher(
+                int(app.config.get('ARGON2_TIME_COST', 2)),
+                int(app.config.get('ARGON2_MEMORY_COST', 65536)))
+        else:
+            self.hasher = BcryptHasher(int(app.config.get('BCRYPT_LEVEL', 12)))
+        if app.config.get('PASSWORD_HASH_TIME'):
+            self.hasher.tune(float(app.config['PASSWORD_HASH_TIME']))
+            app.logger.info('Hashing passwords with %s at a cost of %s',
+                            scheme, self.hasher.cost)
+        app.extensions['password_checker'] = self
+
+    def _hasher_of(self, pw_hash):
+        """Return the hasher of the scheme of the hash or None."""
+        if self.hasher.identify(pw_hash):
+            return self.hasher
+        for hasher in HASHERS.values():
+            if hasher.identify(pw_hash):
+                return hasher()
+        return None
+
+    def _run(self, function, *args):
+        """Run the function in the pool, or in this thread without one."""
+        if not self.pool_size:
+            return function(*args)
+        with self._lock:
+            # started after forking, so every worker process has a pool
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.pool_size)
+                self._pool_pid = os.getpid()
+            pool = self._pool
+        try:
+            return pool.submit(function, *args).result()
+        except BrokenProcessPool:
+            with self._lock:
+                self._pool = None
+            return function(*args)
+
+    def hash(self, password):
+        """Return the hash of the password with the configured scheme and cost."""
+        return self._run(self.hasher.hash, password)
+
+    def check(self, pw_hash, password):
+        """Return whether the password matches the hash."""
+        hasher = self._hasher_of(pw_hash) if pw_hash else None
+        return hasher is not None and self._run(hasher.check, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """Return whether the hash is of another scheme or a lower cost than configured."""
+        return not self.hasher.identify(pw_hash) or self.hasher.needs_rehash(pw_hash)
+
+    def _key(self, user, password):
+        return hmac.new(self._secret, b'\0'.join([
+            _bytes(user.email), _bytes(password), _bytes(user.password or b'')]),
+            sha256).digest()
+
+    def verify(self, user, password):
+        """
+        Return whether the password is the user's, remembering if it is.
+
+        The password is checked by `user.is_password_correct`, which may
+        rehash it.
+        """
+        key = self._key(user, password)
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is not None:
+                if expires_at >= time.monotonic():
+                    self._entries.move_to_end(key)
+                    return True
+                del self._entries[key]
+
+        if not user.is_password_correct(password):
+            return False
+        key = self._key(user, password)
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,132 @@
+"""Cache of verified authentication tokens and list of revoked ones."""
+
+from collections import OrderedDict
+from threading import Lock
+import time
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from bookmarks.cache import LocalBackend
+
+
+class TokenCache:
+    """
+    Bounded TTL cache mapping verified tokens to a snapshot of their user.
+
+    The snapshot is a detached copy of the user's columns, which is merged
+    into the request's session without loading, so a cached token costs no
+    query to the users table. Columns marked `info={'volatile': True}`, such
+    as counters updated in bulk, are left out of the snapshot and loaded from
+    the row when used. Entries of a user are dropped whenever the user row is
+    updated or deleted, e.g. when its token changes, and live no longer than
+    the token itself. The cache is per process, so `ttl` bounds how long
+    another worker may still accept a token that has been revoked.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tokens_by_user = {}
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('TOKEN_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get('TOKEN_CACHE_TTL', self.ttl)
+
+    @staticmethod
+    def _snapshot(user):
+        """Return a detached copy of the loaded columns of the user."""
+        mapper = inspect(user).mapper
+        snapshot = mapper.class_(**{
+            attr.key: getattr(user, attr.key) for attr in mapper.column_attrs
+            if not any(column.info.get('volatile') for column in attr.columns)})
+        make_transient_to_detached(snapshot)
+        return snapshot
+
+    def get(self, token):
+        """Return the snapshot of the token's user or None."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, snapshot = entry
+            if expires_at < time.monotonic():
+                self._remove(token)
+                return None
+            self._entries.move_to_end(token)
+            return snapshot
+
+    def set(self, token, user, expires_at=None):
+        """Cache the token's user, until the unix time the token expires at if given."""
+        snapshot = self._snapshot(user)
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        with self._lock:
+            self._remove(token)
+            self._entries[token] = (time.monotonic() + ttl, snapshot)
+            self._tokens_by_user.setdefault(snapshot.id, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, user_id):
+        """Drop the tokens of the given user."""
+        with self._lock:
+            for token in self._tokens_by_user.get(user_id, set()).copy():
+                self._remove(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def _remove(self, token):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._tokens_by_user[entry[1].id]
+        tokens.discard(token)
+        if not tokens:
+            del self._tokens_by_user[entry[1].id]
+
+
+class TokenRevocations:
+    """
+    Compact list of revoked stateless access tokens, by user.
+
+    Revoking the tokens of a user bumps their token version, and access
+    tokens carry the version they were issued with, so an entry holding the
+    lowest version still valid rejects every older token of the user. Access
+    tokens expire after `ttl` seconds, so entries are only kept that long and
+    the list holds at most one entry per user who revoked tokens recently.
+    The entries are kept per process, or shared by all workers in redis when
+    `TOKEN_REVOCATION_REDIS_URL` is set; otherwise other workers may accept a
+    revoked token until it expires.
+    """
+
+    PREFIX = 'revoked-tokens:'
+
+    def __init__(self, ttl=900):
+        self.ttl = ttl
+        self.backend = LocalBackend()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('ACCESS_TOKEN_TTL', self.ttl)
+        url = app.config.get('TOKEN_REVOCATION_REDIS_URL')
+        if url:
+            import redis  # optional dependency, only needed for a shared list
+            self.backend = redis.Redis.from_url(url)
+
+    def revoke(self, user_id, version):
+        """Reject the access tokens of the user older than the given version."""
+        self.backend.set(self.PREFIX + str(user_id), version, ex=self.ttl)
+
+    def is_revoked(self, user_id, version):
+        valid_from = self.backend.get(self.PREFIX + str(user_id))
+        return valid_from is not None and version < int(valid_from)
+
+    def clear(self):
+        if isinstance(self.backend, LocalBackend):
+            self.backend = LocalBackend()
@@ -1,67 +1,109 @@
 """Helper functions."""
 
-from threading import Thread
-from urllib.parse import urljoin
-import re
+from datetime import datetime, timedelta
+import hashlib
 
 from flask import current_app
-import requests
 from cloudinary import config, uploader
-from bs4 import BeautifulSoup
+from kombu.exceptions import OperationalError
 
-from bookmarks import db
+from bookmarks import db, response_cache, scraper
 from bookmarks.models import Bookmark
 
 
-def _scrape_img_url(html, url):
-    """Search and return the image url from html code or return None."""
-    soup = BeautifulSoup(html, 'html.parser')
-    img_url = soup.find('meta', {'property': 'og:image'})
-    if img_url:
-        return img_url.get('content')
+def _upload_img(img_url):
+    """Upload image to cloudinary service once per image url and return its url."""
+    config(cloud_name=current_app.config['CLOUDINARY_CLOUD_NAME'],
+           api_key=current_app.config['CLOUDINARY_API_KEY'],
+           api_secret=current_app.config['CLOUDINARY_SECRET_KEY'])
+    public_id = hashlib.sha1(img_url.encode('utf-8')).hexdigest()
+    response = uploader.upload(img_url, public_id=public_id, overwrite=False)
+    return response['secure_url']
 
-    if not soup.head:
-        return None
 
-    logo = soup.head.find('img', src=re.compile('logo'))
-    if logo:
-        return urljoin(url, logo['src'])
-    favicon = soup.head.find('link', href=re.compile('favicon'))
-    if favicon:
-        return urljoin(url, favicon['href'])
+def thumbnails_enabled():
+    """Return whether the configuration allows uploading thumbnails."""
+    cloudinary_config = (
+        'CLOUDINARY_SECRET_KEY',
+        'CLOUDINARY_API_KEY',
+        'CLOUDINARY_CLOUD_NAME'
+    )
+    return all(current_app.config.get(k) for k in cloudinary_config)
 
-    return None
 
+def _is_pending(bookmark):
+    """Return whether the bookmark's thumbnail was queued recently."""
+    timeout = timedelta(seconds=current_app.config.get('THUMBNAIL_PENDING_TIMEOUT', 3600))
+    return (bookmark.image_status == 'pending' and bookmark.image_queued_on is not None
+            and bookmark.image_queued_on > datetime.utcnow() - timeout)
 
-def _fetch_img_and_upload(app, url, bookmark_id):
-    """Fetch image url and upload it to cloudinary service."""
-    config(cloud_name=app.config['CLOUDINARY_CLOUD_NAME'],
-           api_key=app.config['CLOUDINARY_API_KEY'],
-           api_secret=app.config['CLOUDINARY_SECRET_KEY'])
-    response = uploader.upload(url)
 
-    with app.app_context():  # update bookmark's image url
-        bookmark = Bookmark.query.get(bookmark_id)
-        bookmark.image = response['secure_url']
-        db.session.add(bookmark)
-        db.session.commit()
+def queue_thumbnail(bookmark, url_changed=False):
+    """
+    Queue fetching the thumbnail of the bookmark's url.
 
+    A bookmark with a thumbnail pending is not queued again, the queued task
+    fetches whatever url the bookmark has when it runs, unless its url changed
+    or it has been pending for longer than `THUMBNAIL_PENDING_TIMEOUT`, as
+    the task may have been lost. When the broker is unreachable the bookmark
+    is left pending, to be queued again once it has been for that long.
+    """
+    from bookmarks.tasks import fetch_thumbnail_task
 
-def get_url_thumbnail(url, bookmark_id):
-    """Fetch and save url's related image if does not exist already locally."""
-    cloudinary_config = (
-        'CLOUDINARY_SECRET_KEY',
-        'CLOUDINARY_API_KEY',
-        'CLOUDINARY_CLOUD_NAME'
-    )
-    if not all(current_app.config.get(k) for k in cloudinary_config):
-        return None
-    response = requests.get(url)
-    if response.status_code != 200:
-        return None
+    if not thumbnails_enabled() or (_is_pending(bookmark) and not url_changed):
+        return False
+    bookmark.image_status = 'pending'
+    bookmark.image_queued_on = datetime.utcnow()
+    db.session.add(bookmark)
+    db.session.commit()
+    try:
+        fetch_thumbnail_task.delay(bookmark.id)
+    except OperationalError:
+        current_app.logger.exception('Queueing thumbnail of bookmark %s failed',
+                                     bookmark.id)
+        return False
+    return True
+
+
+def queue_thumbnails(bookmark_ids):
+    """Queue fetching the thumbnails of bookmarks added in bulk."""
+    from bookmarks.tasks import fetch_thumbnail_task
 
-    img_url = _scrape_img_url(response.content, url)
+    if not thumbnails_enabled() or not bookmark_ids:
+        return False
+    Bookmark.query.filter(Bookmark.id.in_(bookmark_ids)).update(
+        {'image_status': 'pending', 'image_queued_on': datetime.utcnow()},
+        synchronize_session=False)
+    db.session.commit()
+    try:
+        for bookmark_id in bookmark_ids:
+            fetch_thumbnail_task.delay(bookmark_id)
+    except OperationalError:
+        current_app.logger.exception('Queueing thumbnails of %s bookmarks failed',
+                                     len(bookmark_ids))
+        return False
+    return True
+
+
+def fetch_thumbnail(bookmark_id):
+    """Fetch and save the image of the bookmark's url."""
+    bookmark = Bookmark.query.get(bookmark_id)
+    if bookmark is None:
+        return
+    metadata = scraper.get_metadata(bookmark.url)
+    img_url = scraper.image_url(metadata) if metadata else None
     if img_url:
-        app = current_app._get_current_object()
-        Thread(target=_fetch_img_and_upload,
-                args=[app, img_url, bookmark_id]).start()
+        bookmark.image = _upload_img(img_url)
+        bookmark.image_status = 'ready'
+    else:
+        bookmark.image_status = 'missing'
+    db.session.add(bookmark)
+    db.session.commit()
+    response_cache.invalidate()
+
+
+def mark_thumbnail_failed(bookmark_id):
+    """Mark that fetching the bookmark's thumbnail gave up."""
+    Bookmark.query.filter_by(id=bookmark_id).update({'image_status': 'failed'})
+    db.session.commit()
+    response_cache.invalidate()
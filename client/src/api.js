@@ -263,16 +263,24 @@ export function deleteVote(vote_id) {
     })
 }
 
-export function getFavourites() {
-    return fetch('/api/v1/favourites/', {
+export function getFavourites(cursor = null, favourites = []) {
+    let url = '/api/v1/favourites/?page_size=100';
+    if (cursor) {
+        url += '&cursor=' + encodeURIComponent(cursor);
+    }
+    return fetch(url, {
         headers: store.headers
     })
         .then(response => {
-            if (response.ok) {
-                return response.json()
-            } else {
-                return []
+            if (!response.ok) {
+                return favourites
             }
+            const next = response.headers.get('x-next-cursor');
+            return response.json().then(data => {
+                favourites = favourites.concat(data);
+                // follow the cursor so every favourite is loaded
+                return next ? getFavourites(next, favourites) : favourites
+            })
         })
 }
 
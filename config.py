@@ -17,6 +17,79 @@ class Common:
     # Flask-SqlAlchemy event system is not being used
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Responses of anonymous read endpoints kept per process, and in redis
+    # too when RESPONSE_CACHE_REDIS_URL is set
+    RESPONSE_CACHE_SIZE = 512
+    RESPONSE_CACHE_TTL = 60
+
+    # Verified tokens kept per process, revoked tokens may still be accepted
+    # by other workers for up to TOKEN_CACHE_TTL seconds
+    TOKEN_CACHE_SIZE = 1024
+    TOKEN_CACHE_TTL = 60
+
+    # Passwords are hashed with bcrypt at BCRYPT_LEVEL, or with argon2 (needs
+    # argon2-cffi) at ARGON2_TIME_COST. With PASSWORD_HASH_TIME set to a number
+    # of seconds the cost is raised on startup to hash within that time, never
+    # below the configured one. Passwords of another scheme or a lower cost are
+    # rehashed when users log in
+    PASSWORD_SCHEME = 'bcrypt'
+    ARGON2_TIME_COST = 2
+    ARGON2_MEMORY_COST = 65536
+    PASSWORD_HASH_TIME = None
+
+    # Passwords are hashed by a pool of PASSWORD_POOL_SIZE processes, 0 hashes
+    # them in the request's thread. Basic auth credentials verified are
+    # trusted for CREDENTIAL_CACHE_TTL seconds per process
+    PASSWORD_POOL_SIZE = 2
+    CREDENTIAL_CACHE_SIZE = 1024
+    CREDENTIAL_CACHE_TTL = 60
+
+    # With STATELESS_TOKENS requesting a token returns an access token valid
+    # for ACCESS_TOKEN_TTL seconds, trusted without reading the users table,
+    # and a refresh token valid for REFRESH_TOKEN_TTL seconds. Revoked access
+    # tokens are listed per process unless TOKEN_REVOCATION_REDIS_URL is set
+    STATELESS_TOKENS = False
+    ACCESS_TOKEN_TTL = 900
+    REFRESH_TOKEN_TTL = 30 * 24 * 3600
+
+    # Outbound requests to scrape pages and verify recaptchas
+    HTTP_CONNECT_TIMEOUT = 3.05
+    HTTP_READ_TIMEOUT = 10
+    HTTP_MAX_BODY = 2 * 1024 * 1024
+    HTTP_POOL_HOSTS = 20
+    HTTP_POOL_SIZE = 10
+    HTTP_MAX_PER_HOST = 4
+
+    # Scraped metadata of pages, fetched at most once per PAGE_CACHE_TTL seconds
+    SCRAPER_MAX_BYTES = 512 * 1024
+    PAGE_CACHE_TTL = 3600
+    PAGE_CACHE_SIZE = 10000
+
+    # Thumbnails still pending THUMBNAIL_PENDING_TIMEOUT seconds after being
+    # queued are considered lost, their bookmarks can be queued again
+    THUMBNAIL_PENDING_TIMEOUT = 3600
+
+    # Bookmarks added within TRENDING_WINDOW seconds can trend, their scores
+    # are recomputed every TRENDING_RESCORE_INTERVAL seconds by celery beat
+    TRENDING_WINDOW = 7 * 24 * 3600
+    TRENDING_RESCORE_INTERVAL = 600
+
+    # Feeds keep the latest FEED_LENGTH bookmarks of the users subscribed to,
+    # trimmed every TIMELINE_TRIM_INTERVAL seconds by celery beat. Bookmarks
+    # of users with more than FEED_FANOUT_LIMIT subscribers are pulled by
+    # each subscriber when reading instead of copied to every feed
+    FEED_LENGTH = 1000
+    FEED_FANOUT_LIMIT = 5000
+    TIMELINE_TRIM_INTERVAL = 3600
+
+    # Bookmarks inserted per transaction when importing
+    IMPORT_BATCH_SIZE = 500
+
+    # Changes of ratings by votes kept per process and written in batches
+    RATING_BUFFER = False
+    RATING_FLUSH_INTERVAL = 5
+    RATING_FLUSH_SIZE = 100
+
 
 class Development(Common):
     """Development configuration."""
@@ -66,3 +139,7 @@ class Production(Common):
         CLOUDINARY_API_KEY = os.environ['CLOUDINARY_API_KEY']
         CLOUDINARY_SECRET_KEY = os.environ['CLOUDINARY_SECRET_KEY']
         CELERY_BROKER_URL = os.environ['CELERY_BROKER_URL']
+        RESPONSE_CACHE_REDIS_URL = os.environ.get('RESPONSE_CACHE_REDIS_URL')
+        TOKEN_REVOCATION_REDIS_URL = os.environ.get('TOKEN_REVOCATION_REDIS_URL')
+        PASSWORD_SCHEME = os.environ.get('PASSWORD_SCHEME', 'bcrypt')
+        PASSWORD_HASH_TIME = os.environ.get('PASSWORD_HASH_TIME')
@@ -0,0 +1,45 @@
+"""Add indexes and unique constraints of hot lookups
+
+Revision ID: 2a6f8c3d9e51
+Revises: e7a2c5d81f43
+Create Date: 2026-10-18 15:48:09.530417
+
+Fails on databases with duplicate votes, favourites, usernames or emails,
+which have to be removed first. Duplicate subscriptions are removed by
+7d3f9a2c6e18, which keys them.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2a6f8c3d9e51'
+down_revision = 'e7a2c5d81f43'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_bookmarks_user_id', 'bookmarks', ['user_id'], False),
+    ('ix_bookmarks_created_on_id', 'bookmarks', ['created_on', 'id'], False),
+    ('ix_bookmarks_rating_id', 'bookmarks', ['rating', 'id'], False),
+    ('ix_votes_user_id_bookmark_id', 'votes', ['user_id', 'bookmark_id'], True),
+    ('ix_votes_bookmark_id', 'votes', ['bookmark_id'], False),
+    ('ix_favourites_user_id_bookmark_id', 'favourites', ['user_id', 'bookmark_id'], True),
+    ('ix_favourites_bookmark_id', 'favourites', ['bookmark_id'], False),
+    ('ix_users_username', 'users', ['username'], True),
+    ('ix_users_email', 'users', ['email'], True),
+    ('ix_subscriptions_subscriber_id_subscribed_id', 'subscriptions',
+     ['subscriber_id', 'subscribed_id'], False),
+    ('ix_subscriptions_subscribed_id', 'subscriptions', ['subscribed_id'], False),
+]
+
+
+def upgrade():
+    for name, table, columns, unique in INDEXES:
+        op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    for name, table, columns, unique in reversed(INDEXES):
+        op.drop_index(name, table)
@@ -0,0 +1,33 @@
+"""Add bookmarks count to tags
+
+Revision ID: 3c9a1f2b7d4e
+Revises: fed4c68c35d7
+Create Date: 2026-10-18 10:12:31.402913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9a1f2b7d4e'
+down_revision = 'fed4c68c35d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tags') as batch_op:
+        batch_op.add_column(sa.Column('bookmarks_count', sa.Integer(),
+                                      nullable=False, server_default='0'))
+        batch_op.create_index('ix_tags_bookmarks_count', ['bookmarks_count'])
+    op.execute(
+        'UPDATE tags SET bookmarks_count = (SELECT count(*) FROM tags_bookmarks '
+        'WHERE tags_bookmarks.tag_id = tags.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('tags') as batch_op:
+        batch_op.drop_index('ix_tags_bookmarks_count')
+        batch_op.drop_column('bookmarks_count')
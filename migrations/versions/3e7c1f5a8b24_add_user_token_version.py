@@ -0,0 +1,27 @@
+"""Add the version of the stateless tokens of users
+
+Revision ID: 3e7c1f5a8b24
+Revises: e1b6d4a92c7f
+Create Date: 2026-10-18 21:38:15.602947
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e7c1f5a8b24'
+down_revision = 'e1b6d4a92c7f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('token_version', sa.Integer(), nullable=False,
+                                      server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('token_version')
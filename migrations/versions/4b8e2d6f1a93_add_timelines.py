@@ -0,0 +1,48 @@
+"""Add timelines of the bookmarks of users subscribed to
+
+Revision ID: 4b8e2d6f1a93
+Revises: 9c4e1a7b5d20
+Create Date: 2026-10-18 19:04:12.318205
+
+Existing subscriptions start with empty timelines, filled as bookmarks are
+added.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8e2d6f1a93'
+down_revision = '9c4e1a7b5d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app() runs create_all() before the migrations are applied
+    if 'timelines' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'timelines',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('bookmark_id', sa.Integer(), nullable=False),
+        sa.Column('author_id', sa.Integer(), nullable=False),
+        sa.Column('created_on', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['bookmark_id'], ['bookmarks.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['author_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_timelines_bookmark_id', 'timelines', ['bookmark_id'])
+    op.create_index('ix_timelines_user_id_bookmark_id', 'timelines',
+                    ['user_id', 'bookmark_id'], unique=True)
+    op.create_index('ix_timelines_user_id_created_on_id', 'timelines',
+                    ['user_id', 'created_on', 'id'])
+    op.create_index('ix_timelines_user_id_author_id_created_on', 'timelines',
+                    ['user_id', 'author_id', 'created_on'])
+
+
+def downgrade():
+    op.drop_table('timelines')
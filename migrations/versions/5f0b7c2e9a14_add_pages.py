@@ -0,0 +1,42 @@
+"""Add pages to cache scraped metadata
+
+Revision ID: 5f0b7c2e9a14
+Revises: 8d2e4b6a1c37
+Create Date: 2026-10-18 13:05:52.630118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f0b7c2e9a14'
+down_revision = '8d2e4b6a1c37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app() runs create_all() before the migrations are applied
+    if 'pages' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'pages',
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('status_code', sa.Integer(), nullable=True),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('og_image', sa.String(), nullable=True),
+        sa.Column('logo', sa.String(), nullable=True),
+        sa.Column('favicon', sa.String(), nullable=True),
+        sa.Column('etag', sa.String(), nullable=True),
+        sa.Column('last_modified', sa.String(), nullable=True),
+        sa.Column('fetched_on', sa.DateTime(), nullable=True),
+        sa.Column('used_on', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('url')
+    )
+    op.create_index('ix_pages_used_on', 'pages', ['used_on'])
+
+
+def downgrade():
+    op.drop_index('ix_pages_used_on', table_name='pages')
+    op.drop_table('pages')
@@ -0,0 +1,25 @@
+"""Add index of the listing of favourites
+
+Revision ID: 6a2d8e4c9f31
+Revises: 3e7c1f5a8b24
+Create Date: 2026-10-18 22:05:49.731284
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a2d8e4c9f31'
+down_revision = '3e7c1f5a8b24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_favourites_user_id_saved_on_id', 'favourites',
+                    ['user_id', 'saved_on', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_favourites_user_id_saved_on_id', 'favourites')
@@ -0,0 +1,64 @@
+"""Key subscriptions by their users and count them
+
+Revision ID: 7d3f9a2c6e18
+Revises: 4b8e2d6f1a93
+Create Date: 2026-10-18 19:47:31.902664
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3f9a2c6e18'
+down_revision = '4b8e2d6f1a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_subscriptions_subscriber_id_subscribed_id', 'subscriptions')
+    # keep the first of duplicate subscriptions, the rest would break the key
+    op.execute('DELETE FROM subscriptions '
+               'WHERE subscriber_id IS NULL OR subscribed_id IS NULL')
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DELETE FROM subscriptions a USING subscriptions b '
+                   'WHERE a.subscriber_id = b.subscriber_id '
+                   'AND a.subscribed_id = b.subscribed_id AND a.ctid > b.ctid')
+    else:
+        op.execute('DELETE FROM subscriptions WHERE rowid NOT IN '
+                   '(SELECT min(rowid) FROM subscriptions '
+                   'GROUP BY subscriber_id, subscribed_id)')
+    with op.batch_alter_table('subscriptions') as batch_op:
+        batch_op.alter_column('subscriber_id', existing_type=sa.Integer(),
+                              nullable=False)
+        batch_op.alter_column('subscribed_id', existing_type=sa.Integer(),
+                              nullable=False)
+        batch_op.create_primary_key('pk_subscriptions',
+                                    ['subscriber_id', 'subscribed_id'])
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('subscribers_count', sa.Integer(),
+                                      nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('subscribed_count', sa.Integer(),
+                                      nullable=False, server_default='0'))
+    op.execute(
+        'UPDATE users SET '
+        'subscribers_count = (SELECT count(*) FROM subscriptions '
+        'WHERE subscriptions.subscribed_id = users.id), '
+        'subscribed_count = (SELECT count(*) FROM subscriptions '
+        'WHERE subscriptions.subscriber_id = users.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('subscribed_count')
+        batch_op.drop_column('subscribers_count')
+    with op.batch_alter_table('subscriptions') as batch_op:
+        batch_op.drop_constraint('pk_subscriptions', type_='primary')
+        batch_op.alter_column('subscriber_id', existing_type=sa.Integer(),
+                              nullable=True)
+        batch_op.alter_column('subscribed_id', existing_type=sa.Integer(),
+                              nullable=True)
+    op.create_index('ix_subscriptions_subscriber_id_subscribed_id', 'subscriptions',
+                    ['subscriber_id', 'subscribed_id'], unique=True)
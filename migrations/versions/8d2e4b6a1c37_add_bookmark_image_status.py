@@ -0,0 +1,27 @@
+"""Add image status to bookmarks
+
+Revision ID: 8d2e4b6a1c37
+Revises: 3c9a1f2b7d4e
+Create Date: 2026-10-18 11:40:07.118240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2e4b6a1c37'
+down_revision = '3c9a1f2b7d4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('bookmarks') as batch_op:
+        batch_op.add_column(sa.Column('image_status', sa.String(length=10),
+                                      nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('bookmarks') as batch_op:
+        batch_op.drop_column('image_status')
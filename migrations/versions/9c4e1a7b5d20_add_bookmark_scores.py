@@ -0,0 +1,37 @@
+"""Add hot and trending scores to bookmarks
+
+Revision ID: 9c4e1a7b5d20
+Revises: 2a6f8c3d9e51
+Create Date: 2026-10-18 17:26:52.640118
+
+Compute the scores of existing bookmarks with `flask rescore-bookmarks`.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4e1a7b5d20'
+down_revision = '2a6f8c3d9e51'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('bookmarks') as batch_op:
+        batch_op.add_column(sa.Column('hot_score', sa.Float(), nullable=False,
+                                      server_default='0'))
+        batch_op.add_column(sa.Column('trending_score', sa.Float(), nullable=False,
+                                      server_default='0'))
+    op.create_index('ix_bookmarks_hot_score_id', 'bookmarks', ['hot_score', 'id'])
+    op.create_index('ix_bookmarks_trending_score_id', 'bookmarks',
+                    ['trending_score', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_bookmarks_trending_score_id', 'bookmarks')
+    op.drop_index('ix_bookmarks_hot_score_id', 'bookmarks')
+    with op.batch_alter_table('bookmarks') as batch_op:
+        batch_op.drop_column('trending_score')
+        batch_op.drop_column('hot_score')
@@ -0,0 +1,27 @@
+"""Add the time images of bookmarks were queued
+
+Revision ID: a4f7b2d9e6c3
+Revises: 6a2d8e4c9f31
+Create Date: 2026-10-18 23:12:36.504127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4f7b2d9e6c3'
+down_revision = '6a2d8e4c9f31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('bookmarks') as batch_op:
+        batch_op.add_column(sa.Column('image_queued_on', sa.DateTime(),
+                                      nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('bookmarks') as batch_op:
+        batch_op.drop_column('image_queued_on')
@@ -0,0 +1,35 @@
+"""Add full-text search index of bookmarks
+
+Revision ID: b41d9e3f6c28
+Revises: 5f0b7c2e9a14
+Create Date: 2026-10-18 14:21:36.905561
+
+Fill the index for existing bookmarks with `flask rebuild-search-index`.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b41d9e3f6c28'
+down_revision = '5f0b7c2e9a14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute('CREATE VIRTUAL TABLE IF NOT EXISTS bookmarks_search '
+                   'USING fts5(title, url, tags, tokenize="unicode61")')
+    elif dialect == 'postgresql':
+        op.execute('CREATE TABLE IF NOT EXISTS bookmarks_search ('
+                   'bookmark_id INTEGER PRIMARY KEY REFERENCES bookmarks (id) '
+                   'ON DELETE CASCADE, document TSVECTOR NOT NULL)')
+        op.execute('CREATE INDEX IF NOT EXISTS ix_bookmarks_search_document '
+                   'ON bookmarks_search USING GIN (document)')
+
+
+def downgrade():
+    op.execute('DROP TABLE IF EXISTS bookmarks_search')
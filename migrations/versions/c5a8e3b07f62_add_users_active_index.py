@@ -0,0 +1,24 @@
+"""Add index of the listing of active users
+
+Revision ID: c5a8e3b07f62
+Revises: 7d3f9a2c6e18
+Create Date: 2026-10-18 20:21:06.547810
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a8e3b07f62'
+down_revision = '7d3f9a2c6e18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_users_active_id', 'users', ['active', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_users_active_id', 'users')
@@ -0,0 +1,28 @@
+"""Widen the password hashes of users to fit argon2 hashes
+
+Revision ID: e1b6d4a92c7f
+Revises: c5a8e3b07f62
+Create Date: 2026-10-18 21:02:44.180356
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1b6d4a92c7f'
+down_revision = 'c5a8e3b07f62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('_password', existing_type=sa.String(64),
+                              type_=sa.String(128))
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('_password', existing_type=sa.String(128),
+                              type_=sa.String(64))
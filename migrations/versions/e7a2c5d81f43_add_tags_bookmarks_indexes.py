@@ -0,0 +1,28 @@
+"""Add composite indexes to tags_bookmarks
+
+Revision ID: e7a2c5d81f43
+Revises: b41d9e3f6c28
+Create Date: 2026-10-18 15:02:47.118230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a2c5d81f43'
+down_revision = 'b41d9e3f6c28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_tags_bookmarks_tag_id_bookmark_id', 'tags_bookmarks',
+                    ['tag_id', 'bookmark_id'])
+    op.create_index('ix_tags_bookmarks_bookmark_id_tag_id', 'tags_bookmarks',
+                    ['bookmark_id', 'tag_id'])
+
+
+def downgrade():
+    op.drop_index('ix_tags_bookmarks_bookmark_id_tag_id', 'tags_bookmarks')
+    op.drop_index('ix_tags_bookmarks_tag_id_bookmark_id', 'tags_bookmarks')
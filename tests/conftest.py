@@ -1,10 +1,16 @@
 """Pytest fixtures for all tests to use."""
 
+import io
 import os
 
 import pytest
+import requests
+from sqlalchemy import event
 
-from bookmarks import create_app, db as db_
+from bookmarks import (
+    create_app, db as db_, password_checker, response_cache, token_cache,
+    token_revocations
+)
 from bookmarks.users.models import User
 
 
@@ -44,6 +50,19 @@ def db(app):
     os.unlink(app.config['DATABASE'])
 
 
+@pytest.fixture
+def queries(db):
+    """Return the list of SQL statements executed during a test."""
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
 class _dict(dict):
     def __nonzero__(self):
         return True
@@ -82,6 +101,15 @@ def user(app, session, request):
     return user_
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Start every test with empty caches."""
+    response_cache.clear()
+    token_cache.clear()
+    password_checker.clear()
+    token_revocations.clear()
+
+
 @pytest.fixture(autouse=True)
 def patch_mail(monkeypatch):
     """Return True always when invoking the send_email function."""
@@ -89,17 +117,42 @@ def patch_mail(monkeypatch):
 
 
 @pytest.fixture(autouse=True)
-def patch_get_thumbnail(monkeypatch):
-    """Return None as the thumbnail couldn't be downloaded."""
-    monkeypatch.setattr('bookmarks.views.utils.get_url_thumbnail',
-                        lambda *args: None)
+def patch_queue_thumbnail(monkeypatch):
+    """Return False as if thumbnails are not configured."""
+    monkeypatch.setattr('bookmarks.views.utils.queue_thumbnail',
+                        lambda *args, **kwargs: False)
 
 
 @pytest.fixture(autouse=True)
 def patch_requests_library(monkeypatch):
     """Return True when make calls with requests library."""
-    monkeypatch.setattr('requests.get', lambda *args, **kwargs: True)
-    monkeypatch.setattr('requests.post', lambda *args, **kwargs: True)
+    monkeypatch.setattr('requests.Session.request', lambda *args, **kwargs: True)
+
+
+class _Body(io.BytesIO):
+    """Raw body of a response counting the bytes read."""
+
+    def __init__(self, content):
+        super().__init__(content)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+@pytest.fixture
+def serve_page(monkeypatch):
+    """Return a function making the requests library respond with the given page."""
+    def serve(content, status_code=200):
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers['content-type'] = 'text/html'
+        response.raw = _Body(content)
+        monkeypatch.setattr('requests.Session.request', lambda *args, **kwargs: response)
+        return response
+    return serve
 
 
 @pytest.fixture
@@ -115,7 +168,7 @@ def api(app, user):
 
         def _set_headers(self, kwargs):
             """Set headers respecting if ones were passed."""
-            kwargs['content_type'] = 'application/json'
+            kwargs.setdefault('content_type', 'application/json')
             if not 'headers' in kwargs:
                 kwargs['headers'] = {}
 
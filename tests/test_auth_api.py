@@ -6,6 +6,7 @@ import pytest
 from flask_login import current_user
 
 from bookmarks.users.models import User
+from bookmarks.users.passwords import BcryptHasher
 
 
 @pytest.mark.parametrize('email,password', [
@@ -38,6 +39,15 @@ def test_login_inactive_user(api, user, session):
     assert r.status_code == 403 and 'Email address is not verified' in r.get_json()['message']
 
 
+def test_login_rehashes_outdated_password(api, user, session):
+    user._password = BcryptHasher(4).hash('123123')
+    session.commit()
+    auth = 'Basic ' + b64encode(f'{user.email}:123123'.encode('ascii')).decode('ascii')
+    r = api.post('/auth/request-token', headers=dict(Authorization=auth))
+    assert r.status_code == 200
+    assert User.query.get(user.id).password.startswith('$2b$12$')
+
+
 def test_login_with_wrong_password(api, user):
     auth = 'Basic ' + b64encode(f'{user.email}:wrongpass'.encode('ascii')).decode('ascii')
     r = api.post('/auth/request-token', headers=dict(Authorization=auth))
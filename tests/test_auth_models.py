@@ -1,11 +1,15 @@
+import bcrypt
+import pytest
+
 from bookmarks.users.models import User
-from bookmarks import bcrypt
+from bookmarks import password_checker
+from bookmarks.users.passwords import Argon2Hasher, BcryptHasher, PasswordChecker
 
 
 def test_password_gets_hashed_when_being_set():
     """Testing the library method."""
     user = User(username='test user', password='123')
-    assert bcrypt.check_password_hash(user.password, '123')
+    assert bcrypt.checkpw(b'123', user.password.encode('ascii'))
 
 
 def test_plaintext_password_is_the_hashed_one():
@@ -17,3 +21,89 @@ def test_plaintext_password_is_the_hashed_one():
 def test_user_object_representation():
     user = User(username='test user')
     assert repr(user) == '<User test user>'
+
+
+def test_checking_passwords_in_a_pool_and_inline():
+    user = User(username='test user', password='123')
+    checker = PasswordChecker(pool_size=1)
+    assert checker.check(user.password, '123')
+    assert not checker.check(user.password, '1234')
+    assert not checker.check(None, '123')
+    checker.pool_size = 0
+    assert checker.check(user.password, '123')
+    assert not checker.check('not a hash', '123')
+
+
+class FakeUser:
+
+    email = 'a@a.com'
+    password = 'hash'
+
+    def __init__(self):
+        self.checks = 0
+
+    def is_password_correct(self, password):
+        self.checks += 1
+        return password == '123'
+
+
+def test_verified_credentials_are_remembered():
+    user = FakeUser()
+    checker = PasswordChecker(pool_size=0, maxsize=1)
+    assert checker.verify(user, '123') and checker.verify(user, '123')
+    assert not checker.verify(user, 'wrong') and not checker.verify(user, 'wrong')
+    assert user.checks == 3
+
+    user.password = 'new hash'  # a changed password is not trusted
+    assert checker.verify(user, '123')
+    assert user.checks == 4
+
+    checker.ttl = -1
+    checker.clear()
+    assert checker.verify(user, '123') and checker.verify(user, '123')
+    assert user.checks == 6
+
+
+def test_passwords_of_another_cost_or_scheme_are_rehashed():
+    user = User(username='test user')
+    user._password = BcryptHasher(4).hash('123')
+    assert password_checker.needs_rehash(user.password)
+    assert user.is_password_correct('123')
+    assert not password_checker.needs_rehash(user.password)
+    assert user.password.startswith('$2b$12$')
+
+    checker = PasswordChecker()
+    checker.hasher = Argon2Hasher()
+    assert checker.needs_rehash(user.password)
+
+
+def test_passwords_of_a_higher_cost_are_not_rehashed():
+    checker = PasswordChecker(pool_size=0)
+    checker.hasher = BcryptHasher(5)
+    assert not checker.needs_rehash(BcryptHasher(6).hash('123'))
+    assert checker.needs_rehash(BcryptHasher(4).hash('123'))
+
+    checker.hasher = Argon2Hasher(cost=2, memory_cost=65536)
+    assert not checker.needs_rehash('$argon2id$v=19$m=65536,t=3,p=1$c2FsdA$aGFzaA')
+    assert checker.needs_rehash('$argon2id$v=19$m=65536,t=1,p=1$c2FsdA$aGFzaA')
+    assert checker.needs_rehash('$argon2id$v=19$m=1024,t=3,p=1$c2FsdA$aGFzaA')
+
+
+@pytest.mark.parametrize('seconds,floor,cost', [
+    (0.25, 10, 12), (0.5, 10, 13), (0.001, 10, 10), (0.25, 13, 13)])
+def test_tuning_bcrypt_cost(monkeypatch, seconds, floor, cost):
+    monkeypatch.setattr('bookmarks.users.passwords._timed', lambda hash_: 0.01)
+    hasher = BcryptHasher(floor)
+    hasher.tune(seconds)
+    assert hasher.cost == cost
+
+
+def test_hashing_with_argon2():
+    pytest.importorskip('argon2')
+    checker = PasswordChecker(pool_size=0)
+    checker.hasher = Argon2Hasher(cost=1, memory_cost=1024)
+    pw_hash = checker.hash('123')
+    assert pw_hash.startswith('$argon2')
+    assert checker.check(pw_hash, '123') and not checker.check(pw_hash, '1234')
+    assert not checker.needs_rehash(pw_hash)
+    assert checker.check(BcryptHasher(4).hash('123'), '123')
@@ -1,8 +1,15 @@
 from datetime import datetime as dt, timedelta
+import json
 
+from flask import Flask
 import pytest
+from sqlalchemy import MetaData
 
+from bookmarks import logic, search_index
+from bookmarks.api.pagination import encode_cursor
+from bookmarks.logic import _rebuild_tag_counts, _rebuild_search_index
 from bookmarks.models import Bookmark, Tag, Favourite, Vote
+from bookmarks.search import LikeBackend, SearchIndex
 
 
 def test_getting_specific_bookmark_that_doesnt_exist(api, user, session):
@@ -18,6 +25,16 @@ def test_getting_specific_bookmark(api, user, session):
     assert resp.get_json()['id'] == b_1.id
 
 
+def test_getting_bookmark_without_internal_columns(api, user, session):
+    b_1 = Bookmark(url='https://google.com', image_status='pending',
+                   image_queued_on=dt.utcnow())
+    session.add(b_1)
+    session.commit()
+    resp = api.get(f'/bookmarks/{b_1.id}')
+    internal = {'hot_score', 'trending_score', 'image_status', 'image_queued_on'}
+    assert internal.isdisjoint(resp.get_json())
+
+
 def test_getting_latest_bookmarks_by_default(api, user, session):
     b_1 = Bookmark(id=1, created_on=dt.now())
     b_2 = Bookmark(id=2, created_on=b_1.created_on + timedelta(0, 1))
@@ -70,6 +87,24 @@ def test_getting_bookmarks_by_tag(api, user, session, tag, expect):
     assert sorted(ids) == sorted(expect)
 
 
+@pytest.mark.parametrize('query,expect', [
+    ('tag=a_tag&tag=b_tag', [2]),
+    ('tag=A_tag&tag=b_tag&tag=b_tag', [2]),
+    ('tag=a_tag&tag=c_tag', []),
+    ('tag=a_tag&tag=b_tag&tag_mode=any', [1, 2, 3]),
+    ('tag=b_tag&tag=c_tag&tag_mode=any', [2, 3]),
+])
+def test_getting_bookmarks_by_several_tags(api, user, session, query, expect):
+    t_1, t_2 = Tag(name='a_tag'), Tag(name='b_tag')
+    session.add(Bookmark(id=1, tags=[t_1]))
+    session.add(Bookmark(id=2, tags=[t_1, t_2]))
+    session.add(Bookmark(id=3, tags=[t_2]))
+    session.add(Bookmark(id=4))
+    session.commit()
+    resp = api.get(f'/bookmarks/?{query}')
+    assert sorted(b['id'] for b in resp.get_json()) == expect
+
+
 def test_getting_sorted_bookmarks_and_by_tag(api, user, session):
     t_1 = Tag(name='a_tag')
     session.add(t_1)
@@ -86,6 +121,137 @@ def test_getting_sorted_bookmarks_and_by_tag(api, user, session):
     assert ids == [b_2.id, b_3.id]
 
 
+@pytest.mark.parametrize('sort', ['date', '-date', 'rating', '-rating', 'hot'])
+def test_paging_bookmarks_with_cursor(api, user, session, sort):
+    for id_ in range(1, 6):  # same sort values so ties are broken by id
+        session.add(Bookmark(id=id_))
+    session.commit()
+    resp = api.get(f'/bookmarks/?sort={sort}')
+    expected = [b['id'] for b in resp.get_json()]
+
+    ids, cursor = [], ''
+    while cursor is not None:
+        resp = api.get(f'/bookmarks/?sort={sort}&page_size=2&cursor={cursor}'
+                       if cursor else f'/bookmarks/?sort={sort}&page_size=2')
+        ids.extend(b['id'] for b in resp.get_json())
+        cursor = resp.headers.get('X-Next-Cursor')
+    assert ids == expected and len(ids) == 5
+
+
+def test_cursor_does_not_move_with_the_rating_of_its_bookmark(api, user, session):
+    for id_ in range(1, 4):
+        session.add(Bookmark(id=id_, rating=id_))
+    session.commit()
+    resp = api.get('/bookmarks/?sort=rating&page_size=1')
+    assert resp.get_json()[0]['id'] == 3
+    Bookmark.query.get(3).rating = 0
+    session.commit()
+    resp = api.get('/bookmarks/?sort=rating&page_size=1&cursor=' +
+                   resp.headers['X-Next-Cursor'])
+    assert resp.get_json()[0]['id'] == 2
+
+
+def test_paging_bookmarks_without_counting(api, user, session):
+    for id_ in range(1, 4):
+        session.add(Bookmark(id=id_))
+    session.commit()
+    resp = api.get('/bookmarks/?page_size=2&count=false')
+    assert json.loads(resp.headers['X-Pagination'])['next_page'] == 2
+    resp = api.get('/bookmarks/?page=2&page_size=2&count=false&cursor=' +
+                   resp.headers['X-Next-Cursor'])
+    assert len(resp.get_json()) == 1
+    assert 'next_page' not in json.loads(resp.headers['X-Pagination'])
+    assert 'X-Next-Cursor' not in resp.headers
+
+
+@pytest.mark.parametrize('cursor', ['invalid', encode_cursor('rating', 0, 1)])
+def test_paging_bookmarks_with_invalid_cursor(api, user, cursor):
+    resp = api.get(f'/bookmarks/?cursor={cursor}')
+    assert resp.status_code == 422
+
+
+def test_getting_bookmarks_loads_relations_in_bounded_queries(api, user, session,
+                                                             queries):
+    for id_ in range(1, 21):
+        session.add(Bookmark(id=id_, user_id=user.id, tags=[Tag(name=f'tag_{id_}')]))
+        session.add(Vote(bookmark_id=id_, user_id=user.id, direction=True))
+    session.commit()
+    del queries[:]
+    resp = api.get('/bookmarks/?page_size=20')
+    assert len(resp.get_json()) == 20
+    assert all(b['user']['id'] == user.id and b['tags'] and b['votes']
+               for b in resp.get_json())
+    # user token lookup, page, users, tags, votes and the total count
+    assert len(queries) <= 6
+
+
+@pytest.fixture(params=['index', 'like'])
+def search_backend(request, monkeypatch):
+    """Search with the database's index, and with LIKE as on other databases."""
+    if request.param == 'like':
+        monkeypatch.setattr(search_index, 'backend', LikeBackend())
+
+
+@pytest.mark.parametrize('q,expect', [
+    ('flask', ['http://a.com/docs']),
+    ('pyth', ['http://b.com/python', 'http://a.com/docs']),
+    ('docs tutorial', []),
+    ('b.com', ['http://b.com/python']),
+    ('!!', []),
+])
+def test_searching_bookmarks(api, user, search_backend, q, expect):
+    api.post('/bookmarks/', json={'url': 'http://a.com/docs', 'title': 'Flask docs',
+                                  'tags': ['python']})
+    api.post('/bookmarks/', json={'url': 'http://b.com/python',
+                                  'title': 'A tutorial'})
+    resp = api.get('/bookmarks/', query_string={'q': q})
+    assert [b['url'] for b in resp.get_json()] == expect
+
+
+def test_searching_bookmarks_sorted_by_relevance(api, user, search_backend):
+    api.post('/bookmarks/', json={'url': 'http://a.com/python',
+                                  'title': 'Some tutorial'})
+    api.post('/bookmarks/', json={'url': 'http://b.com', 'title': 'Python tutorial',
+                                  'tags': ['python']})
+    resp = api.get('/bookmarks/', query_string={'q': 'python', 'sort': 'relevance'})
+    assert [b['url'] for b in resp.get_json()] == ['http://b.com',
+                                                   'http://a.com/python']
+    assert 'X-Next-Cursor' not in resp.headers
+
+
+def test_searching_with_like_on_databases_without_full_text_search(app):
+    index = SearchIndex()
+    app_ = Flask(__name__)
+    app_.config['SQLALCHEMY_DATABASE_URI'] = 'mysql://localhost/bookmarks'
+    index.init_app(app_, MetaData())
+    assert isinstance(index.backend, LikeBackend)
+
+
+def test_sorting_by_relevance_without_search_query(api, user):
+    resp = api.get('/bookmarks/', query_string={'sort': 'relevance'})
+    assert resp.status_code == 422
+
+
+def test_search_index_follows_bookmark_changes(api, user, session):
+    api.post('/bookmarks/', json={'url': 'http://a.com', 'title': 'Flask docs'})
+    bookmark = Bookmark.query.one()
+    api.put(f'/bookmarks/{bookmark.id}', json={'title': 'Django docs'})
+    assert api.get('/bookmarks/?q=flask').get_json() == []
+    assert len(api.get('/bookmarks/?q=django').get_json()) == 1
+
+    api.delete(f'/bookmarks/{bookmark.id}')
+    assert api.get('/bookmarks/?q=django').get_json() == []
+
+
+def test_rebuilding_search_index(api, user, session):
+    session.add(Bookmark(url='http://a.com', title='Flask docs',
+                         tags=[Tag(name='python')]))
+    session.commit()
+    assert api.get('/bookmarks/?q=python').get_json() == []
+    _rebuild_search_index()
+    assert len(api.get('/bookmarks/?q=python').get_json()) == 1
+
+
 def test_adding_bookmark_with_missing_data(api, user):
     resp = api.post('/bookmarks/', json={})
     assert resp.status_code == 422 and 'errors' in resp.get_json()
@@ -402,3 +568,119 @@ def test_deleting_users_vote(api, user, session):
     resp = api.delete(f'/votes/{vote.id}')
     assert resp.status_code == 204
     assert Vote.query.all() == []
+
+
+def test_tag_counts_follow_bookmark_changes(api, user, session):
+    api.post('/bookmarks/', json={'url': 'http://a.com', 'title': 'a'*10,
+                                  'tags': ['python', 'flask']})
+    api.post('/bookmarks/', json={'url': 'http://b.com', 'title': 'b'*10,
+                                  'tags': ['python']})
+    resp = api.get('/tags/')
+    assert resp.get_json() == [{'name': 'python', 'count': 2},
+                               {'name': 'flask', 'count': 1}]
+
+    bookmark = Bookmark.query.filter_by(url='http://b.com').one()
+    api.put(f'/bookmarks/{bookmark.id}', json={'tags': ['flask']})
+    resp = api.get('/tags/')
+    assert resp.get_json() == [{'name': 'flask', 'count': 2},
+                               {'name': 'python', 'count': 1}]
+
+    api.delete(f'/bookmarks/{bookmark.id}')
+    resp = api.get('/tags/')
+    assert resp.get_json() == [{'name': 'flask', 'count': 1},
+                               {'name': 'python', 'count': 1}]
+
+
+@pytest.mark.parametrize('query,expect', [
+    ('?limit=1', ['b_tag']),
+    ('?prefix=A_', ['a_tag']),
+    ('?prefix=%', []),
+])
+def test_filtering_tags(api, session, query, expect):
+    session.add(Tag(name='a_tag', bookmarks_count=1))
+    session.add(Tag(name='b_tag', bookmarks_count=2))
+    session.commit()
+    resp = api.get('/tags/' + query)
+    assert [tag['name'] for tag in resp.get_json()] == expect
+
+
+def test_rebuilding_tag_counts(session):
+    tag = Tag(name='a_tag', bookmarks_count=5)
+    session.add(Bookmark(tags=[tag]))
+    session.commit()
+    _rebuild_tag_counts()
+    assert tag.bookmarks_count == 1
+
+
+def test_votes_update_bookmark_rating(api, user, session):
+    session.add(Bookmark(id=1))
+    session.commit()
+    rating = lambda: session.query(Bookmark.rating).filter_by(id=1).scalar()
+    api.post('/votes/', json={'direction': 1, 'bookmark_id': 1})
+    assert rating() == 1
+    vote = Vote.query.one()
+    api.put(f'/votes/{vote.id}', json={'direction': -1})
+    assert rating() == -1
+    api.put(f'/votes/{vote.id}', json={'direction': -1})
+    assert rating() == 0
+    api.put(f'/votes/{vote.id}', json={'direction': 1})
+    api.delete(f'/votes/{vote.id}')
+    assert rating() == 0 and Vote.query.all() == []
+
+
+@pytest.mark.parametrize('method', ['post', 'put'])
+def test_tag_queries_do_not_grow_with_the_tags(api, session, queries, method):
+    counts = []
+    for i, size in enumerate((1, 10)):
+        session.add(Tag(name=f'existing{i}', bookmarks_count=0))
+        session.commit()
+        tags = [f'existing{i}'] + [f'tag{i}_{n}' for n in range(size)]
+        del queries[:]
+        if method == 'post':
+            api.post('/bookmarks/', json={'url': f'http://{i}.com', 'title': 'a'*10,
+                                          'tags': tags})
+        else:
+            bookmark = Bookmark(url=f'http://{i}.com', tags=[Tag(name=f'old{i}_{n}')
+                                                              for n in range(size)])
+            session.add(bookmark)
+            session.commit()
+            del queries[:]
+            api.put(f'/bookmarks/{bookmark.id}', json={'tags': tags})
+        counts.append(len(queries))
+    assert counts[0] == counts[1]
+    assert {tag.name for tag in Tag.query} >= {'existing0', 'tag1_9'}
+
+
+def test_updating_bookmark_keeps_its_tags_when_not_given(api, user, session):
+    session.add(Bookmark(id=1, url='http://a.com', tags=[Tag(name='a_tag', bookmarks_count=1)]))
+    session.commit()
+    api.put('/bookmarks/1', json={'title': 'a new title'})
+    assert [tag.name for tag in Bookmark.query.get(1).tags] == ['a_tag']
+
+
+def test_deleting_bookmark_keeps_tags_of_other_bookmarks(api, user, session):
+    shared, own = Tag(name='shared', bookmarks_count=2), Tag(name='own', bookmarks_count=1)
+    session.add(Bookmark(id=1, user_id=user.id, tags=[shared, own]))
+    session.add(Bookmark(id=2, tags=[shared]))
+    session.commit()
+    api.delete('/bookmarks/1')
+    assert [(tag.name, tag.bookmarks_count) for tag in Tag.query] == [('shared', 1)]
+
+
+def test_adding_bookmark_with_tag_deleted_meanwhile(api, user, session, monkeypatch):
+    session.add(Tag(name='python', bookmarks_count=0))
+    session.commit()
+    count_tags = logic._count_tags
+
+    def delete_then_count(tag_ids, delta):
+        # another request releases the tag after it was read
+        monkeypatch.setattr(logic, '_count_tags', count_tags)
+        Tag.query.filter_by(name='python').delete()
+        return count_tags(tag_ids, delta)
+
+    monkeypatch.setattr(logic, '_count_tags', delete_then_count)
+    api.post('/bookmarks/', json={'url': 'http://a.com', 'title': 'a'*10,
+                                  'tags': ['python']})
+    tag = Tag.query.one()
+    assert tag.name == 'python' and tag.bookmarks_count == 1
+    assert Bookmark.query.one().tags == [tag]
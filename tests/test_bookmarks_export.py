@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from bookmarks.importer import parse_netscape
+from bookmarks.logic import _export, _rebuild_search_index
+from bookmarks.models import Bookmark, Tag
+
+
+@pytest.fixture
+def bookmarks(user, session):
+    python, flask = Tag(name='python'), Tag(name='flask')
+    session.add(Bookmark(id=1, url='http://a.com', title='A "quoted" <title>',
+                         user_id=user.id, tags=[python, flask], rating=2,
+                         created_on=datetime(2020, 1, 1)))
+    session.add(Bookmark(id=2, url='http://b.com?x=1&y=2', title=None, user_id=2,
+                         tags=[python], created_on=datetime(2020, 1, 2)))
+    session.commit()
+    _rebuild_search_index()
+
+
+def test_exporting_json_lines(api, bookmarks):
+    resp = api.get('/bookmarks/export')
+    assert resp.mimetype == 'application/x-ndjson'
+    assert 'bookmarks.ndjson' in resp.headers['Content-Disposition']
+    lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert lines == [
+        {'id': 2, 'url': 'http://b.com?x=1&y=2', 'title': None, 'rating': 0,
+         'created_on': '2020-01-02T00:00:00', 'tags': ['python']},
+        {'id': 1, 'url': 'http://a.com', 'title': 'A "quoted" <title>', 'rating': 2,
+         'created_on': '2020-01-01T00:00:00', 'tags': ['flask', 'python']},
+    ]
+
+
+@pytest.mark.parametrize('query,expect', [
+    ('user_id=1', [1]),
+    ('tag=flask', [1]),
+    ('sort=-rating', [2, 1]),
+    ('q=quoted&sort=relevance', [1]),
+])
+def test_exporting_filtered_bookmarks(api, bookmarks, query, expect):
+    resp = api.get(f'/bookmarks/export?{query}')
+    lines = resp.get_data(as_text=True).splitlines()
+    assert [json.loads(line)['id'] for line in lines] == expect
+
+
+def test_exporting_csv(api, bookmarks):
+    resp = api.get('/bookmarks/export?format=csv')
+    assert resp.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+    assert [row['id'] for row in rows] == ['2', '1']
+    assert rows[1]['title'] == 'A "quoted" <title>' and rows[1]['tags'] == 'flask,python'
+
+
+def test_exported_bookmarks_file_can_be_imported(api, bookmarks):
+    resp = api.get('/bookmarks/export?format=html')
+    records = list(parse_netscape([resp.get_data()]))
+    assert [(r['url'], r['title'], r['tags']) for r in records] == [
+        ('http://b.com?x=1&y=2', 'http://b.com?x=1&y=2', ['python']),
+        ('http://a.com', 'A "quoted" <title>', ['flask', 'python']),
+    ]
+
+
+def test_exporting_reads_bookmarks_in_chunks(user, session, queries):
+    session.add_all(Bookmark(url=f'http://{i}.com', tags=[Tag(name=f'tag{i}')])
+                    for i in range(10))
+    session.commit()
+    del queries[:]
+    chunks = list(_export({'sort': 'date'}, chunk_size=4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert all(len(bookmark['tags']) == 1 for chunk in chunks for bookmark in chunk)
+    assert len(queries) == 4  # bookmarks, then the tags of each chunk
@@ -0,0 +1,109 @@
+import json
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from bookmarks.importer import parse_netscape, parse_json_lines
+from bookmarks.models import Bookmark, Tag
+
+NETSCAPE = b"""<!DOCTYPE NETSCAPE-Bookmark-file-1>
+<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">
+<TITLE>Bookmarks</TITLE>
+<H1>Bookmarks</H1>
+<DL><p>
+    <DT><H3>Dev</H3>
+    <DL><p>
+        <DT><A HREF="https://flask.palletsprojects.com/" ADD_DATE="1" TAGS="python,Flask">Flask
+            docs</A>
+        <DT><A HREF="https://www.python.org/">Python &amp; friends \xe2\x9c\x93</A>
+    </DL><p>
+    <DT><A HREF="javascript:void(0)">Bookmarklet</A>
+</DL><p>
+"""
+
+
+def test_parsing_netscape_bookmarks_split_in_chunks():
+    chunks = [NETSCAPE[i:i + 7] for i in range(0, len(NETSCAPE), 7)]
+    records = list(parse_netscape(chunks))
+    assert records == [
+        {'url': 'https://flask.palletsprojects.com/', 'title': 'Flask docs',
+         'tags': ['python', 'Flask'], '_line': 8},
+        {'url': 'https://www.python.org/', 'title': 'Python & friends ✓',
+         '_line': 10},
+        {'url': 'javascript:void(0)', 'title': 'Bookmarklet', '_line': 12},
+    ]
+
+
+def test_parsing_json_lines():
+    lines = [b'{"url": "http://a.com"}\n', b'\n', b'[1]\n', b'{"url\n']
+    assert list(parse_json_lines(lines)) == [
+        {'url': 'http://a.com', '_line': 1},
+        {'_error': 'Not a JSON object', '_line': 3},
+        {'_error': 'Not a JSON object', '_line': 4},
+    ]
+
+
+def test_importing_netscape_bookmarks(api, session):
+    resp = api.post('/bookmarks/import', data=NETSCAPE, content_type='text/html')
+    assert resp.status_code == 200
+    result = resp.get_json()
+    assert (result['added'], result['duplicates'], result['invalid']) == (2, 0, 1)
+    assert result['errors'][0]['line'] == 12
+    assert 'url' in result['errors'][0]['errors']
+
+    flask = Bookmark.query.filter_by(url='https://flask.palletsprojects.com/').one()
+    assert flask.title == 'Flask docs' and flask.user_id == 1
+    assert sorted(tag.name for tag in flask.tags) == ['flask', 'python']
+    python = Bookmark.query.filter_by(url='https://www.python.org/').one()
+    assert [tag.name for tag in python.tags] == ['uncategorized']
+    assert api.get('/bookmarks/?q=friends').get_json()[0]['id'] == python.id
+
+
+def test_importing_json_lines_in_batches(app, api, session, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMPORT_BATCH_SIZE', 2)
+    session.add(Bookmark(url='http://b.com', tags=[Tag(name='old', bookmarks_count=1)]))
+    session.commit()
+    lines = [{'url': 'http://a.com', 'title': 'A', 'tags': ['old', 'new']},
+             {'url': 'http://b.com', 'title': 'B'},
+             {'url': 'http://c.com', 'tags': ['new']},
+             {'url': 'http://a.com', 'title': 'A again'},
+             {'url': 'not a url'}]
+    body = '\n'.join(json.dumps(line) for line in lines)
+    resp = api.post('/bookmarks/import', data=body, content_type='application/x-ndjson')
+    result = resp.get_json()
+    assert (result['added'], result['duplicates'], result['invalid']) == (2, 2, 1)
+    assert result['errors'] == [{'line': 5, 'errors': {'url': ['Not a valid URL.']}}]
+    assert {tag.name: tag.bookmarks_count for tag in Tag.query} == {'old': 2, 'new': 2}
+    assert Bookmark.query.filter_by(url='http://a.com').one().title == 'A'
+
+
+def test_importing_counts_truncated_titles(api, session):
+    lines = [{'url': 'http://a.com', 'title': 'A' * 60}, {'url': 'http://b.com'}]
+    body = '\n'.join(json.dumps(line) for line in lines)
+    resp = api.post('/bookmarks/import', data=body, content_type='application/x-ndjson')
+    assert (resp.get_json()['added'], resp.get_json()['truncated']) == (2, 1)
+    assert Bookmark.query.filter_by(url='http://a.com').one().title == 'A' * 50
+
+
+def test_importing_batches_conflicting_again_fails_them(api, monkeypatch):
+    def import_batch(records):
+        raise IntegrityError('INSERT', {}, Exception())
+
+    monkeypatch.setattr('bookmarks.logic._import_batch', import_batch)
+    body = json.dumps({'url': 'http://a.com'})
+    resp = api.post('/bookmarks/import', data=body, content_type='application/x-ndjson')
+    assert resp.status_code == 200
+    assert (resp.get_json()['added'], resp.get_json()['failed']) == (0, 1)
+
+
+def test_importing_runs_a_bounded_number_of_queries(api, session, queries):
+    body = '\n'.join(json.dumps({'url': f'http://{i}.com', 'tags': [f'tag{i}']})
+                     for i in range(200))
+    api.post('/bookmarks/import', data=body, content_type='application/x-ndjson')
+    assert Bookmark.query.count() == 200
+    assert len(queries) < 15
+
+
+def test_importing_unknown_format(api):
+    resp = api.post('/bookmarks/import', data='url', content_type='text/plain')
+    assert resp.status_code == 415
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from bookmarks.logic import _trim_timelines
+from bookmarks.models import Bookmark, timelines
+from bookmarks.tasks import schedule_periodic_tasks
+from bookmarks.users.models import User
+
+
+@pytest.fixture
+def authors(session):
+    """Add two users to subscribe to, returning their authorization headers."""
+    headers = []
+    for id_ in (2, 3):
+        author = User(id=id_, username=f'author{id_}', email=f'author{id_}@flask.com',
+                      password='123123', active=True)
+        author.auth_token = author.generate_auth_token()
+        session.add(author)
+        headers.append({'Authorization': f'Bearer {author.auth_token}'})
+    session.commit()
+    return headers
+
+
+def post(api, headers, url):
+    resp = api.post('/bookmarks/', json={'url': url, 'title': 'a title of a page'},
+                    headers=headers)
+    assert resp.status_code == 201
+
+
+def feed_urls(api, **kwargs):
+    resp = api.get('/bookmarks/feed', **kwargs)
+    assert resp.status_code == 200
+    return [bookmark['url'] for bookmark in resp.get_json()]
+
+
+def test_feed_has_the_bookmarks_of_users_subscribed_to(api, authors):
+    post(api, authors[0], 'http://old.com')
+    api.post('/subscriptions/', json={'user_id': 2})
+    post(api, authors[0], 'http://a.com')
+    post(api, authors[1], 'http://b.com')
+    post(api, {}, 'http://mine.com')
+    assert feed_urls(api) == ['http://a.com', 'http://old.com']
+
+    api.post('/subscriptions/', json={'user_id': 3})
+    post(api, authors[1], 'http://c.com')
+    assert feed_urls(api) == ['http://c.com', 'http://b.com', 'http://a.com',
+                              'http://old.com']
+
+    api.delete('/bookmarks/2', headers=authors[0])
+    api.delete('/subscriptions/3')
+    assert feed_urls(api) == ['http://old.com']
+
+
+def test_feed_is_paginated_by_cursor(api, authors):
+    api.post('/subscriptions/', json={'user_id': 2})
+    for number in range(5):
+        post(api, authors[0], f'http://{number}.com')
+
+    resp = api.get('/bookmarks/feed?page_size=2&count=false')
+    urls = [bookmark['url'] for bookmark in resp.get_json()]
+    while 'X-Next-Cursor' in resp.headers:
+        resp = api.get('/bookmarks/feed?page_size=2&cursor=' +
+                       resp.headers['X-Next-Cursor'])
+        urls += [bookmark['url'] for bookmark in resp.get_json()]
+    assert urls == [f'http://{number}.com' for number in reversed(range(5))]
+
+
+def test_bookmarks_of_popular_users_are_pulled(app, api, authors, session, monkeypatch):
+    monkeypatch.setitem(app.config, 'FEED_FANOUT_LIMIT', 0)
+    post(api, authors[0], 'http://a.com')
+    api.post('/subscriptions/', json={'user_id': 2})
+    post(api, authors[0], 'http://b.com')
+    assert session.query(timelines).filter_by(bookmark_id=2).count() == 0
+
+    assert feed_urls(api) == ['http://b.com', 'http://a.com']
+    post(api, authors[0], 'http://c.com')
+    assert feed_urls(api) == ['http://c.com', 'http://b.com', 'http://a.com']
+
+
+def test_trimming_timelines(app, api, user, authors, session, monkeypatch):
+    api.post('/subscriptions/', json={'user_id': 2})
+    now = datetime.utcnow()
+    for number in range(5):
+        bookmark = Bookmark(url=f'http://{number}.com', user_id=2,
+                            created_on=now + timedelta(minutes=number))
+        session.add(bookmark)
+        session.flush()
+        session.execute(timelines.insert().values(
+            user_id=user.id, bookmark_id=bookmark.id, author_id=2,
+            created_on=bookmark.created_on))
+    session.commit()
+    monkeypatch.setitem(app.config, 'FEED_LENGTH', 3)
+    _trim_timelines()
+    assert feed_urls(api) == ['http://4.com', 'http://3.com', 'http://2.com']
+
+
+def test_trim_interval_is_read_from_the_config(monkeypatch):
+    import config
+    monkeypatch.setattr(config.Testing, 'TIMELINE_TRIM_INTERVAL', 42)
+    intervals = {}
+
+    class Sender:
+        def add_periodic_task(self, interval, signature, name):
+            intervals[name] = interval
+
+    schedule_periodic_tasks(Sender())
+    assert intervals['trim timelines'] == 42
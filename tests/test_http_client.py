@@ -0,0 +1,37 @@
+import pytest
+
+from bookmarks import http_client
+from bookmarks.http_client import HostBusy, ResponseTooLarge
+
+
+def test_reading_response(serve_page):
+    serve_page(b'{"success": true}')
+    assert http_client.post('https://test.com/verify').json() == {'success': True}
+
+
+def test_refusing_large_response(serve_page, monkeypatch):
+    monkeypatch.setattr(http_client, 'max_body', 10)
+    serve_page(b'a' * 11)
+    with pytest.raises(ResponseTooLarge):
+        http_client.get('https://test.com')
+
+
+def test_capping_concurrent_requests_per_host(serve_page, monkeypatch):
+    monkeypatch.setattr(http_client, 'max_per_host', 1)
+    monkeypatch.setattr(http_client, 'timeout', (0.01, 0.01))
+    monkeypatch.setattr(http_client, '_slots', {})
+    serve_page(b'')
+    with http_client.stream('GET', 'https://test.com/a'):
+        with pytest.raises(HostBusy):
+            http_client.get('https://test.com/b')
+        http_client.get('https://other.com')
+
+
+def test_counting_requests_and_failures(serve_page, monkeypatch):
+    monkeypatch.setattr(http_client, '_metrics', {})
+    serve_page(b'')
+    http_client.get('https://test.com')
+    serve_page(b'', status_code=500)
+    http_client.get('https://test.com')
+    stats = http_client.stats['test.com']
+    assert stats['requests'] == 2 and stats['failures'] == 1
@@ -0,0 +1,103 @@
+import re
+
+import pytest
+from sqlalchemy import event
+
+from bookmarks.models import Bookmark, Tag, Vote, Favourite
+from bookmarks.users.models import User
+
+# a table read from start to end, without the help of an index
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?(?P<table>\w+)( AS \w+)?$')
+
+
+@pytest.fixture
+def plans(db, session):
+    """Return a function listing the full scans of the queries run by a request."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, *args):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    def full_scans(request):
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            request()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        cursor = session.connection().connection.cursor()
+        scans = []
+        for statement, parameters in statements:
+            cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+            for row in cursor.fetchall():
+                match = FULL_SCAN.match(row[-1])
+                if match:
+                    scans.append((match.group('table'), statement))
+        return scans
+    return full_scans
+
+
+@pytest.fixture
+def populated(user, session):
+    tag = Tag(name='python', bookmarks_count=1)
+    other = User(id=2, username='other', email='other@flask.com', password='123123')
+    bookmark = Bookmark(url='http://a.com', title='a', user_id=user.id, tags=[tag])
+    session.add_all([tag, other, bookmark])
+    session.flush()
+    session.add(Vote(user_id=user.id, bookmark_id=bookmark.id, direction=True))
+    session.add(Favourite(user_id=user.id, bookmark_id=bookmark.id))
+    user.subscribe(other)
+    session.commit()
+
+
+@pytest.mark.parametrize('path', [
+    '/bookmarks/',
+    '/bookmarks/?sort=-date',
+    '/bookmarks/?sort=rating',
+    '/bookmarks/?sort=-rating',
+    '/bookmarks/?sort=hot',
+    '/bookmarks/?sort=trending',
+    '/bookmarks/?user_id=1',
+    '/bookmarks/?tag=python&tag=flask',
+    '/bookmarks/?tag=python&tag=flask&tag_mode=any',
+    '/bookmarks/?q=python&sort=relevance',
+    '/bookmarks/feed',
+    '/bookmarks/1',
+    '/votes/',
+    '/favourites/',
+    '/tags/',
+    '/users/',
+    '/users/?expand=bookmarks&expand=favourites&expand=votes'
+    '&expand=subscribers&expand=subscribed',
+    '/users/me',
+    '/users/1',
+])
+def test_hot_queries_use_indexes(api, populated, plans, path):
+    scans = plans(lambda: api.get(path))
+    assert scans == []
+
+
+@pytest.mark.parametrize('sort', ['date', '-date', 'rating', '-rating', 'hot', 'trending'])
+def test_pages_reached_by_cursor_seek_the_index(api, user, session, db, sort):
+    session.add_all([Bookmark(url=f'http://{i}.com', title='a', user_id=user.id, rating=i)
+                     for i in range(3)])
+    session.commit()
+    cursor = api.get(f'/bookmarks/?sort={sort}&page_size=1').headers['X-Next-Cursor']
+    pages = []
+
+    def record(conn, cursor_, statement, parameters, *args):
+        if 'LIMIT' in statement and 'FROM bookmarks' in statement:
+            pages.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        resp = api.get(f'/bookmarks/?sort={sort}&page_size=1&cursor={cursor}')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert resp.status_code == 200 and len(resp.get_json()) == 1
+    statement, parameters = pages[0]
+    plan = session.connection().connection.cursor().execute(
+        'EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    details = [row[-1] for row in plan]
+    assert any(detail.startswith('SEARCH bookmarks') for detail in details), details
+    assert not any(detail.startswith('SCAN bookmarks') for detail in details), details
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from bookmarks import ranking
+from bookmarks.logic import _rescore_trending
+from bookmarks.models import Bookmark
+from bookmarks.tasks import schedule_periodic_tasks
+
+NOW = datetime(2026, 1, 1)
+
+
+def test_hot_score_weighs_ten_times_the_rating_as_much_as_hours_of_age():
+    older = ranking.hot_score(10, NOW - timedelta(seconds=ranking.HOT_DECAY))
+    assert older == pytest.approx(ranking.hot_score(1, NOW))
+    assert ranking.hot_score(-10, NOW) < ranking.hot_score(0, NOW) < ranking.hot_score(2, NOW)
+
+
+def test_trending_score_falls_with_age():
+    scores = [ranking.trending_score(10, NOW - timedelta(hours=hours), NOW)
+              for hours in (0, 1, 24, 24 * 7)]
+    assert scores == sorted(scores, reverse=True)
+    assert ranking.trending_score(10, NOW + timedelta(minutes=1), NOW) == scores[0]
+
+
+def test_new_bookmarks_and_votes_update_scores(api, session):
+    api.post('/bookmarks/', json={'url': 'http://a.com', 'title': 'a'*10})
+    api.post('/bookmarks/', json={'url': 'http://b.com', 'title': 'b'*10})
+    older, newer = Bookmark.query.order_by(Bookmark.id)
+    assert 0 < older.hot_score <= newer.hot_score
+    assert [b['url'] for b in api.get('/bookmarks/?sort=hot').get_json()] == \
+        ['http://b.com', 'http://a.com']
+
+    score = older.hot_score
+    api.post('/votes/', json={'direction': 1, 'bookmark_id': older.id})
+    api.post('/votes/', json={'direction': 1, 'bookmark_id': newer.id})
+    session.refresh(older)
+    assert older.hot_score == score and older.trending_score > 0
+
+    api.put('/votes/1', json={'direction': 1})  # takes back the vote of a.com
+    api.put('/votes/1', json={'direction': -1})
+    resp = api.get('/bookmarks/?sort=trending')
+    assert [b['url'] for b in resp.get_json()] == ['http://b.com', 'http://a.com']
+
+
+def test_rescoring_trending_bookmarks(session):
+    now = datetime.utcnow()
+    old = Bookmark(url='http://a.com', rating=5, trending_score=1,
+                   created_on=now - timedelta(days=30))
+    recent = Bookmark(url='http://b.com', rating=5, trending_score=1,
+                      created_on=now - timedelta(hours=10))
+    session.add_all([old, recent])
+    session.commit()
+    _rescore_trending()
+    assert old.trending_score == 0
+    assert recent.trending_score == pytest.approx(5 / 12 ** ranking.GRAVITY, rel=1e-3)
+
+
+class Sender:
+
+    def __init__(self):
+        self.intervals = {}
+
+    def add_periodic_task(self, interval, signature, name):
+        self.intervals[name] = interval
+
+
+def test_trending_rescore_interval_is_read_from_the_config(monkeypatch):
+    import config
+    monkeypatch.setattr(config.Testing, 'TRENDING_RESCORE_INTERVAL', 42)
+    sender = Sender()
+    schedule_periodic_tasks(sender)
+    assert sender.intervals['rescore trending'] == 42
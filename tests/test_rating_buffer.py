@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+
+import pytest
+
+from bookmarks import rating_buffer, response_cache
+from bookmarks.models import Bookmark, Vote
+
+
+@pytest.fixture
+def buffered(monkeypatch):
+    """Buffer ratings until three votes are pending, without a timer."""
+    monkeypatch.setattr(rating_buffer, 'enabled', True)
+    monkeypatch.setattr(rating_buffer, 'interval', 0)
+    monkeypatch.setattr(rating_buffer, 'size', 3)
+    yield rating_buffer
+    rating_buffer.clear()
+
+
+def stored_rating(session, bookmark_id):
+    return session.query(Bookmark.rating).filter_by(id=bookmark_id).scalar()
+
+
+def test_votes_are_recorded_and_ratings_buffered(api, session, buffered):
+    session.add(Bookmark(id=1))
+    session.commit()
+    resp = api.post('/votes/', json={'direction': 1, 'bookmark_id': 1})
+    assert resp.status_code == 201 and Vote.query.one().direction is True
+    assert stored_rating(session, 1) == 0
+    assert api.get('/bookmarks/1').get_json()['rating'] == 1
+
+    vote = Vote.query.one()
+    api.put(f'/votes/{vote.id}', json={'direction': -1})
+    assert stored_rating(session, 1) == 0
+    assert api.get('/bookmarks/1').get_json()['rating'] == -1
+
+
+def test_ratings_are_written_once_enough_votes_are_pending(api, session, buffered):
+    session.add(Bookmark(id=1))
+    session.commit()
+    api.post('/votes/', json={'direction': 1, 'bookmark_id': 1})
+    vote = Vote.query.one()
+    api.put(f'/votes/{vote.id}', json={'direction': 1})
+    api.put(f'/votes/{vote.id}', json={'direction': -1})
+    assert stored_rating(session, 1) == -1
+    assert buffered.pending(1) == 0
+    assert api.get('/bookmarks/1').get_json()['rating'] == -1
+
+
+def test_voting_for_missing_bookmark_buffers_nothing(api, buffered):
+    resp = api.post('/votes/', json={'direction': 1, 'bookmark_id': 1})
+    assert resp.status_code == 404 and buffered.pending(1) == 0
+
+
+def test_failed_write_keeps_pending_ratings(app, buffered):
+    class BrokenSession:
+        def execute(self, *args):
+            raise RuntimeError('database is locked')
+
+        def rollback(self):
+            pass
+
+    buffered.add(1, 2)
+    assert buffered.flush(BrokenSession()) is False
+    assert buffered.pending(1) == 2
+
+
+def test_ratings_being_written_are_pending_until_committed(app, buffered, monkeypatch):
+    monkeypatch.setattr('bookmarks.ratings.rescore', lambda session, ids: None)
+
+    class Session:
+        pending = []
+
+        def execute(self, *args):
+            self.pending.append(buffered.pending(1))
+
+        def commit(self):
+            self.pending.append(buffered.pending(1))
+
+    buffered.add(1, 2)
+    assert buffered.flush(Session()) is True
+    assert Session.pending == [2, 2] and buffered.pending(1) == 0
+
+
+def test_writing_in_the_background_invalidates_cached_responses(app, session, buffered,
+                                                               monkeypatch):
+    invalidated = []
+    monkeypatch.setattr(response_cache, 'invalidate', lambda: invalidated.append(True))
+    monkeypatch.setattr(buffered, '_db', SimpleNamespace(session=session))
+    session.add(Bookmark(id=1))
+    session.commit()
+    buffered.add(1, 1)
+    buffered._flush_in_background()
+    assert stored_rating(session, 1) == 1 and invalidated == [True]
+
+
+def test_first_pending_rating_schedules_a_write(app, buffered, monkeypatch):
+    timers = []
+
+    class FakeTimer:
+        def __init__(self, interval, function):
+            timers.append(interval)
+
+        def start(self):
+            pass
+
+        def cancel(self):
+            pass
+
+    monkeypatch.setattr('bookmarks.ratings.Timer', FakeTimer)
+    monkeypatch.setattr(buffered, 'interval', 5)
+    buffered.add(1, 1)
+    buffered.add(1, 1)
+    assert timers == [5]
@@ -0,0 +1,60 @@
+from bookmarks import response_cache
+from bookmarks.cache import LocalBackend, LRUCache
+from bookmarks.models import Bookmark, Tag
+
+
+def test_anonymous_responses_are_cached(app, session):
+    session.add(Tag(name='a_tag', bookmarks_count=1))
+    session.commit()
+    client = app.test_client()
+    first = client.get('/api/v1/tags/')
+    session.add(Tag(name='b_tag', bookmarks_count=1))  # not through logic
+    session.commit()
+    second = client.get('/api/v1/tags/')
+    assert first.get_json() == second.get_json()
+    assert response_cache.stats['hits'] == 1
+    assert response_cache.stats['misses'] == 1
+
+
+def test_authenticated_responses_are_not_cached(api, session):
+    api.get('/tags/')
+    api.get('/tags/')
+    assert response_cache.stats['hits'] == response_cache.stats['misses'] == 0
+
+
+def test_arguments_are_normalized(app, session):
+    client = app.test_client()
+    client.get('/api/v1/bookmarks/?tag=a&tag=b')
+    client.get('/api/v1/bookmarks/?sort=date&tag=a&tag=b')
+    assert response_cache.stats['hits'] == 1
+
+
+def test_writes_invalidate_cached_responses(app, api, session):
+    client = app.test_client()
+    client.get('/api/v1/bookmarks/')
+    api.post('/bookmarks/', json={'url': 'http://test.com', 'title': 'a'*10})
+    resp = client.get('/api/v1/bookmarks/')
+    assert len(resp.get_json()) == 1
+    assert response_cache.stats['hits'] == 0
+
+
+def test_responses_are_shared_through_the_backend(app, session, monkeypatch):
+    monkeypatch.setattr(response_cache, 'backend', LocalBackend())
+    session.add(Bookmark(id=1))
+    session.commit()
+    client = app.test_client()
+    client.get('/api/v1/bookmarks/1')
+    response_cache._local.clear()  # as if served by another worker
+    resp = client.get('/api/v1/bookmarks/1')
+    assert resp.get_json()['id'] == 1
+    assert response_cache.stats['hits'] == 1
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None and cache.get('a') == 1
+    assert cache.evictions == 1
@@ -0,0 +1,117 @@
+import pytest
+import requests
+
+from datetime import datetime, timedelta
+
+from bookmarks.models import Page
+from bookmarks.scraper import parse_head, get_metadata, canonical_url
+
+
+HTML = b'''<html><head>
+<title>
+  A   page &amp; its title </title>
+<meta property="og:image" content="http://img.com/og.png">
+<img src="/static/logo.png">
+<link rel="icon" href="favicon.ico">
+</head><body><title>not this</title>''' + b'x' * 10000 + b'</body></html>'
+
+
+def test_parsing_head():
+    metadata = parse_head([HTML], 'http://test.com/page/')
+    assert metadata == {'title': 'A page & its title',
+                        'og_image': 'http://img.com/og.png',
+                        'logo': 'http://test.com/static/logo.png',
+                        'favicon': 'http://test.com/page/favicon.ico'}
+
+
+def test_parsing_stops_after_head(serve_page):
+    response = serve_page(HTML)
+    parse_head(response.iter_content(chunk_size=10), 'http://test.com')
+    assert response.raw.bytes_read < 300
+
+
+def test_parsing_stops_at_byte_cap(serve_page):
+    response = serve_page(b'<html><title>' + b'a' * 1000)
+    metadata = parse_head(response.iter_content(chunk_size=10), 'http://test.com',
+                          max_bytes=100)
+    assert response.raw.bytes_read == 100 and metadata['title'] == 'a' * 87
+
+
+def test_logo_and_favicon_only_in_head():
+    metadata = parse_head([b'<body><img src="logo.png"><link href="favicon.ico">'],
+                          'http://test.com')
+    assert metadata['logo'] is None and metadata['favicon'] is None
+
+
+@pytest.mark.parametrize('chunks,encoding', [
+    (['<meta charset="iso-8859-7"><title>Καλημέρα</title>'.encode('iso-8859-7')], None),
+    (['<title>Καλημέρα</title>'.encode('utf-8')], None),
+    ([b'<title>\xce\x9a', b'\xce\xb1\xce\xbb\xce\xb7\xce\xbc\xce\xad\xcf\x81\xce\xb1</title>'],
+     'utf-8'),  # multibyte character split across chunks
+])
+def test_decoding_title(chunks, encoding):
+    assert parse_head(chunks, 'http://test.com', encoding)['title'] == 'Καλημέρα'
+
+
+def test_fetching_metadata_of_missing_page(session, serve_page):
+    serve_page(b'', status_code=404)
+    assert get_metadata('http://test.com') is None
+
+
+@pytest.mark.parametrize('url,expect', [
+    ('HTTP://Test.com', 'http://test.com/'),
+    ('https://test.com:443/a?b=1&a=2#top', 'https://test.com/a?a=2&b=1'),
+    ('http://test.com:8080/?utm_source=x&id=1', 'http://test.com:8080/?id=1'),
+    ('http://Test.com:99999', 'http://test.com:99999/'),
+])
+def test_canonical_url(url, expect):
+    assert canonical_url(url) == expect
+
+
+def test_metadata_is_fetched_once_per_ttl(session, serve_page, monkeypatch):
+    requests_ = []
+    response = serve_page(HTML)
+    monkeypatch.setattr('requests.Session.request',
+                        lambda *args, **kwargs: requests_.append(kwargs) or response)
+    get_metadata('http://test.com/?utm_source=x')
+    assert get_metadata('http://TEST.com')['title'] == 'A page & its title'
+    assert len(requests_) == 1
+
+
+def test_expired_metadata_is_revalidated(session, serve_page, monkeypatch):
+    session.add(Page(url='http://test.com/', status_code=200, title='cached',
+                     etag='"v1"', fetched_on=datetime.utcnow() - timedelta(days=1)))
+    session.commit()
+    requests_ = []
+    response = serve_page(b'', status_code=304)
+    monkeypatch.setattr('requests.Session.request',
+                        lambda *args, **kwargs: requests_.append(kwargs) or response)
+    assert get_metadata('http://test.com')['title'] == 'cached'
+    assert requests_[0]['headers'] == {'If-None-Match': '"v1"'}
+    assert Page.query.one().fetched_on > datetime.utcnow() - timedelta(minutes=1)
+
+
+def test_least_recently_used_pages_are_pruned(app, session, serve_page, monkeypatch):
+    monkeypatch.setitem(app.config, 'PAGE_CACHE_SIZE', 2)
+    now = datetime.utcnow()
+    for minutes, url in enumerate(['http://a.com/', 'http://b.com/']):
+        session.add(Page(url=url, status_code=200, fetched_on=now,
+                         used_on=now - timedelta(minutes=minutes)))
+    session.commit()
+    serve_page(HTML)
+    get_metadata('http://c.com')
+    assert sorted(page.url for page in Page.query) == ['http://a.com/', 'http://c.com/']
+
+
+def test_suggesting_title(api, serve_page):
+    serve_page(HTML)
+    resp = api.post('/suggest-title', json={'url': 'http://test.com'})
+    assert resp.get_json() == {'title': 'A page & its title'}
+
+
+def test_fetching_metadata_of_url_with_port_out_of_range(session, monkeypatch):
+    def request(*args, **kwargs):
+        raise requests.exceptions.InvalidURL('port out of range')
+    monkeypatch.setattr('requests.Session.request', request)
+    with pytest.raises(OSError):  # as every failed request, not a ValueError
+        get_metadata('http://test.com:99999/')
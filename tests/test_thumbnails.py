@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+from kombu.exceptions import OperationalError
+import pytest
+import requests
+
+from bookmarks.models import Bookmark
+from bookmarks.tasks import fetch_thumbnail_task
+from bookmarks.views.utils import queue_thumbnail, queue_thumbnails
+
+
+@pytest.fixture
+def cloudinary(app, monkeypatch):
+    """Configure cloudinary and patch the upload."""
+    for key in ('CLOUDINARY_SECRET_KEY', 'CLOUDINARY_API_KEY', 'CLOUDINARY_CLOUD_NAME'):
+        monkeypatch.setitem(app.config, key, 'a')
+    monkeypatch.setattr('bookmarks.views.utils._upload_img',
+                        lambda img_url: 'https://img.com/' + img_url)
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    """Record the bookmark ids sent to the thumbnails queue."""
+    ids = []
+    monkeypatch.setattr(fetch_thumbnail_task, 'delay', ids.append)
+    return ids
+
+
+def test_queueing_without_configuration(session, queued):
+    bookmark = Bookmark(url='http://test.com')
+    session.add(bookmark)
+    session.commit()
+    assert not queue_thumbnail(bookmark)
+    assert bookmark.image_status is None and queued == []
+
+
+def test_queueing_pending_bookmark_once(session, cloudinary, queued):
+    bookmark = Bookmark(url='http://test.com')
+    session.add(bookmark)
+    session.commit()
+    assert queue_thumbnail(bookmark)
+    assert not queue_thumbnail(bookmark)
+    assert bookmark.image_status == 'pending' and queued == [bookmark.id]
+
+
+def test_queueing_again_when_pending_for_long_or_url_changed(session, cloudinary, queued):
+    bookmark = Bookmark(url='http://test.com', image_status='pending',
+                        image_queued_on=datetime.utcnow() - timedelta(days=1))
+    session.add(bookmark)
+    session.commit()
+    assert queue_thumbnail(bookmark)
+    assert not queue_thumbnail(bookmark)
+    assert queue_thumbnail(bookmark, url_changed=True)
+    assert queued == [bookmark.id, bookmark.id]
+
+
+def test_queueing_leaves_bookmarks_pending_when_broker_is_down(session, cloudinary,
+                                                               monkeypatch):
+    def delay(bookmark_id):
+        raise OperationalError()
+
+    monkeypatch.setattr(fetch_thumbnail_task, 'delay', delay)
+    bookmarks = [Bookmark(url='http://test.com'), Bookmark(url='http://other.com')]
+    session.add_all(bookmarks)
+    session.commit()
+    assert not queue_thumbnail(bookmarks[0])
+    assert not queue_thumbnails([bookmarks[1].id])
+    session.refresh(bookmarks[1])
+    assert all(bookmark.image_status == 'pending' for bookmark in bookmarks)
+
+
+@pytest.mark.parametrize('html,image,status', [
+    (b'<meta property="og:image" content="a.png">', 'https://img.com/a.png', 'ready'),
+    (b'<p>no image</p>', None, 'missing'),
+])
+def test_fetching_thumbnail(session, cloudinary, serve_page, html, image, status):
+    serve_page(html)
+    bookmark = Bookmark(url='http://test.com', image_status='pending')
+    session.add(bookmark)
+    session.commit()
+    fetch_thumbnail_task.apply(args=[bookmark.id])
+    assert bookmark.image == image and bookmark.image_status == status
+
+
+def test_fetching_thumbnail_gives_up_after_retries(session, cloudinary, monkeypatch):
+    calls = []
+
+    def get(*args, **kwargs):
+        calls.append(args)
+        raise requests.ConnectionError()
+
+    monkeypatch.setattr('requests.Session.request', get)
+    bookmark = Bookmark(url='http://test.com', image_status='pending')
+    session.add(bookmark)
+    session.commit()
+    fetch_thumbnail_task.apply(args=[bookmark.id])
+    assert len(calls) == fetch_thumbnail_task.max_retries + 1
+    assert bookmark.image_status == 'failed'
+
+
+def test_fetching_thumbnail_fails_on_any_error(monkeypatch):
+    failed = []
+
+    def fetch_thumbnail(bookmark_id):
+        raise ValueError()
+
+    monkeypatch.setattr('bookmarks.views.utils.fetch_thumbnail', fetch_thumbnail)
+    monkeypatch.setattr('bookmarks.views.utils.mark_thumbnail_failed', failed.append)
+    fetch_thumbnail_task.apply(args=[1])
+    assert failed == [1]
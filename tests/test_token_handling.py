@@ -1,9 +1,13 @@
+from base64 import b64encode
 import time
 
 from flask import current_app
 from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
 import pytest
 
+from bookmarks.users.models import User
+from bookmarks.users.tokens import TokenCache, TokenRevocations
+
 
 def test_creating_token_includes_user_id(app, user):
     with app.app_context():
@@ -27,3 +31,120 @@ def test_expired_token(app, user):
     time.sleep(1)
     with app.app_context():
         assert user.verify_auth_token(token) == {}
+
+
+def test_cached_token_does_not_query_users(api, user, queries):
+    api.get('/votes/')
+    del queries[:]
+    resp = api.get('/votes/')
+    assert resp.status_code == 200
+    assert not any('FROM users' in statement for statement in queries)
+
+
+def test_changed_token_is_not_accepted_from_cache(api, user):
+    assert api.get('/users/me').status_code == 200
+    assert api.get('/auth/logout').status_code == 204
+    assert api.get('/users/me').status_code == 401
+
+
+def test_cached_token_reads_counters_from_the_row(api, user, session):
+    assert api.get('/users/me').get_json()['subscribers_count'] == 0
+    subscriber = User(username='subscriber', email='subscriber@flask.com', active=True)
+    session.add(subscriber)
+    session.commit()
+    subscriber.subscribe(user)
+    session.commit()
+    assert api.get('/users/me').get_json()['subscribers_count'] == 1
+
+
+def test_token_cache_does_not_outlive_the_token(user):
+    cache = TokenCache(ttl=60)
+    cache.set('a', user, expires_at=time.time() - 1)
+    assert cache.get('a') is None
+    cache.set('b', user, expires_at=time.time() + 60)
+    assert cache.get('b').id == user.id
+
+
+def test_token_cache_is_bounded(user):
+    cache = TokenCache(maxsize=1)
+    cache.set('a', user)
+    cache.set('b', user)
+    assert cache.get('a') is None and cache.get('b').id == user.id
+    cache.invalidate(user.id)
+    assert cache.get('b') is None
+
+
+@pytest.fixture
+def stateless(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'STATELESS_TOKENS', True)
+
+
+def request_tokens(api, user):
+    basic = b64encode(f'{user.email}:123123'.encode('ascii')).decode('ascii')
+    resp = api.post('/auth/request-token', headers={'Authorization': 'Basic ' + basic})
+    assert resp.status_code == 200
+    return resp.get_json()
+
+
+def test_access_tokens_do_not_query_users(api, user, stateless, queries):
+    tokens = request_tokens(api, user)
+    assert tokens['expires_in'] == 900 and tokens['refresh_token']
+    headers = {'Authorization': 'Bearer ' + tokens['token']}
+    del queries[:]
+    assert api.get('/votes/', headers=headers).status_code == 200
+    assert not any('FROM users' in statement for statement in queries)
+    assert api.get('/users/me', headers=headers).get_json()['username'] == user.username
+
+
+def test_a_user_can_have_many_access_tokens(api, user, stateless):
+    first, second = request_tokens(api, user), request_tokens(api, user)
+    for tokens in (first, second):
+        headers = {'Authorization': 'Bearer ' + tokens['token']}
+        assert api.get('/users/me', headers=headers).status_code == 200
+
+
+def test_logging_out_revokes_access_and_refresh_tokens(api, user, stateless):
+    tokens = request_tokens(api, user)
+    resp = api.post('/auth/refresh-token', json={'refresh_token': tokens['refresh_token']})
+    assert resp.status_code == 200
+    headers = {'Authorization': 'Bearer ' + resp.get_json()['token']}
+    assert api.get('/users/me', headers=headers).status_code == 200
+
+    assert api.get('/auth/logout', headers=headers).status_code == 204
+    assert api.get('/users/me', headers=headers).status_code == 401
+    resp = api.post('/auth/refresh-token', json={'refresh_token': tokens['refresh_token']})
+    assert resp.status_code == 401
+    headers = {'Authorization': 'Bearer ' + request_tokens(api, user)['token']}
+    assert api.get('/users/me', headers=headers).status_code == 200
+
+
+def test_access_tokens_cannot_request_refresh_tokens(api, user, stateless):
+    headers = {'Authorization': 'Bearer ' + request_tokens(api, user)['token']}
+    resp = api.post('/auth/request-token', headers=headers)
+    assert resp.status_code == 401
+    assert 'refresh_token' not in resp.get_json()
+
+
+def test_access_tokens_of_deleted_users_are_rejected(api, user, session, stateless):
+    headers = {'Authorization': 'Bearer ' + request_tokens(api, user)['token']}
+    session.delete(user)
+    session.commit()
+    assert api.get('/users/me', headers=headers).status_code == 401
+
+
+def test_tokens_of_one_kind_are_not_accepted_as_another(app, user):
+    with app.app_context():
+        refresh_token = user.generate_refresh_token()
+        assert User.verify_stateless_token(refresh_token) == {}
+        assert User.verify_stateless_token(user.generate_auth_token()) == {}
+        assert User.verify_stateless_token(refresh_token, kind='refresh')['id'] == user.id
+
+
+def test_revocations_expire_with_access_tokens():
+    revocations = TokenRevocations(ttl=60)
+    revocations.revoke(1, 2)
+    assert revocations.is_revoked(1, 1) and not revocations.is_revoked(1, 2)
+    assert not revocations.is_revoked(2, 0)
+    revocations.ttl = -1
+    revocations.revoke(1, 3)
+    assert not revocations.is_revoked(1, 1)
@@ -1,15 +1,71 @@
+from datetime import datetime, timedelta
+
 from flask import json
+import pytest
 
 from bookmarks.users.models import User
-from bookmarks.api.schemas import SubscriptionsSchema, VoteSchema, FavouriteSchema, UserSchema
-from bookmarks.models import Bookmark, Vote, Favourite
+from bookmarks.api.schemas import (
+    SubscriptionsSchema, VoteSchema, FavouriteBookmarkSchema, UserSchema
+)
+from bookmarks.models import Bookmark, Vote, Favourite, Tag
 
 
 def test_getting_all_users(app, api, user):
     resp = api.get('/users/')
-    with app.test_request_context():
-        users_json = UserSchema(many=True, exclude=('email',)).dump([user])
-    assert resp.get_json() == users_json
+    assert resp.get_json() == [{
+        'id': user.id, 'username': user.username,
+        'created_on': user.created_on.isoformat(), 'bookmarks_count': 0,
+        'favourites_count': 0, 'votes_count': 0, 'subscribers_count': 0,
+        'subscribed_count': 0}]
+
+
+@pytest.fixture
+def many_users(user, session):
+    """Add users with bookmarks, votes, favourites and subscriptions."""
+    users = [User(id=id_, username=f'user{id_}', email=f'user{id_}@flask.com',
+                  active=True) for id_ in range(2, 7)]
+    session.add_all(users)
+    session.flush()
+    for user_ in users:
+        bookmark = Bookmark(url=f'http://{user_.id}.com', user_id=user_.id)
+        session.add(bookmark)
+        session.flush()
+        session.add(Vote(user_id=user.id, bookmark_id=bookmark.id, direction=True))
+        session.add(Favourite(user_id=user_.id, bookmark_id=bookmark.id))
+        user.subscribe(user_)
+    session.commit()
+    return users
+
+
+def test_getting_users_runs_a_bounded_number_of_queries(api, many_users, queries):
+    resp = api.get('/users/?expand=votes&expand=subscribed')
+    users = resp.get_json()
+    assert [user['bookmarks_count'] for user in users] == [0, 1, 1, 1, 1, 1]
+    assert [user['votes_count'] for user in users] == [5, 0, 0, 0, 0, 0]
+    assert users[0]['subscribed_count'] == 5
+    assert users[1]['subscribers_count'] == 1
+    assert [subscribed['id'] for subscribed in users[0]['subscribed']] == [2, 3, 4, 5, 6]
+    assert users[0]['votes'] == [{'id': id_, 'direction': True, 'bookmark_id': id_}
+                                 for id_ in range(1, 6)]
+    assert users[1]['votes'] == [] and 'favourites' not in users[1]
+
+    del queries[:]
+    api.get('/users/?expand=bookmarks&expand=favourites&expand=votes'
+            '&expand=subscribers&expand=subscribed')
+    assert len(queries) < 15
+
+
+def test_getting_users_by_cursor(api, many_users):
+    resp = api.get('/users/?page_size=4&count=false')
+    assert [user['id'] for user in resp.get_json()] == [1, 2, 3, 4]
+    resp = api.get('/users/?page_size=4&cursor=' + resp.headers['X-Next-Cursor'])
+    assert [user['id'] for user in resp.get_json()] == [5, 6]
+    assert 'X-Next-Cursor' not in resp.headers
+
+
+def test_getting_users_with_invalid_expansion(api, user):
+    resp = api.get('/users/?expand=password')
+    assert resp.status_code == 422
 
 
 def test_getting_self_user(app, api, user):
@@ -82,7 +138,29 @@ def test_get_user_favourites(api, user, session):
     resp = api.get('/favourites/')
     assert resp.status_code == 200
     resp_favourites = resp.get_json()
-    assert resp_favourites == FavouriteSchema(many=True).dump([favourite])
+    assert resp_favourites == FavouriteBookmarkSchema(many=True).dump([favourite])
+    assert resp_favourites[0]['bookmark']['id'] == b_1.id
+
+
+def test_get_user_favourites_by_cursor_in_fixed_queries(api, user, session, queries):
+    now = datetime.utcnow()
+    for id_ in range(1, 6):
+        session.add(Bookmark(id=id_, url=f'http://{id_}.com', user_id=user.id,
+                             tags=[Tag(name=f'tag{id_}')]))
+        session.add(Favourite(user_id=user.id, bookmark_id=id_,
+                              saved_on=now - timedelta(minutes=id_)))
+    session.commit()
+    api.get('/favourites/')  # caches the token of the user
+    del queries[:]
+    resp = api.get('/favourites/?page_size=3&count=false')
+    assert len(queries) == 4  # favourites with bookmarks, users, tags, votes
+    favourites = resp.get_json()
+    resp = api.get('/favourites/?page_size=3&cursor=' + resp.headers['X-Next-Cursor'])
+    favourites += resp.get_json()
+    assert 'X-Next-Cursor' not in resp.headers
+    assert [favourite['bookmark']['url'] for favourite in favourites] == [
+        f'http://{id_}.com' for id_ in range(1, 6)]
+    assert favourites[0]['bookmark']['tags'] == [{'name': 'tag1'}]
 
 
 def test_get_subscribers(api, user, session):
@@ -137,6 +215,24 @@ def test_subscribing_to_a_user(api, user, session):
     assert resp.status_code == 204
 
 
+def test_subscriptions_are_counted(api, user, session, queries):
+    user_2 = User(username='Bond')
+    session.add(user_2)
+    session.commit()
+    api.post('/subscriptions/', json={'user_id': user_2.id})
+    api.post('/subscriptions/', json={'user_id': user_2.id})
+    counts = session.query(User.subscribed_count, User.subscribers_count).order_by(
+        User.id)
+    assert counts.all() == [(1, 0), (0, 1)]
+    assert len([statement for statement in queries
+                if 'subscriptions' in statement.split('WHERE')[0]]) == 2
+
+    api.delete(f'/subscriptions/{user_2.id}')
+    api.delete(f'/subscriptions/{user_2.id}')
+    assert counts.all() == [(0, 0), (0, 0)]
+    assert User.query.get(1).subscribed.count() == 0
+
+
 def test_unsubscibing_from_your_self(api, user):
     resp = api.delete(f'/subscriptions/{user.id}')
     assert resp.status_code == 409
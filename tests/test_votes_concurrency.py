@@ -0,0 +1,76 @@
+import random
+import threading
+from types import SimpleNamespace
+
+import pytest
+from flask import g
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from bookmarks import db as db_
+from bookmarks.logic import _post_vote, _put_vote, _delete_vote, VOTE_VALUES
+from bookmarks.models import Bookmark, Vote
+
+
+@pytest.fixture
+def shared_session(app, tmp_path, monkeypatch):
+    """Return a session per thread on a database all threads commit to."""
+    engine = create_engine(f'sqlite:///{tmp_path}/votes.db',
+                           connect_args={'timeout': 30, 'check_same_thread': False})
+    db_.metadata.create_all(engine)
+    session = scoped_session(sessionmaker(bind=engine))
+    monkeypatch.setattr(db_, 'session', session)
+    yield session
+    session.remove()
+    engine.dispose()
+
+
+def test_concurrent_votes_keep_the_rating_consistent(app, shared_session):
+    shared_session.add(Bookmark(id=1, rating=0))
+    shared_session.add(Vote(id=1, user_id=999, bookmark_id=1, direction=None))
+    shared_session.commit()
+    errors = []
+
+    def vote(user_id):
+        rng = random.Random(user_id)
+        try:
+            with app.app_context():
+                g.user = SimpleNamespace(id=user_id)
+                for _ in range(10):
+                    vote_id = _post_vote(1, rng.choice([-1, 1]))
+                    for _ in range(2):
+                        _put_vote(Vote.query.get(vote_id), rng.choice([-1, 1]))
+                        # every thread also changes the vote they all share
+                        _put_vote(Vote.query.get(1), rng.choice([-1, 1]))
+                    _delete_vote(Vote.query.get(vote_id))
+                vote_id = _post_vote(1, rng.choice([-1, 1]))
+                _put_vote(Vote.query.get(vote_id), rng.choice([-1, 1]))
+                shared_session.remove()
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=vote, args=(user_id,)) for user_id in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    votes = shared_session.query(Vote.direction).all()
+    assert len(votes) == 9
+    rating = shared_session.query(Bookmark.rating).filter_by(id=1).scalar()
+    assert rating == sum(VOTE_VALUES[vote.direction] for vote in votes)
+
+
+def test_giving_up_on_votes_read_stale(app, shared_session, monkeypatch):
+    shared_session.add(Bookmark(id=1, rating=-1))
+    shared_session.add(Vote(id=1, user_id=1, bookmark_id=1, direction=False))
+    shared_session.commit()
+    # a snapshot that keeps showing the direction the vote had before
+    stale = SimpleNamespace(id=1, bookmark_id=1, direction=True)
+    monkeypatch.setattr('bookmarks.logic._current_direction',
+                        lambda vote_id: SimpleNamespace(direction=True))
+    assert not _put_vote(stale, -1)
+    assert not _delete_vote(stale)
+    assert shared_session.query(Vote.direction).filter_by(id=1).scalar() is False
+    assert shared_session.query(Bookmark.rating).filter_by(id=1).scalar() == -1